@@ -0,0 +1,162 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import threading
+from functools import total_ordering
+
+class OpTable(object):
+    """Interns edit operations, i.e. (source, target) pairs, as small
+    integers, so that every distinct operation is only stored once.  New
+    operations can be interned from several threads at once."""
+
+    def __init__(self):
+        self.ops = []
+        self.ids = {}
+        self._lock = threading.Lock()
+
+    def intern(self, op):
+        """Return the integer standing for the edit operation `op`."""
+        try:
+            return self.ids[op]
+        except KeyError:
+            pass
+        op = tuple(op)
+        with self._lock:
+            # another thread may have interned it in the meantime
+            code = self.ids.get(op)
+            if code is None:
+                self.ops.append(op)
+                code = self.ids[op] = len(self.ops) - 1
+            return code
+
+    def __getitem__(self, code):
+        return self.ops[code]
+
+    def __len__(self):
+        return len(self.ops)
+
+# shared by all alignments
+OPS = OpTable()
+
+@total_ordering
+class Alignment(object):
+    """Immutable sequence of edit operations, as returned by the aligners.
+
+    An alignment is a persistent linked list: every node holds the
+    interned first operation and the alignment of the remaining ones,
+    which can be shared by many alignments.  Prepending an operation
+    therefore takes constant time and memory, which is how the co-optimal
+    alignments of a pair are built while tracing back through the matrix.
+
+    Alignments behave like the lists of (source, target) tuples returned
+    before (see RuleSet): they can be iterated, indexed, hashed and
+    compared with each other as well as with such lists.  `rules` returns
+    the list itself.  Pickling stores the plain operations, as the integer
+    codes are only valid within one process.
+    """
+
+    __slots__ = ('op', 'rest', 'length', '_hash')
+
+    def __new__(cls, ops=(), rest=None):
+        """Return the alignment of the operations `ops`, followed by the
+        alignment `rest`."""
+        if rest is None:
+            node = object.__new__(cls)
+            (node.op, node.rest, node.length, node._hash) = (None, None, 0, None)
+        else:
+            node = rest
+        for op in reversed(list(ops)):
+            node = node.prepend(op)
+        return node
+
+    def prepend(self, op):
+        """Return this alignment preceded by the edit operation `op`,
+        sharing all nodes with this one."""
+        return self.prepend_code(OPS.intern(op))
+
+    def prepend_code(self, code):
+        node = object.__new__(type(self))
+        (node.op, node.rest, node.length, node._hash) = (code, self, self.length + 1, None)
+        return node
+
+    def copy_append(self, op):
+        """Return this alignment followed by the edit operation `op`; unlike
+        prepend, this copies all nodes."""
+        return Alignment(self, Alignment([op]))
+
+    def codes(self):
+        """Yield the interned codes of all edit operations."""
+        node = self
+        while node.length:
+            yield node.op
+            node = node.rest
+
+    def __iter__(self):
+        ops = OPS.ops
+        for code in self.codes():
+            yield ops[code]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Alignment(list(self)[index])
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("alignment index out of range")
+        node = self
+        for _ in range(index):
+            node = node.rest
+        return OPS.ops[node.op]
+
+    def __add__(self, other):
+        if not isinstance(other, Alignment):
+            other = Alignment(other)
+        return Alignment(self, other)
+
+    def __radd__(self, other):
+        return Alignment(other, self)
+
+    def rules(self):
+        """Return the edit operations as a RuleSet, i.e. a list of
+        (source, target) tuples."""
+        from .Levenshtein import RuleSet
+        return RuleSet(self)
+
+    def __hash__(self):
+        if self._hash is None:
+            # the same as for the tuple of all edit operations
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, Alignment):
+            if self is other:
+                return True
+            if self.length != other.length:
+                return False
+            return list(self.codes()) == list(other.codes())
+        if isinstance(other, (list, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        if isinstance(other, (Alignment, list, tuple)):
+            return tuple(self) < tuple(other)
+        return NotImplemented
+
+    def __reduce__(self):
+        return (Alignment, (tuple(self),))
+
+    def __repr__(self):
+        return "Alignment({!r})".format(list(self))
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
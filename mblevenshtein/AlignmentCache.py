@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys
+from collections import OrderedDict
+from .Alignment import Alignment
+
+def approximate_size(value):
+    """Rough estimate of the memory taken up by an alignment result, i.e.,
+    a cost or a tuple of a cost and a list of alignments.  The symbols
+    themselves are shared with the input strings and are not counted."""
+    if isinstance(value, Alignment):
+        # one node per edit operation, ignoring the nodes shared with others
+        return sys.getsizeof(value) * (len(value) + 1)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approximate_size(x) for x in value)
+    if isinstance(value, float):
+        return sys.getsizeof(value)
+    return 0
+
+class AlignmentCache(object):
+    """Bounded LRU cache for the results of a LevenshteinAligner.
+
+    The cache is limited to `max_entries` entries and/or (approximately)
+    `max_bytes` bytes; if neither is given, it grows without bounds.  It
+    belongs to one particular generation of weights (see `validate`), so
+    that results computed with outdated weights are never returned.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.generation  = None
+        self.entries     = OrderedDict()
+        self.size_bytes  = 0
+        self.hits          = 0
+        self.misses        = 0
+        self.evictions     = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def validate(self, generation):
+        """Drop all entries if they were computed for a different
+        `generation` of weights than the given one."""
+        if generation != self.generation:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.generation = generation
+
+    def clear(self):
+        self.entries.clear()
+        self.size_bytes = 0
+
+    def get(self, key, default=None):
+        try:
+            (value, size) = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # re-insert as the most recently used entry
+        self.entries[key] = (value, size)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            (_, size) = self.entries.pop(key)
+            self.size_bytes -= size
+        size = approximate_size(value) if self.max_bytes is not None else 0
+        self.entries[key] = (value, size)
+        self.size_bytes += size
+        while self.entries and self.over_limit():
+            (_, (_, size)) = self.entries.popitem(last=False)
+            self.size_bytes -= size
+            self.evictions += 1
+
+    def over_limit(self):
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        if self.max_bytes is not None and self.size_bytes > self.max_bytes:
+            return True
+        return False
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'bytes': self.size_bytes}
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from mblevenshtein.AlignmentCache import AlignmentCache
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.VectorizedLevenshtein import NumpyLevenshteinAligner
+from mblevenshtein.Levenshtein_test import PAIRS, make_weights
+
+
+class TestAlignmentCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = AlignmentCache(max_entries=2)
+        cache.put('a', 1.0)
+        cache.put('b', 2.0)
+        self.assertEqual(cache.get('a'), 1.0)
+        cache.put('c', 3.0)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_byte_limit(self):
+        cache = AlignmentCache(max_bytes=1000)
+        for i in range(100):
+            cache.put(i, (float(i), [[('a', 'b')] * 5]))
+        self.assertTrue(0 < len(cache) < 100)
+        self.assertTrue(cache.size_bytes <= 1000)
+
+    def test_aligner_results_are_cached(self):
+        aligner = LevenshteinAligner(weights=make_weights(), cache_size=100)
+        first = aligner.perform_levenshtein('cruczegete', 'kreuzigte')
+        second = aligner.perform_levenshtein('cruczegete', 'kreuzigte')
+        self.assertEqual(first, second)
+        self.assertEqual(aligner.distance('jre', 'ihre'), aligner.distance('jre', 'ihre'))
+        self.assertEqual(aligner.cache.hits, 2)
+        self.assertEqual(aligner.cache.misses, 2)
+
+    def test_changed_weights_invalidate_cache(self):
+        weights = make_weights()
+        aligner = LevenshteinAligner(weights=weights, cache_size=100)
+        self.assertEqual(aligner.distance('c', 'k'), 0.3)
+        weights.set_weight('c', 'k', 0.7)
+        self.assertEqual(aligner.distance('c', 'k'), 0.7)
+        weights.reset_weights()
+        self.assertEqual(aligner.distance('c', 'k'), 1.0)
+        self.assertEqual(aligner.cache.hits, 0)
+        self.assertEqual(aligner.cache.invalidations, 2)
+
+    def test_vectorized_batches_use_cache(self):
+        aligner = NumpyLevenshteinAligner(weights=make_weights(), cache_size=100)
+        plain = LevenshteinAligner(weights=make_weights())
+        self.assertEqual(aligner.perform_batch(PAIRS), plain.perform_batch(PAIRS))
+        self.assertEqual(aligner.perform_batch(PAIRS), plain.perform_batch(PAIRS))
+        self.assertEqual(aligner.cache.hits, len(PAIRS))
+        self.assertEqual(aligner.distance_batch(PAIRS), plain.distance_batch(PAIRS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json, socket
+from .Alignment import Alignment
+
+class AlignmentServerError(Exception):
+    pass
+
+class AlignmentClient(object):
+    """Client for an AlignmentServer, listening on the Unix socket `path`
+    or on `host` and `port`.  The methods mirror those of the aligners;
+    the *_batch methods send all requests before reading the answers, so
+    the server can batch them."""
+
+    # number of requests sent ahead of the answers read
+    window = 1000
+
+    def __init__(self, path=None, host='127.0.0.1', port=8765, model=None, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port), timeout)
+        self.stream = self.socket.makefile('rwb')
+        self.model = model
+        self._next_id = 0
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request_many(self, requests):
+        """Send `requests`, dicts with an `op` and its fields, and return
+        their results in the same order.  Raises AlignmentServerError if
+        any of them fails."""
+        requests = list(requests)
+        results = []
+        for start in range(0, len(requests), self.window):
+            chunk = requests[start:start+self.window]
+            ids = {}
+            for request in chunk:
+                request = dict(request)
+                if self.model is not None:
+                    request.setdefault('model', self.model)
+                request['id'] = self._next_id
+                ids[self._next_id] = len(ids)
+                self._next_id += 1
+                self.stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            self.stream.flush()
+            answers = [None] * len(chunk)
+            error = None
+            # read all answers, so none are left over for the next call
+            for _ in chunk:
+                line = self.stream.readline()
+                if not line:
+                    raise AlignmentServerError("Connection closed by the server")
+                response = json.loads(line.decode('utf-8'))
+                if 'error' in response:
+                    error = error or response['error']
+                else:
+                    answers[ids[response['id']]] = response['result']
+            if error is not None:
+                raise AlignmentServerError(error)
+            results.extend(answers)
+        return results
+
+    def request(self, op, **fields):
+        fields['op'] = op
+        return self.request_many([fields])[0]
+
+    def _alignment_result(self, result):
+        return (result['cost'], [Alignment(tuple(op) for op in ops)
+                                 for ops in result['alignments']])
+
+    def perform_levenshtein(self, source, target, max_alignments=None):
+        return self._alignment_result(self.request('align', source=source, target=target,
+                                                   max_alignments=max_alignments))
+
+    def align(self, source, target, max_alignments=None):
+        return self.perform_levenshtein(source, target, max_alignments)[1]
+
+    def perform_batch(self, pairs, max_alignments=None):
+        results = self.request_many({'op': 'align', 'source': source, 'target': target,
+                                     'max_alignments': max_alignments}
+                                    for (source, target) in pairs)
+        return [self._alignment_result(result) for result in results]
+
+    def align_batch(self, pairs, max_alignments=None):
+        return [e for (d, e) in self.perform_batch(pairs, max_alignments)]
+
+    def distance(self, source, target, max_distance=None):
+        return self.request('distance', source=source, target=target,
+                            max_distance=max_distance)
+
+    def distance_batch(self, pairs):
+        return self.request_many({'op': 'distance', 'source': source, 'target': target}
+                                 for (source, target) in pairs)
+
+    def nearest(self, word, k=1, max_distance=None):
+        """Return the `k` lexicon entries closest to `word` as (cost, entry)
+        tuples (see LexiconIndex.search)."""
+        return [tuple(hit) for hit in self.request('nearest', word=word, k=k,
+                                                   max_distance=max_distance)]
+
+    def reload(self):
+        """Make the server reload the weights of the model."""
+        return self.request('reload')
+
+    def stats(self):
+        return self.request('stats')
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
@@ -0,0 +1,389 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# This module needs Python 3 (asyncio); the client in AlignmentClient.py
+# works with both Python 2 and 3.
+
+import os, json, time, asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .WeightedLevenshtein import LevenshteinWeights
+from .VectorizedLevenshtein import NumpyLevenshteinAligner
+from .LexiconIndex import LexiconIndex
+
+# requests that go through the batches of a model
+BATCHED_OPS = ('align', 'distance', 'nearest')
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def check_request(request):
+    """Raise ValueError if a request for one of BATCHED_OPS lacks a field
+    or has a field of the wrong type, so that it cannot fail the batch it
+    would be part of."""
+    op = request['op']
+    fields = ('word',) if op == 'nearest' else ('source', 'target')
+    for field in fields:
+        if not isinstance(request.get(field), str):
+            raise ValueError("Missing string field: %s" % field)
+    max_alignments = request.get('max_alignments')
+    if max_alignments is not None and not (_is_number(max_alignments)
+                                           and int(max_alignments) == max_alignments
+                                           and max_alignments >= 1):
+        raise ValueError("max_alignments must be a positive integer")
+    max_distance = request.get('max_distance')
+    if max_distance is not None and not _is_number(max_distance):
+        raise ValueError("max_distance must be a number")
+    k = request.get('k', 1)
+    if not (_is_number(k) and int(k) == k and k >= 0):
+        raise ValueError("k must be a non-negative integer")
+
+def percentile(values, fraction):
+    """Return the value below which `fraction` of the sorted list
+    `values` lie (nearest rank), or None if it is empty."""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[rank]
+
+class LoadedModel(object):
+    """The weights of a model as loaded at one point in time, with the
+    aligner and the lexicon index that use them.  Reloading a model
+    replaces it with a new LoadedModel, so batches that are running keep
+    the one they started with."""
+
+    def __init__(self, weights, aligner, lexicon, stamp):
+        self.weights = weights
+        self.aligner = aligner
+        self.lexicon = lexicon
+        self.stamp = stamp
+
+    def run_batch(self, requests):
+        """Answer a list of align, distance and nearest requests, grouped
+        so that the pairs of every group are aligned in one batch.  If a
+        group fails, the results of its requests are the exception."""
+        results = [None] * len(requests)
+        groups = {}
+        for (index, request) in enumerate(requests):
+            op = request['op']
+            if op == 'align':
+                max_alignments = request.get('max_alignments')
+                key = (op, None if max_alignments is None else int(max_alignments))
+            elif op == 'distance' and request.get('max_distance') is None:
+                key = (op, None)
+            else:
+                key = (op, index)
+            groups.setdefault(key, []).append(index)
+
+        for ((op, arg), indices) in groups.items():
+            try:
+                answers = self._run_group(op, arg, [requests[index] for index in indices])
+            except Exception as error:
+                answers = [error] * len(indices)
+            for (index, answer) in zip(indices, answers):
+                results[index] = answer
+        return results
+
+    def _run_group(self, op, arg, batch):
+        if op == 'align':
+            pairs = [(request['source'], request['target']) for request in batch]
+            return [{'cost': cost, 'alignments': [list(map(list, a)) for a in alignments]}
+                    for (cost, alignments) in self.aligner.perform_batch(pairs, arg)]
+        if op == 'distance' and arg is None:
+            pairs = [(request['source'], request['target']) for request in batch]
+            return self.aligner.distance_batch(pairs)
+        request = batch[0]
+        if op == 'distance':
+            return [self.aligner.distance(request['source'], request['target'],
+                                          request['max_distance'])]
+        return [[list(hit) for hit in self.lexicon.search(
+            request['word'], int(request.get('k', 1)), request.get('max_distance'))]]
+
+class Model(object):
+    """A named model of an AlignmentServer: the file its weights are read
+    from, the LoadedModel currently in use, and the queue of requests
+    waiting to be batched."""
+
+    def __init__(self, name, filename=None, fileformat='xml'):
+        self.name = name
+        self.filename = filename
+        self.fileformat = fileformat
+        self.loaded = None
+        # made by AlignmentServer.start, within its event loop
+        self.queue = None
+        self.lock = None
+        self.busy = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+
+    def file_stamp(self):
+        """Return what identifies the version of the weight file."""
+        if self.filename is None:
+            return None
+        info = os.stat(self.filename)
+        return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+class AlignmentServer(object):
+    """Serves alignments under one or more sets of weights that are kept
+    loaded, over a Unix socket or TCP, using asyncio.
+
+    Every request is a JSON object on a line of its own, and is answered
+    by a line with an object holding the `id` of the request and either
+    its `result` or an `error`.  Answers can come in a different order
+    than the requests of a connection.  Requests have an `op` and, if
+    there are several models, the name of a `model`:
+
+      align     `source`, `target`, optionally `max_alignments`; the
+                result has the `cost` and the `alignments`, each a list of
+                [source, target] edit operations
+      distance  `source`, `target`, optionally `max_distance`
+      nearest   `word`, optionally `k` and `max_distance`; a list of
+                [cost, entry] for the closest entries of the lexicon
+      reload    reloads the weights of the model from their file
+      stats     latency percentiles (in seconds) and queue depths
+
+    Requests for a model that arrive while it is busy, or within
+    `batch_delay` seconds of each other, are answered by one call to
+    the batch methods of its aligner (e.g. NumpyLevenshteinAligner), in a
+    pool of `workers` threads.  Weight files are checked for changes every
+    `reload_interval` seconds and reloaded in the background; the new
+    weights are swapped in as a whole once they are loaded, and if
+    loading fails, the old ones stay in use.  XML weight files are read
+    through a binary cache file next to them unless `weight_cache` is
+    false (see LevenshteinWeights.loadParamFromCachedXMLFile).
+    """
+
+    default_model = 'default'
+
+    def __init__(self, models=None, fileformat='xml', lexicon=(), epsilon='<eps>',
+                 aligner_class=NumpyLevenshteinAligner, cache_size=100000,
+                 batch_size=256, batch_delay=0.002, reload_interval=1.0,
+                 workers=None, latency_window=10000, weight_cache=True):
+        """`models` maps the names of models to their weight files (or
+        None for unit weights); `lexicon` holds the entries for nearest
+        requests."""
+        if not models:
+            models = {self.default_model: None}
+        self.models = dict((name, Model(name, filename, fileformat))
+                           for (name, filename) in models.items())
+        self.lexicon = list(lexicon)
+        self.epsilon = epsilon
+        self.aligner_class = aligner_class
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.reload_interval = reload_interval
+        self.weight_cache = weight_cache
+        self.executor = ThreadPoolExecutor(workers or len(self.models) + 1)
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.errors = 0
+        self.address = None
+        self._server = None
+        self._tasks = []
+
+    def load(self, model):
+        """Return a LoadedModel with the current weights of `model`."""
+        stamp = model.file_stamp()
+        if model.filename is None:
+            weights = LevenshteinWeights()
+        else:
+            weights = LevenshteinWeights(model.filename, model.fileformat,
+                                         cache=self.weight_cache)
+        aligner = self.aligner_class(weights=weights, epsilon=self.epsilon,
+                                     cache_size=self.cache_size)
+        lexicon = None
+        if self.lexicon:
+            lexicon = LexiconIndex(self.lexicon, weights=weights, epsilon=self.epsilon)
+        return LoadedModel(weights, aligner, lexicon, stamp)
+
+    async def reload(self, model, force=True):
+        """Reload the weights of `model`, unless `force` is false and its
+        file has not changed.  Returns True if new weights are in use."""
+        loop = asyncio.get_event_loop()
+        async with model.lock:
+            try:
+                if not force and model.file_stamp() == model.loaded.stamp:
+                    return False
+                loaded = await loop.run_in_executor(self.executor, self.load, model)
+            except Exception as error:
+                model.reload_errors += 1
+                model.last_error = str(error)
+                if force:
+                    raise
+                return False
+            model.loaded = loaded
+            model.reloads += 1
+            return True
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Load all models and start listening on the Unix socket `path`,
+        or on `host` and `port` (0 picks a free one); `address` is set to
+        where the server listens."""
+        loop = asyncio.get_event_loop()
+        for model in self.models.values():
+            model.queue = asyncio.Queue()
+            model.lock = asyncio.Lock()
+            model.loaded = await loop.run_in_executor(self.executor, self.load, model)
+            self._tasks.append(asyncio.ensure_future(self._run_batches(model)))
+        if self.reload_interval:
+            self._tasks.append(asyncio.ensure_future(self._watch_files()))
+        # lines can hold whole sentences
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_client, path, limit=2**24)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host, port,
+                                                      limit=2**24)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def close(self):
+        """Stop listening and stop all background tasks."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.executor.shutdown(wait=False)
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def _watch_files(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            for model in self.models.values():
+                if model.filename is not None:
+                    await self.reload(model, force=False)
+
+    async def _run_batches(self, model):
+        loop = asyncio.get_event_loop()
+        queue = model.queue
+        while True:
+            batch = [await queue.get()]
+            # give concurrent requests the chance to join the batch
+            await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            model.busy = len(batch)
+            loaded = model.loaded
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, loaded.run_batch, [request for (request, _) in batch])
+            except Exception as error:
+                for (_, future) in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for ((_, future), result) in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            model.busy = 0
+            model.batches += 1
+            model.batched_requests += len(batch)
+
+    def _model(self, request):
+        name = request.get('model')
+        if name is None:
+            if len(self.models) == 1:
+                return next(iter(self.models.values()))
+            name = self.default_model
+        try:
+            return self.models[name]
+        except KeyError:
+            raise ValueError("Unknown model: %s" % name)
+
+    async def handle(self, request):
+        """Return the result of the request `request`, a dict."""
+        op = request.get('op')
+        if op == 'stats':
+            return self.stats()
+        model = self._model(request)
+        if op == 'reload':
+            await self.reload(model)
+            return {'reloads': model.reloads}
+        if op not in BATCHED_OPS:
+            raise ValueError("Unknown op: %s" % op)
+        if op == 'nearest' and not self.lexicon:
+            raise ValueError("No lexicon loaded")
+        check_request(request)
+        future = asyncio.get_event_loop().create_future()
+        model.queue.put_nowait((request, future))
+        return await future
+
+    async def _respond(self, line, writer, lock):
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError("Request is not an object")
+            request_id = request.get('id')
+            response = {'id': request_id, 'result': await self.handle(request)}
+        except Exception as error:
+            self.errors += 1
+            response = {'id': request_id, 'error': str(error)}
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - start)
+        async with lock:
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+
+    async def _serve_client(self, reader, writer):
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._respond(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def stats(self):
+        """Return latency percentiles of the recent requests (in seconds),
+        and the queue depth and batch statistics of every model."""
+        latencies = sorted(self.latencies)
+        models = {}
+        for (name, model) in self.models.items():
+            models[name] = {
+                'queue_depth': model.queue.qsize() if model.queue is not None else 0,
+                'in_batch': model.busy,
+                'requests': model.batched_requests,
+                'batches': model.batches,
+                'mean_batch_size': (float(model.batched_requests) / model.batches
+                                    if model.batches else 0.0),
+                'reloads': model.reloads,
+                'reload_errors': model.reload_errors,
+                'last_error': model.last_error}
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'queue_depth': sum(model['queue_depth'] + model['in_batch']
+                                   for model in models.values()),
+                'latency': dict((key, percentile(latencies, fraction))
+                                for (key, fraction) in (('p50', 0.5), ('p90', 0.9),
+                                                        ('p99', 0.99), ('max', 1.0))),
+                'models': models}
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+
+from mblevenshtein.AlignmentServer import AlignmentServer, LoadedModel, percentile
+from mblevenshtein.AlignmentClient import AlignmentClient, AlignmentServerError
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.LexiconIndex import LexiconIndex
+from mblevenshtein.WeightedLevenshtein import write_binary_weights, SIDECAR_SUFFIX
+from mblevenshtein.WeightedLevenshtein_test import XML_WEIGHTS
+from mblevenshtein.Levenshtein_test import PAIRS, make_weights, random_pairs
+
+LEXICON = ['kirche', 'kreuz', 'und', 'jungfrau', 'ihre']
+
+class ServerThread(object):
+    """Runs an AlignmentServer in an event loop of its own thread."""
+
+    def __init__(self, server, **address):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.call(server.start(**address))
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        self.call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class TestAlignmentServer(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.weightfile = os.path.join(self.tempdir, 'weights.mblw')
+        write_binary_weights(self.weightfile, make_weights())
+        server = AlignmentServer({'plain': None, 'default': self.weightfile},
+                                 fileformat='binary', lexicon=LEXICON,
+                                 reload_interval=0.05)
+        self.running = ServerThread(server)
+        (host, port) = server.address
+        self.client = AlignmentClient(host=host, port=port, timeout=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.running.stop()
+        shutil.rmtree(self.tempdir)
+
+    def test_same_results_as_aligner(self):
+        aligner = LevenshteinAligner(weights=make_weights())
+        pairs = PAIRS + random_pairs(50, alphabet='abceuh')
+        self.assertEqual(self.client.perform_batch(pairs),
+                         [aligner.perform_levenshtein(s, t) for (s, t) in pairs])
+        self.assertEqual(self.client.align_batch(pairs, 1), aligner.align_batch(pairs, 1))
+        self.assertEqual(self.client.distance_batch(pairs),
+                         [aligner.distance(s, t) for (s, t) in pairs])
+        self.assertEqual(self.client.distance('kitten', 'sitting', 1.0), float('inf'))
+        self.assertEqual(self.client.align('jre', 'ihre'), aligner.align('jre', 'ihre'))
+        lexicon = LexiconIndex(LEXICON, weights=make_weights())
+        self.assertEqual(self.client.nearest('kirke', k=2), lexicon.search('kirke', 2))
+        plain = AlignmentClient(host=self.running.server.address[0],
+                                port=self.running.server.address[1], model='plain')
+        self.assertEqual(plain.distance('ca', 'kb'), 2.0)
+        plain.close()
+
+    def test_errors(self):
+        self.assertRaises(AlignmentServerError, self.client.request, 'frobnicate')
+        self.assertRaises(AlignmentServerError, self.client.request, 'align', source='a')
+        self.assertRaises(AlignmentServerError, self.client.request, 'distance',
+                          source='a', target='b', model='missing')
+        for bad in ({'max_distance': 'zz'}, {'max_alignments': 0}, {'max_alignments': 'x'}):
+            self.assertRaises(AlignmentServerError, self.client.request, 'align',
+                              source='a', target='b', **bad)
+        self.assertRaises(AlignmentServerError, self.client.request, 'nearest',
+                          word='a', k=-1)
+        # the connection is still usable
+        self.assertEqual(self.client.distance('a', 'a'), 0.0)
+        # also after a failing request among others
+        self.assertRaises(AlignmentServerError, self.client.request_many,
+                          [{'op': 'frobnicate'}] + [{'op': 'distance', 'source': 'ab', 'target': 'b'}] * 3)
+        self.assertEqual(self.client.distance('ab', 'b'), 1.0)
+
+    def test_failing_group(self):
+        aligner = LevenshteinAligner()
+        # without a lexicon, the nearest group fails, but only that one
+        loaded = LoadedModel(aligner.weights, aligner, None, None)
+        results = loaded.run_batch([{'op': 'distance', 'source': 'ab', 'target': 'b'},
+                                    {'op': 'nearest', 'word': 'ab'},
+                                    {'op': 'align', 'source': 'a', 'target': 'a'}])
+        self.assertEqual(results[0], 1.0)
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertEqual(results[2], {'cost': 0.0, 'alignments': [[['a', 'a']]]})
+
+    def test_batching_of_concurrent_requests(self):
+        pairs = random_pairs(200, alphabet='abceuh')
+        expected = self.client.distance_batch(pairs)
+        results = {}
+        def run(index):
+            with AlignmentClient(host=self.running.server.address[0],
+                                 port=self.running.server.address[1]) as client:
+                results[index] = client.distance_batch(pairs)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([results[i] for i in range(4)], [expected] * 4)
+        stats = self.client.stats()
+        model = stats['models']['default']
+        self.assertEqual(model['requests'], 1000)
+        self.assertTrue(model['mean_batch_size'] > 1)
+        # not counting the stats request itself
+        self.assertEqual(stats['requests'], 1000)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertTrue(0 <= stats['latency']['p50'] <= stats['latency']['p99'])
+
+    def test_hot_reload(self):
+        self.assertAlmostEqual(self.client.distance('ca', 'kb'), 0.4)
+        weights = make_weights()
+        weights.set_weight('c', 'k', 0.05)
+        write_binary_weights(self.weightfile, weights)
+        # picked up by polling the file
+        deadline = time.time() + 10
+        while abs(self.client.distance('ca', 'kb') - 0.15) > 1e-9 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertAlmostEqual(self.client.distance('ca', 'kb'), 0.15)
+        # a broken file leaves the weights in use
+        with open(self.weightfile, 'wb') as f:
+            f.write(b'broken')
+        self.assertRaises(AlignmentServerError, self.client.reload)
+        self.assertAlmostEqual(self.client.distance('ca', 'kb'), 0.15)
+        self.assertTrue(self.client.stats()['models']['default']['reload_errors'] >= 1)
+
+    def test_unix_socket(self):
+        path = os.path.join(self.tempdir, 'server.sock')
+        running = ServerThread(AlignmentServer(reload_interval=None), path=path)
+        try:
+            with AlignmentClient(path=path) as client:
+                self.assertEqual(client.distance('kitten', 'sitting'), 3.0)
+        finally:
+            running.stop()
+
+    def test_no_weight_cache(self):
+        xmlfile = os.path.join(self.tempdir, 'weights.xml')
+        with open(xmlfile, 'wb') as f:
+            f.write(XML_WEIGHTS.encode('utf-8'))
+        server = AlignmentServer({'default': xmlfile}, reload_interval=None,
+                                 weight_cache=False)
+        running = ServerThread(server)
+        try:
+            with AlignmentClient(host=server.address[0], port=server.address[1]) as client:
+                self.assertAlmostEqual(client.distance('c', 'k'), 0.3)
+        finally:
+            running.stop()
+        self.assertFalse(os.path.exists(xmlfile + SIDECAR_SUFFIX))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile([], 0.5), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import pickle
+import threading
+import unittest
+
+from mblevenshtein.Alignment import Alignment, OpTable, OPS
+from mblevenshtein.Levenshtein import LevenshteinAligner, RuleSet
+
+EPS = '<eps>'
+OPERATIONS = [('k', 's'), ('i', 'i'), (EPS, 'g')]
+
+
+class TestAlignment(unittest.TestCase):
+    def test_sequence(self):
+        alignment = Alignment(OPERATIONS)
+        self.assertEqual(len(alignment), 3)
+        self.assertEqual(list(alignment), OPERATIONS)
+        self.assertEqual(alignment[0], ('k', 's'))
+        self.assertEqual(alignment[-1], (EPS, 'g'))
+        self.assertEqual(alignment[1:], Alignment(OPERATIONS[1:]))
+        self.assertRaises(IndexError, lambda: alignment[3])
+        self.assertEqual(len(Alignment()), 0)
+        self.assertEqual(alignment.rules(), RuleSet(OPERATIONS))
+
+    def test_sharing(self):
+        rest = Alignment(OPERATIONS[1:])
+        first = rest.prepend(('k', 's'))
+        second = rest.prepend(('k', EPS))
+        self.assertTrue(first.rest is rest and second.rest is rest)
+        self.assertEqual(first, Alignment(OPERATIONS))
+        self.assertEqual(OPS.intern(('i', 'i')), OPS.intern(('i', 'i')))
+        self.assertEqual(OPS[OPS.intern(('k', 's'))], ('k', 's'))
+        self.assertEqual(Alignment(OPERATIONS[:1]) + rest, first)
+        self.assertEqual(OPERATIONS[:1] + rest, first)
+        self.assertEqual(Alignment(OPERATIONS[:2]).copy_append((EPS, 'g')), first)
+
+    def test_interning_from_threads(self):
+        table = OpTable()
+        ops = [(chr(97 + i % 26), str(i)) for i in range(2000)]
+        def run():
+            for op in ops:
+                table.intern(op)
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(table), len(ops))
+        self.assertEqual(sorted(table.ops), sorted(ops))
+        self.assertTrue(all(table[table.intern(op)] == op for op in ops))
+
+    def test_hash_and_compare(self):
+        alignment = Alignment(OPERATIONS)
+        self.assertEqual(alignment, RuleSet(OPERATIONS))
+        self.assertEqual(RuleSet(OPERATIONS), alignment)
+        self.assertNotEqual(alignment, OPERATIONS[:2])
+        self.assertEqual(hash(alignment), hash(RuleSet(OPERATIONS)))
+        self.assertTrue(RuleSet(OPERATIONS) in set([alignment]))
+        self.assertTrue(Alignment(OPERATIONS[:2]) < alignment)
+        self.assertEqual(sorted([alignment, Alignment()]), [Alignment(), alignment])
+
+    def test_pickle(self):
+        alignment = Alignment(OPERATIONS)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(alignment, protocol))
+            self.assertEqual(copy, alignment)
+            self.assertEqual(hash(copy), hash(alignment))
+        # long alignments must not hit the recursion limit
+        long_alignment = Alignment([('a', 'a')] * 5000)
+        self.assertEqual(pickle.loads(pickle.dumps(long_alignment, 2)), long_alignment)
+
+    def test_aligner_results(self):
+        aligner = LevenshteinAligner()
+        (_, alignments) = aligner.perform_levenshtein('abab', 'baba')
+        self.assertTrue(all(isinstance(a, Alignment) for a in alignments))
+        # co-optimal alignments share their common suffixes
+        (first, second) = aligner.perform_levenshtein('aab', 'ab')[1]
+        self.assertEqual(first[2:], second[2:])
+        self.assertTrue(first.rest.rest is second.rest.rest)
+        self.assertTrue(set(alignments[:1]).issubset(set(a.rules() for a in alignments)))
+
+
+if __name__ == '__main__':
+    unittest.main()
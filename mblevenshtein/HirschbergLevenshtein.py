@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .Levenshtein import LevenshteinAligner
+from .Alignment import Alignment
+
+class HirschbergAligner(LevenshteinAligner):
+    """LevenshteinAligner that finds a single optimal alignment in linear
+    space, using the divide-and-conquer algorithm of Hirschberg (1975).
+
+    The source is split in half; the costs of aligning its first half to
+    every prefix of the target and its second half to every suffix of the
+    target are computed one row at a time, and the target is split where
+    their sum is minimal.  Both halves are then aligned recursively, and
+    small subproblems are left to the full dynamic programming.  This
+    needs O(len(source) + len(target)) memory and about twice the time of
+    the full DP, so whole sentences or paragraphs can be aligned with
+    trained weights (LevenshteinWeights or CompiledWeights).
+
+    perform_levenshtein returns at most one alignment, which is optimal but
+    not necessarily the first one LevenshteinAligner would return.
+    """
+
+    # subproblems with fewer cells than this use the full DP
+    min_cells = 4096
+
+    def _last_row(self, source, target):
+        """Return the costs of aligning `source` to every prefix of
+        `target`, keeping only one row of the matrix at a time."""
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+        m = len(target)
+        prev = [0.0]
+        for p in range(m):
+            prev.append(prev[p] + ins_costs[p])
+        for i in range(len(source)):
+            del_cost = del_costs[i]
+            sub_costs = sub_row(i)
+            curr = [prev[0] + del_cost]
+            for j in range(m):
+                curr.append(min(curr[j]   + ins_costs[j],
+                                prev[j+1] + del_cost,
+                                prev[j]   + sub_costs[j]))
+            prev = curr
+        return prev
+
+    def _hirschberg(self, source, target, ops):
+        """Append the edit operations of an optimal alignment of `source`
+        and `target` to the list `ops`."""
+        eps = self.epsilon
+        # an explicit stack instead of recursion; right halves are pushed
+        # first, so that the operations come out from left to right
+        stack = [(source, target)]
+        while stack:
+            (source, target) = stack.pop()
+            n, m = len(source), len(target)
+            if n == 0:
+                ops.extend((eps, char) for char in target)
+            elif m == 0:
+                ops.extend((char, eps) for char in source)
+            elif n == 1 or (n + 1) * (m + 1) <= self.min_cells:
+                (_, bp) = self._compute_backpointers(source, target)
+                ops.extend(next(self._trace_alignments(source, target, bp, 1)))
+            else:
+                mid = n // 2
+                forward = self._last_row(source[:mid], target)
+                # the cost of an edit operation does not depend on its
+                # position, so aligning the reversed strings gives the
+                # costs of all target suffixes
+                backward = self._last_row(source[:mid-1:-1], target[::-1])
+                split = min(range(m + 1), key=lambda j: forward[j] + backward[m-j])
+                stack.append((source[mid:], target[split:]))
+                stack.append((source[:mid], target[:split]))
+        return ops
+
+    def _align(self, source, target, max_alignments=None, max_distance=None, rest=None):
+        if max_distance is not None:
+            # banded and in linear space as well
+            cost = self.distance(source, target, max_distance)
+            if cost == float('inf'):
+                return (cost, [])
+        if max_alignments is not None and max_alignments < 1:
+            return (self.distance(source, target), [])
+        ops = self._hirschberg(source, target, [])
+        # the cost along the path, summed in the same order as in the DP
+        w = self.weights.get_weight
+        cost = 0.0
+        for (a, b) in ops:
+            cost += w(a, b)
+        return (cost, [Alignment(ops, rest)])
+
+    def iter_alignments(self, source, target, max_alignments=None):
+        return iter(self.perform_levenshtein(source, target, max_alignments)[1])
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.HirschbergLevenshtein import HirschbergAligner
+from mblevenshtein.WeightedLevenshtein import LevenshteinWeights
+from mblevenshtein.Levenshtein_test import EPS, PAIRS, random_pairs, make_weights
+
+
+class TestHirschbergAligner(unittest.TestCase):
+    def check_alignment(self, weights, source, target, cost, alignment):
+        self.assertEqual(''.join(s for (s, _) in alignment if s != EPS), source)
+        self.assertEqual(''.join(t for (_, t) in alignment if t != EPS), target)
+        self.assertAlmostEqual(sum(weights.get_weight(s, t) for (s, t) in alignment), cost)
+
+    def test_alignment_is_co_optimal(self):
+        for weights in (LevenshteinWeights(), make_weights(), make_weights().compile('abc')):
+            plain = LevenshteinAligner(weights=weights)
+            hirschberg = HirschbergAligner(weights=weights)
+            hirschberg.min_cells = 0
+            for (source, target) in PAIRS + random_pairs(200, alphabet='abceuh', max_len=10):
+                (cost, alignments) = plain.perform_levenshtein(source, target)
+                (h_cost, h_alignments) = hirschberg.perform_levenshtein(source, target)
+                self.assertAlmostEqual(h_cost, cost)
+                self.assertEqual(len(h_alignments), 1)
+                self.check_alignment(weights, source, target, cost, h_alignments[0])
+                if weights.has_unit_costs():
+                    # otherwise, rounding can tell apart co-optimal paths
+                    self.assertTrue(h_alignments[0] in alignments)
+
+    def test_long_strings(self):
+        rand = random.Random(3)
+        source = ''.join(rand.choice('abceuh') for _ in range(400))
+        target = ''.join(rand.choice('abceuh') for _ in range(350))
+        weights = make_weights()
+        hirschberg = HirschbergAligner(weights=weights)
+        hirschberg.min_cells = 64
+        (cost, [alignment]) = hirschberg.perform_levenshtein(source, target)
+        self.assertAlmostEqual(cost, LevenshteinAligner(weights=weights).distance(source, target))
+        self.check_alignment(weights, source, target, cost, alignment)
+
+    def test_max_distance_and_max_alignments(self):
+        hirschberg = HirschbergAligner()
+        self.assertEqual(hirschberg.perform_levenshtein('kitten', 'sitting', max_distance=2),
+                         (float('inf'), []))
+        self.assertEqual(hirschberg.perform_levenshtein('kitten', 'sitting', max_distance=3)[0], 3.0)
+        self.assertEqual(hirschberg.perform_levenshtein('kitten', 'sitting', max_alignments=0),
+                         (3.0, []))
+        self.assertEqual(list(hirschberg.iter_alignments('', '')), [[]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import os, sys, math
-from itertools import product
 from operator import itemgetter
 from .normalizer_exceptions import InitError
-from .WeightedLevenshtein import LevenshteinWeights
+from .WeightedLevenshtein import LevenshteinWeights, CompiledWeights
+from .AlignmentCache import AlignmentCache
+from .Alignment import Alignment, OPS
 
 class Levenshtein(object):
     # standard Levenshtein has no weights
@@ -13,74 +14,683 @@ class Levenshtein(object):
         return []
 
 class RuleSet(list):
+    """List of edit operations; the aligners return the more compact
+    Alignment instead, which compares equal to it."""
     def copy_append(self, newitem):
         n = RuleSet(self)
         n.append(newitem)
         return n
 
     def __hash__(self):
-        return super(RuleSet).__hash__()
+        return hash(tuple(self))
+
+def bitparallel_distance(source, target):
+    """Unit-cost Levenshtein distance using the bit-vector algorithm of
+    Myers (1999) in the formulation of Hyyrö (2001).
+
+    Python's arbitrary-precision integers serve as bit vectors, so there is
+    no limit on the length of `source`.
+    """
+    n = len(source)
+    if n == 0:
+        return len(target)
+    peq = {}
+    for (i, char) in enumerate(source):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    mask = (1 << n) - 1
+    last = 1 << (n - 1)
+    pv, mv, score = mask, 0, n
+    for char in target:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # shifting in a 1 accounts for the first row of the matrix,
+        # which grows by one in every column
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return score
+
+def log_sum_exp(values):
+    """Return log(sum(exp(v) for v in values)) without overflow."""
+    top = max(values)
+    if top == float('-inf'):
+        return top
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+# backpointer flags, one for every predecessor a cell can be reached from
+BP_INS, BP_DEL, BP_SUB = 1, 2, 4
+
+def count_paths(n, m, bp):
+    """Count the paths through the backpointer matrix `bp` (as produced
+    by LevenshteinAligner) that lead from the last cell back to the first."""
+    stride = m + 1
+    prev = [1]
+    for j in range(m):
+        prev.append(prev[j] if bp[j+1] & BP_INS else 0)
+    for i in range(1, n + 1):
+        row = i * stride
+        curr = [prev[0] if bp[row] & BP_DEL else 0]
+        for j in range(1, m + 1):
+            flags = bp[row+j]
+            paths = 0
+            if flags & BP_INS:
+                paths += curr[j-1]
+            if flags & BP_DEL:
+                paths += prev[j]
+            if flags & BP_SUB:
+                paths += prev[j-1]
+            curr.append(paths)
+        prev = curr
+    return prev[m]
+
+def compiled_edit_costs(compiled, source, target):
+    """Like LevenshteinAligner._edit_costs, but for CompiledWeights that
+    cover all symbols of `source` and `target`."""
+    sids, tids = compiled.encode(source), compiled.encode(target)
+    rows = compiled.sub_rows
+    ins_row = rows[0]
+    ins_costs = [ins_row[t] for t in tids]
+    del_costs = [rows[s][0] for s in sids]
+    def sub_row(i, start=0, stop=None):
+        row = rows[sids[i]]
+        return [row[t] for t in tids[start:stop]]
+    return (ins_costs, del_costs, sub_row)
+
+def common_affixes(source, target):
+    """Return the lengths of the longest common prefix and suffix of
+    `source` and `target` that can be aligned by identity operations
+    without changing the set of co-optimal alignments, if all identity
+    operations are free and all others cost at least c and less than 2c
+    (see LevenshteinAligner._affix_mode).
+
+    With such weights, a common affix is aligned by identities in some
+    optimal alignment, but it can have further co-optimal alignments that
+    shift an affix symbol into the middle part (as in "aa" and "a").  The
+    affixes are therefore shortened until their innermost symbol does not
+    occur in the middle part.  Prefix and suffix never overlap.
+    """
+    n, m = len(source), len(target)
+    shorter = min(n, m)
+    k = 0
+    while k < shorter and source[k] == target[k]:
+        k += 1
+    if k:
+        rest = set(source[k:]) | set(target[k:])
+        while k and source[k-1] in rest:
+            k -= 1
+            rest.add(source[k])
+    shorter -= k
+    l = 0
+    while l < shorter and source[n-1-l] == target[m-1-l]:
+        l += 1
+    if l:
+        rest = set(source[k:n-l]) | set(target[k:m-l])
+        while l and source[n-l] in rest:
+            rest.add(source[n-l])
+            l -= 1
+    return (k, l)
 
 class LevenshteinAligner(object):
     weights = None
     epsilon = '<eps>'
+    cache   = None
+    # see _weight_bounds
+    _bounds_generation = None
+    # see _compiled_weights
+    _compiled_generation = None
 
-    def __init__(self, weights=None, epsilon='<eps>'):
+    def __init__(self, weights=None, epsilon='<eps>', cache_size=None, cache_bytes=None):
         if weights is None:
             self.weights = LevenshteinWeights()
         else:
             self.weights = weights
         self.epsilon = epsilon
+        if cache_size is not None or cache_bytes is not None:
+            self.cache = AlignmentCache(max_entries=cache_size, max_bytes=cache_bytes)
+
+    def _cache_key(self, *key):
+        """Return a key for the cache, which is emptied first if the
+        weights have changed since its entries were computed."""
+        version = getattr(self.weights, 'version', 0)
+        self.cache.validate((id(self.weights), version))
+        return key + (version,)
+
+    def _weight_bounds(self):
+        """Return the affix mode of the weights (see _affix_mode), whether
+        they have unit costs, and the lowest cost of an insertion or
+        deletion.  Each of these scans all weights, so they are only
+        computed again when the weights have changed."""
+        generation = (id(self.weights), getattr(self.weights, 'version', 0), self.epsilon)
+        if self._bounds_generation != generation:
+            (identities_free, low, high) = self.weights.cost_bounds()
+            if not identities_free or low <= 0.0:
+                affix = None
+            elif high < 2.0 * low:
+                affix = 'trim'
+            else:
+                affix = 'identity'
+            self._bounds = (affix, self.weights.has_unit_costs(),
+                            self.weights.min_indel_cost(self.epsilon))
+            self._bounds_generation = generation
+        return self._bounds
+
+    def _affix_mode(self):
+        """Return 'trim' if common prefixes and suffixes can be aligned by
+        identity operations without running the DP on them, 'identity' if
+        this is only safe for identical strings, or None.
+
+        Identical strings are safe whenever identities are free and all
+        other operations cost more than zero.  Affixes are safe if, in
+        addition, no operation costs twice as much as the cheapest one, as
+        replacing an affix identity and another operation by a single
+        operation then never pays off (see common_affixes).
+        """
+        return self._weight_bounds()[0]
+
+    def _min_indel_cost(self):
+        """Return a lower bound for the cost of any insertion or deletion."""
+        return self._weight_bounds()[2]
+
+    def _affixes(self, source, target):
+        """Return the lengths of the common prefix and suffix of `source`
+        and `target` that need no DP, according to _affix_mode."""
+        mode = self._affix_mode()
+        if mode == 'trim':
+            return common_affixes(source, target)
+        if mode == 'identity' and source == target:
+            return (len(source), 0)
+        return (0, 0)
+
+    def dp_cells(self, source, target):
+        """Return the number of cells of the matrix that aligning `source`
+        and `target` computes, i.e. the matrix of what is left of them
+        after trimming their common affixes (see _affixes)."""
+        (k, l) = self._affixes(source, target)
+        return (len(source) - k - l + 1) * (len(target) - k - l + 1)
+
+    def _suffix(self, source, l):
+        """Return the identity operations for the last `l` symbols of
+        `source`, as the Alignment that the alignments of the middle part
+        are built upon (see _trace_alignments)."""
+        return Alignment((char, char) for char in source[len(source)-l:])
+
+    def _splice(self, source, k, alignments):
+        """Add identity operations for the first `k` symbols of `source` to
+        alignments of the rest."""
+        if not k:
+            return alignments
+        prefix = [(char, char) for char in source[:k]]
+        return (Alignment(prefix, alignment) for alignment in alignments)
+
+    def _compiled_weights(self, symbols):
+        """Return the CompiledWeights of the aligner, extended by the
+        default costs of those `symbols` that they do not cover yet.  The
+        extended table is kept for as long as the weights of the aligner
+        stay the same object; the weights themselves are left alone."""
+        generation = (id(self.weights), getattr(self.weights, 'version', 0))
+        if self._compiled_generation != generation:
+            self._compiled = self.weights
+            self._compiled_generation = generation
+        self._compiled = self._compiled.extend(symbols)
+        return self._compiled
+
+    def _edit_costs(self, source, target):
+        """Return the costs of inserting every symbol of `target`, of
+        deleting every symbol of `source`, and a function that returns the
+        costs of substituting the i-th symbol of `source` by every symbol of
+        `target` (or of the slice `target[start:stop]`)."""
+        if isinstance(self.weights, CompiledWeights):
+            compiled = self._compiled_weights(set(source) | set(target))
+            return compiled_edit_costs(compiled, source, target)
 
-    def perform_levenshtein(self, source, target):
-        n, m = len(source), len(target)
         w = self.weights.get_weight
         eps = self.epsilon
+        ins_costs = [w(eps, char) for char in target]
+        del_costs = [w(char, eps) for char in source]
+        def sub_row(i, start=0, stop=None):
+            char = source[i]
+            return [w(char, other) for other in target[start:stop]]
+        return (ins_costs, del_costs, sub_row)
+
+    def perform_levenshtein(self, source, target, max_alignments=None, max_distance=None):
+        """Return the minimal cost of aligning `source` to `target` and a
+        list of all (or the first `max_alignments`) co-optimal alignments.
+
+        If `max_distance` is given, only alignments costing at most that
+        much are considered; if there are none, the cost is infinite and
+        the list of alignments is empty.  This requires all weights to be
+        non-negative.
+        """
+        if self.cache is not None:
+            key = self._cache_key('align', source, target, max_alignments, max_distance)
+            result = self.cache.get(key)
+            if result is not None:
+                return (result[0], list(result[1]))
+
+        (k, l) = self._affixes(source, target)
+        (cost, alignments) = self._align(source[k:len(source)-l], target[k:len(target)-l],
+                                         max_alignments, max_distance, self._suffix(source, l))
+        alignments = list(self._splice(source, k, alignments))
+        if self.cache is not None:
+            self.cache.put(key, (cost, alignments))
+            alignments = list(alignments)
+        # return minimal cost and best alignment(s)
+        return (cost, alignments)
+
+    def _align(self, source, target, max_alignments=None, max_distance=None, rest=None):
+        """Return the minimal cost and an iterable of the alignments for
+        perform_levenshtein, without the cache and affix trimming; every
+        alignment is followed by `rest`."""
+        (cost, bp) = self._compute_backpointers(source, target, max_distance)
+        if bp is None:
+            return (cost, [])
+        return (cost, self._trace_alignments(source, target, bp, max_alignments, rest))
 
-        # d keeps numeric distance, e keeps edit operations
-        d = [[-1 for y in range(m+1)] for x in range(n+1)]
-        e = [[[] for y in range(m+1)] for x in range(n+1)]
+    def _compute_backpointers(self, source, target, max_distance=None):
+        """Fill the cost matrix row by row, keeping only the previous row of
+        costs, and return the minimal cost together with a bytearray that
+        holds the BP_* flags of every cell (row-major, `len(target)+1`
+        cells per row).  With `max_distance`, see _banded_levenshtein."""
+        if max_distance is not None:
+            return self._banded_levenshtein(source, target, max_distance, True)
+        n, m = len(source), len(target)
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+        stride = m + 1
+        bp = bytearray((n + 1) * stride)
 
         # top row and left column
-        d[0][0] = 0.0
-        e[0][0] = [RuleSet()]
+        prev = [0.0]
         for p in range(m):
-            editop = (eps, target[p])
-            d[0][p+1] = d[0][p] + w(*editop)
-            e[0][p+1].append(e[0][p][0].copy_append(editop))
-        for p in range(n):
-            editop = (source[p], eps)
-            d[p+1][0] = d[p][0] + w(*editop)
-            e[p+1][0].append(e[p][0][0].copy_append(editop))
+            prev.append(prev[p] + ins_costs[p])
+            bp[p+1] = BP_INS
 
         # rest of the matrix
-        for i, j in product(range(n),range(m)):
-            ins_op = (eps, target[j])
-            del_op = (source[i], eps)
-            sub_op = (source[i], target[j])
-            ins_cost = d[i+1][j] + w(*ins_op)
-            del_cost = d[i][j+1] + w(*del_op)
-            sub_cost = d[i][j]   + w(*sub_op)
-
-            best_cost   = min(ins_cost, del_cost, sub_cost)
-            d[i+1][j+1] = best_cost
-
-            if ins_cost <= best_cost:
-                for ruleset in e[i+1][j]:
-                    e[i+1][j+1].append(ruleset.copy_append(ins_op))
-            if del_cost <= best_cost:
-                for ruleset in e[i][j+1]:
-                    e[i+1][j+1].append(ruleset.copy_append(del_op))
-            if sub_cost <= best_cost:
-                for ruleset in e[i][j]:
-                    e[i+1][j+1].append(ruleset.copy_append(sub_op))
+        for i in range(n):
+            del_op_cost = del_costs[i]
+            sub_costs = sub_row(i)
+            row = (i + 1) * stride
+            curr = [prev[0] + del_op_cost]
+            bp[row] = BP_DEL
+            for j in range(m):
+                ins_cost = curr[j]   + ins_costs[j]
+                del_cost = prev[j+1] + del_op_cost
+                sub_cost = prev[j]   + sub_costs[j]
 
-        # return minimal cost and best alignment(s)
-        return (d[n][m], e[n][m])
+                best_cost = min(ins_cost, del_cost, sub_cost)
+                curr.append(best_cost)
+
+                flags = 0
+                if ins_cost <= best_cost:
+                    flags |= BP_INS
+                if del_cost <= best_cost:
+                    flags |= BP_DEL
+                if sub_cost <= best_cost:
+                    flags |= BP_SUB
+                bp[row+j+1] = flags
+            prev = curr
+
+        return (prev[m], bp)
+
+    def _trace_alignments(self, source, target, bp, max_alignments=None, rest=None):
+        """Yield the alignments encoded in the backpointers `bp`, walking
+        back from the last cell and trying insertions, deletions and
+        substitutions in this order.  This reproduces the order in which
+        the alignments used to be collected in the full matrix of edit
+        operations.
+
+        The alignments share the nodes of their common suffixes, and are
+        all followed by the Alignment `rest` if given."""
+        if max_alignments is not None and max_alignments < 1:
+            return
+        intern = OPS.intern
+        eps = self.epsilon
+        stride = len(target) + 1
+        # the current path from the last cell, as the Alignment of the edit
+        # operations walked through so far
+        path = [Alignment() if rest is None else rest]
+        count = 0
+        # every frame holds a cell and the flags not yet explored there
+        frames = [[len(source), len(target), bp[-1]]]
+        while frames:
+            frame = frames[-1]
+            (i, j, todo) = frame
+            if todo & BP_INS:
+                frame[2] = todo & ~BP_INS
+                path.append(path[-1].prepend_code(intern((eps, target[j-1]))))
+                frames.append([i, j-1, bp[i*stride + j-1]])
+            elif todo & BP_DEL:
+                frame[2] = todo & ~BP_DEL
+                path.append(path[-1].prepend_code(intern((source[i-1], eps))))
+                frames.append([i-1, j, bp[(i-1)*stride + j]])
+            elif todo & BP_SUB:
+                frame[2] = todo & ~BP_SUB
+                path.append(path[-1].prepend_code(intern((source[i-1], target[j-1]))))
+                frames.append([i-1, j-1, bp[(i-1)*stride + j-1]])
+            else:
+                if i == 0 and j == 0:
+                    yield path[-1]
+                    count += 1
+                    if count == max_alignments:
+                        return
+                frames.pop()
+                if len(path) > 1:
+                    path.pop()
+
+    def iter_alignments(self, source, target, max_alignments=None):
+        """Lazily generate the co-optimal alignments of `source` and
+        `target`, at most `max_alignments` of them if given."""
+        (k, l) = self._affixes(source, target)
+        (middle_source, middle_target) = (source[k:len(source)-l], target[k:len(target)-l])
+        (_, bp) = self._compute_backpointers(middle_source, middle_target)
+        return self._splice(source, k, self._trace_alignments(
+            middle_source, middle_target, bp, max_alignments, self._suffix(source, l)))
+
+    def count_alignments(self, source, target):
+        """Return the number of co-optimal alignments without
+        enumerating them."""
+        (k, l) = self._affixes(source, target)
+        (source, target) = (source[k:len(source)-l], target[k:len(target)-l])
+        (_, bp) = self._compute_backpointers(source, target)
+        return count_paths(len(source), len(target), bp)
+
+    def _predecessors(self, source, target, bp):
+        """Return, for every cell (row-major), the list of its predecessors
+        on co-optimal paths as (cell, edit operation) pairs, in the order in
+        which _trace_alignments tries them."""
+        eps = self.epsilon
+        stride = len(target) + 1
+        preds = []
+        for i in range(len(source) + 1):
+            row = i * stride
+            for j in range(stride):
+                flags = bp[row+j]
+                edges = []
+                if flags & BP_INS:
+                    edges.append((row+j-1, (eps, target[j-1])))
+                if flags & BP_DEL:
+                    edges.append((row+j-stride, (source[i-1], eps)))
+                if flags & BP_SUB:
+                    edges.append((row+j-stride-1, (source[i-1], target[j-1])))
+                preds.append(edges)
+        return preds
+
+    def count_ngrams(self, source, target, n=1):
+        """Return the number of co-optimal alignments of `source` and
+        `target`, and a dict from every sequence of up to `n` consecutive
+        edit operations (as a tuple) to its number of occurrences in all of
+        these alignments together, without enumerating them.
+
+        The backpointers form a DAG whose paths are the alignments, so a
+        sequence of edges from cell p to cell c occurs in as many
+        alignments as there are paths from the first cell to p, times the
+        paths from c to the last cell.
+        """
+        (_, bp) = self._compute_backpointers(source, target)
+        preds = self._predecessors(source, target, bp)
+        cells = len(preds)
+        forward = [1] + [0] * (cells - 1)
+        for cell in range(1, cells):
+            forward[cell] = sum(forward[p] for (p, _) in preds[cell])
+        backward = [0] * (cells - 1) + [1]
+        for cell in range(cells - 1, 0, -1):
+            if backward[cell]:
+                for (p, _) in preds[cell]:
+                    backward[p] += backward[cell]
+
+        counts = {}
+        for cell in range(1, cells):
+            after = backward[cell]
+            if not after:
+                continue
+            # all sequences of up to n edges that end in this cell
+            chains = [(cell, ())]
+            for _ in range(n):
+                longer = []
+                for (end, ops) in chains:
+                    for (p, op) in preds[end]:
+                        ngram = (op,) + ops
+                        counts[ngram] = counts.get(ngram, 0) + forward[p] * after
+                        longer.append((p, ngram))
+                chains = longer
+        return (forward[-1], counts)
+
+    def _lattice(self, source, target):
+        """Return, for every cell (row-major), the list of all its
+        predecessors as (cell, edit operation, cost) triples, whether they
+        lie on an optimal path or not."""
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+        eps = self.epsilon
+        stride = len(target) + 1
+        preds = [[]]
+        for j in range(1, stride):
+            preds.append([(j-1, (eps, target[j-1]), ins_costs[j-1])])
+        for i in range(1, len(source) + 1):
+            row = i * stride
+            del_cost = del_costs[i-1]
+            sub_costs = sub_row(i-1)
+            preds.append([(row-stride, (source[i-1], eps), del_cost)])
+            for j in range(1, stride):
+                preds.append([(row+j-1, (eps, target[j-1]), ins_costs[j-1]),
+                              (row+j-stride, (source[i-1], eps), del_cost),
+                              (row+j-stride-1, (source[i-1], target[j-1]), sub_costs[j-1])])
+        return preds
+
+    def expected_ngrams(self, source, target, temperature=1.0, n=1, min_count=0.0):
+        """Return a dict from every sequence of up to `n` consecutive edit
+        operations (as a tuple) to its expected number of occurrences in an
+        alignment of `source` and `target`, where every alignment has a
+        probability proportional to exp(-cost/`temperature`).  Sequences
+        expected no more than `min_count` times are left out.
+
+        The expectations are computed by a forward-backward pass over the
+        lattice of all edit operations, in log space.  As the temperature
+        approaches zero, they approach the average over the co-optimal
+        alignments (see count_ngrams).
+        """
+        inf = float('inf')
+        preds = self._lattice(source, target)
+        cells = len(preds)
+        scale = 1.0 / temperature
+        forward = [0.0] + [-inf] * (cells - 1)
+        for cell in range(1, cells):
+            forward[cell] = log_sum_exp([forward[p] - cost * scale
+                                         for (p, _, cost) in preds[cell]])
+        backward = [-inf] * (cells - 1) + [0.0]
+        for cell in range(cells - 1, 0, -1):
+            after = backward[cell]
+            if after == -inf:
+                continue
+            for (p, _, cost) in preds[cell]:
+                backward[p] = log_sum_exp([backward[p], after - cost * scale])
+
+        total = forward[-1]
+        exp = math.exp
+        counts = {}
+        for cell in range(1, cells):
+            after = backward[cell] - total
+            # all sequences of up to n edges that end in this cell, with the
+            # scaled cost of their edges; a longer sequence is never more
+            # likely than the ones it contains
+            chains = [(cell, (), 0.0)]
+            for _ in range(n):
+                longer = []
+                for (end, ops, cost_sum) in chains:
+                    for (p, op, cost) in preds[end]:
+                        scaled = cost_sum + cost * scale
+                        count = exp(forward[p] - scaled + after)
+                        if count <= min_count:
+                            continue
+                        ngram = (op,) + ops
+                        counts[ngram] = counts.get(ngram, 0.0) + count
+                        longer.append((p, ngram, scaled))
+                chains = longer
+        return counts
+
+    def distance(self, source, target, max_distance=None):
+        """Return only the minimal cost of aligning `source` to `target`;
+        equal to ``perform_levenshtein(source, target)[0]``, but without
+        keeping the full matrix or any edit operations.  If `max_distance`
+        is given and the cost exceeds it, the result is infinite."""
+        if self.cache is not None:
+            key = self._cache_key('distance', source, target, max_distance)
+            cost = self.cache.get(key)
+            if cost is not None:
+                return cost
+
+        (k, l) = self._affixes(source, target)
+        (source, target) = (source[k:len(source)-l], target[k:len(target)-l])
+        if self._has_unit_costs():
+            cost = float(bitparallel_distance(source, target))
+            if max_distance is not None and cost > max_distance:
+                cost = float('inf')
+        else:
+            cost = self._weighted_distance(source, target, max_distance)
+        if self.cache is not None:
+            self.cache.put(key, cost)
+        return cost
+
+    def _has_unit_costs(self):
+        """True if distances can be computed with bitparallel_distance."""
+        return self._weight_bounds()[1]
+
+    def _weighted_distance(self, source, target, max_distance=None):
+        if max_distance is not None:
+            return self._banded_levenshtein(source, target, max_distance, False)[0]
+        n, m = len(source), len(target)
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+
+        # only the previous row is kept around
+        prev = [0.0]
+        for p in range(m):
+            prev.append(prev[p] + ins_costs[p])
+
+        for i in range(n):
+            del_cost = del_costs[i]
+            sub_costs = sub_row(i)
+            curr = [prev[0] + del_cost]
+            for j in range(m):
+                curr.append(min(curr[j]   + ins_costs[j],
+                                prev[j+1] + del_cost,
+                                prev[j]   + sub_costs[j]))
+            prev = curr
+
+        return prev[m]
+
+    def _band(self, n, m, max_distance):
+        """Return the range (lo, hi) of diagonals j - i that an alignment of
+        strings of lengths `n` and `m` can touch without costing more than
+        `max_distance`, or None if every alignment costs more than that.
+
+        Reaching cell (i, j) takes at least |j - i| insertions or deletions,
+        and going on from there at least |(m - n) - (j - i)| more, so the
+        band follows from the cheapest insertion or deletion.
+        """
+        min_indel = self._min_indel_cost()
+        delta = m - n
+        if min_indel <= 0.0:
+            return (-n, m)
+        # a little slack guards against rounding errors
+        slack = max_distance / min_indel - abs(delta) + 1e-9
+        if slack < 0.0:
+            return None
+        radius = int(math.floor(slack / 2.0))
+        return (max(-n, min(0, delta) - radius), min(m, max(0, delta) + radius))
+
+    def _banded_levenshtein(self, source, target, max_distance, backpointers):
+        """Like _compute_backpointers, but only for the cells within the
+        band of _band, and stopping as soon as all cells of a row cost more
+        than `max_distance`.  In that case, or if the final cost exceeds
+        `max_distance`, the cost is infinite and the backpointers are None.
+        Otherwise, costs and backpointers on all co-optimal paths are the
+        same as without the band."""
+        inf = float('inf')
+        n, m = len(source), len(target)
+        band = self._band(n, m, max_distance)
+        if band is None:
+            return (inf, None)
+        (lo, hi) = band
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+        stride = m + 1
+        bp = bytearray((n + 1) * stride) if backpointers else None
+
+        # top row
+        prev = [inf] * (m + 1)
+        prev[0] = 0.0
+        for p in range(hi):
+            prev[p+1] = prev[p] + ins_costs[p]
+            if bp is not None:
+                bp[p+1] = BP_INS
+
+        # rest of the band; both rows are reused, so only the cells just
+        # outside the band need to be reset
+        curr = [inf] * (m + 1)
+        for i in range(n):
+            del_op_cost = del_costs[i]
+            # cells (i+1, start) to (i+1, stop) lie within the band
+            start, stop = max(0, i + 1 + lo), min(m, i + 1 + hi)
+            row = (i + 1) * stride
+            if start == 0:
+                curr[0] = prev[0] + del_op_cost
+                if bp is not None:
+                    bp[row] = BP_DEL
+            else:
+                curr[start-1] = inf
+            if stop < m:
+                curr[stop+1] = inf
+            first = max(0, start - 1)
+            sub_costs = sub_row(i, first, stop)
+            for j in range(first, stop):
+                ins_cost = curr[j]   + ins_costs[j]
+                del_cost = prev[j+1] + del_op_cost
+                sub_cost = prev[j]   + sub_costs[j-first]
+
+                best_cost = min(ins_cost, del_cost, sub_cost)
+                curr[j+1] = best_cost
+
+                if bp is not None and best_cost < inf:
+                    flags = 0
+                    if ins_cost <= best_cost:
+                        flags |= BP_INS
+                    if del_cost <= best_cost:
+                        flags |= BP_DEL
+                    if sub_cost <= best_cost:
+                        flags |= BP_SUB
+                    bp[row+j+1] = flags
+            # every path passes through every row
+            if min(curr[start:stop+1]) > max_distance:
+                return (inf, None)
+            prev, curr = curr, prev
+
+        if prev[m] > max_distance:
+            return (inf, None)
+        return (prev[m], bp)
+
+    def perform_batch(self, pairs, max_alignments=None):
+        """Return the results of perform_levenshtein for a sequence of
+        (source, target) pairs, in the same order."""
+        return [self.perform_levenshtein(source, target, max_alignments)
+                for (source, target) in pairs]
+
+    def align_batch(self, pairs, max_alignments=None):
+        return [e for (d, e) in self.perform_batch(pairs, max_alignments)]
+
+    def distance_batch(self, pairs):
+        return [self.distance(source, target) for (source, target) in pairs]
 
     def print_alignments(self, source, target, style="verbose"):
-        (d, e) = self.perform_levenshtein(source, target)
+        max_alignments = 1 if style == 'linear' else None
+        (d, e) = self.perform_levenshtein(source, target, max_alignments)
+        self.print_result(source, target, d, e, style)
 
+    def print_result(self, source, target, d, e, style="verbose"):
         def utfprint(string):
             print(string.encode("utf-8"))
 
@@ -96,8 +706,8 @@ class LevenshteinAligner(object):
             rulelist = ['='.join(rule).replace(self.epsilon,'') for rule in ruleset]
             utfprint('|' + '|'.join(rulelist) + '|')
 
-    def align(self, source, target):
-        (d, e) = self.perform_levenshtein(source, target)
+    def align(self, source, target, max_alignments=None):
+        (d, e) = self.perform_levenshtein(source, target, max_alignments)
         return e
 
 if __name__ == '__main__':
@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import unittest
+from itertools import product
+
+from mblevenshtein.Levenshtein import LevenshteinAligner, RuleSet, bitparallel_distance, \
+     common_affixes
+from mblevenshtein.WeightedLevenshtein import LevenshteinWeights
+
+EPS = '<eps>'
+PAIRS = [('', ''), ('', 'abc'), ('abc', ''), ('kitten', 'sitting'),
+         ('jre', 'ihre'), ('cruczegete', 'kreuzigte'), ('aaaa', 'aaa'),
+         ('iuncvrouwen', 'jungfrauen'), ('abab', 'baba')]
+
+def random_pairs(count, alphabet='abcd', max_len=8, seed=42):
+    rand = random.Random(seed)
+    def word():
+        return ''.join(rand.choice(alphabet)
+                       for _ in range(rand.randint(0, max_len)))
+    return [(word(), word()) for _ in range(count)]
+
+def make_weights():
+    weights = LevenshteinWeights()
+    weights.set_weight('c', 'k', 0.3)
+    weights.set_weight('u', 'e', 0.4)
+    weights.set_weight(EPS, 'h', 0.25)
+    weights.set_weight('e', EPS, 0.6)
+    weights.set_weight('a', 'b', 0.1)
+    return weights
+
+def reference_levenshtein(weights, source, target, eps=EPS):
+    """The original implementation that keeps all edit operations in a
+    full matrix; used to check the results of the faster code paths."""
+    n, m = len(source), len(target)
+    w = weights.get_weight
+    d = [[-1 for y in range(m+1)] for x in range(n+1)]
+    e = [[[] for y in range(m+1)] for x in range(n+1)]
+    d[0][0] = 0.0
+    e[0][0] = [RuleSet()]
+    for p in range(m):
+        editop = (eps, target[p])
+        d[0][p+1] = d[0][p] + w(*editop)
+        e[0][p+1].append(e[0][p][0].copy_append(editop))
+    for p in range(n):
+        editop = (source[p], eps)
+        d[p+1][0] = d[p][0] + w(*editop)
+        e[p+1][0].append(e[p][0][0].copy_append(editop))
+    for i, j in product(range(n), range(m)):
+        ins_op = (eps, target[j])
+        del_op = (source[i], eps)
+        sub_op = (source[i], target[j])
+        ins_cost = d[i+1][j] + w(*ins_op)
+        del_cost = d[i][j+1] + w(*del_op)
+        sub_cost = d[i][j]   + w(*sub_op)
+        best_cost = min(ins_cost, del_cost, sub_cost)
+        d[i+1][j+1] = best_cost
+        if ins_cost <= best_cost:
+            for ruleset in e[i+1][j]:
+                e[i+1][j+1].append(ruleset.copy_append(ins_op))
+        if del_cost <= best_cost:
+            for ruleset in e[i][j+1]:
+                e[i+1][j+1].append(ruleset.copy_append(del_op))
+        if sub_cost <= best_cost:
+            for ruleset in e[i][j]:
+                e[i+1][j+1].append(ruleset.copy_append(sub_op))
+    return (d[n][m], e[n][m])
+
+
+def count_ngrams_of(alignments, n):
+    """Count the sequences of up to `n` edit operations by enumeration."""
+    counts = {}
+    for alignment in alignments:
+        ops = list(alignment)
+        for k in range(1, n + 1):
+            for i in range(len(ops) - k + 1):
+                ngram = tuple(ops[i:i+k])
+                counts[ngram] = counts.get(ngram, 0) + 1
+    return counts
+
+def all_alignments(weights, source, target, eps=EPS):
+    """Yield the cost and the edit operations of every alignment."""
+    if not source and not target:
+        yield (0.0, [])
+        return
+    steps = []
+    if target:
+        steps.append((source, target[1:], (eps, target[0])))
+    if source:
+        steps.append((source[1:], target, (source[0], eps)))
+    if source and target:
+        steps.append((source[1:], target[1:], (source[0], target[0])))
+    for (rest_source, rest_target, op) in steps:
+        cost = weights.get_weight(*op)
+        for (rest_cost, ops) in all_alignments(weights, rest_source, rest_target, eps):
+            yield (cost + rest_cost, [op] + ops)
+
+
+class TestDistance(unittest.TestCase):
+    def test_bitparallel_known_values(self):
+        self.assertEqual(bitparallel_distance('kitten', 'sitting'), 3)
+        self.assertEqual(bitparallel_distance('', 'abc'), 3)
+        self.assertEqual(bitparallel_distance('abc', ''), 3)
+        self.assertEqual(bitparallel_distance('abc', 'abc'), 0)
+
+    def test_bitparallel_long_strings(self):
+        rand = random.Random(1)
+        source = ''.join(rand.choice('ab') for _ in range(150))
+        target = ''.join(rand.choice('ab') for _ in range(130))
+        aligner = LevenshteinAligner()
+        self.assertEqual(bitparallel_distance(source, target),
+                         aligner._weighted_distance(source, target))
+
+    def test_unit_costs_match_reference(self):
+        aligner = LevenshteinAligner()
+        self.assertTrue(aligner.weights.has_unit_costs())
+        for (source, target) in PAIRS + random_pairs(200):
+            self.assertEqual(aligner.distance(source, target),
+                             aligner.perform_levenshtein(source, target)[0])
+
+    def test_weighted_costs_match_reference(self):
+        aligner = LevenshteinAligner(weights=make_weights())
+        self.assertFalse(aligner.weights.has_unit_costs())
+        for (source, target) in PAIRS + random_pairs(200, alphabet='abceuh'):
+            self.assertEqual(aligner.distance(source, target),
+                             aligner.perform_levenshtein(source, target)[0])
+
+    def test_explicit_unit_weights_count_as_unit_costs(self):
+        weights = LevenshteinWeights()
+        weights.set_weight('a', 'a', 0.0)
+        weights.set_weight('a', 'b', 1.0)
+        self.assertTrue(weights.has_unit_costs())
+        weights.set_weight('a', 'b', 0.5)
+        self.assertFalse(weights.has_unit_costs())
+
+
+class TestAlignments(unittest.TestCase):
+    def test_same_alignments_as_reference(self):
+        for weights in (LevenshteinWeights(), make_weights()):
+            aligner = LevenshteinAligner(weights=weights)
+            for (source, target) in PAIRS + random_pairs(100, alphabet='abceuh'):
+                self.assertEqual(aligner.perform_levenshtein(source, target),
+                                 reference_levenshtein(weights, source, target))
+
+    def test_empty_strings(self):
+        aligner = LevenshteinAligner()
+        self.assertEqual(aligner.perform_levenshtein('', ''), (0.0, [[]]))
+        self.assertEqual(aligner.count_alignments('', ''), 1)
+
+    def test_max_alignments(self):
+        aligner = LevenshteinAligner()
+        alignments = aligner.align('aaaa', 'aaa')
+        self.assertEqual(len(alignments), 4)
+        self.assertEqual(aligner.align('aaaa', 'aaa', max_alignments=2),
+                         alignments[:2])
+        self.assertEqual(aligner.align('aaaa', 'aaa', max_alignments=0), [])
+
+    def test_count_alignments(self):
+        aligner = LevenshteinAligner(weights=make_weights())
+        for (source, target) in PAIRS + random_pairs(100, alphabet='abceuh'):
+            self.assertEqual(aligner.count_alignments(source, target),
+                             len(aligner.align(source, target)))
+
+    def test_count_ngrams(self):
+        aligner = LevenshteinAligner(weights=make_weights())
+        for (source, target) in PAIRS + random_pairs(100, alphabet='abceuh'):
+            alignments = aligner.align(source, target)
+            for n in (1, 2, 3):
+                (paths, counts) = aligner.count_ngrams(source, target, n)
+                self.assertEqual(paths, len(alignments))
+                self.assertEqual(counts, count_ngrams_of(alignments, n))
+        # without enumerating the alignments
+        (paths, counts) = LevenshteinAligner().count_ngrams('a' * 200, 'a' * 100)
+        self.assertEqual(counts[(('a', 'a'),)] + counts[(('a', EPS),)], paths * 200)
+
+    def test_expected_ngrams(self):
+        weights = make_weights()
+        aligner = LevenshteinAligner(weights=weights)
+        for (source, target) in PAIRS[:4] + random_pairs(10, alphabet='abceuh', max_len=4):
+            for temperature in (1.0, 0.3):
+                scored = [(math.exp(-cost / temperature), ops)
+                          for (cost, ops) in all_alignments(weights, source, target)]
+                total = sum(score for (score, _) in scored)
+                expected = {}
+                for (score, ops) in scored:
+                    for (ngram, count) in count_ngrams_of([ops], 2).items():
+                        expected[ngram] = expected.get(ngram, 0.0) + count * score / total
+                counts = aligner.expected_ngrams(source, target, temperature, 2)
+                self.assertEqual(set(counts), set(expected))
+                for (ngram, count) in expected.items():
+                    self.assertAlmostEqual(counts[ngram], count)
+            # at low temperatures, only the co-optimal alignments count
+            (paths, counts) = aligner.count_ngrams(source, target, 2)
+            soft = aligner.expected_ngrams(source, target, 0.001, 2, min_count=1e-9)
+            self.assertEqual(set(soft), set(counts))
+            for (ngram, count) in counts.items():
+                self.assertAlmostEqual(soft[ngram], float(count) / paths)
+
+    def test_lazy_enumeration_of_repetitive_strings(self):
+        aligner = LevenshteinAligner()
+        source, target = 'a' * 200, 'a' * 100
+        self.assertEqual(aligner.count_alignments(source, target),
+                         aligner.count_alignments(target, source))
+        self.assertTrue(aligner.count_alignments(source, target) > 10**50)
+        first = next(aligner.iter_alignments(source, target))
+        self.assertEqual(len(first), 200)
+        self.assertEqual(first[0], ('a', 'a'))
+        self.assertEqual(first[-1], ('a', '<eps>'))
+
+
+class TestMaxDistance(unittest.TestCase):
+    def check_bounded(self, aligner, pairs, bounds):
+        for (source, target) in pairs:
+            (cost, alignments) = aligner.perform_levenshtein(source, target)
+            for bound in bounds:
+                if cost <= bound:
+                    expected = (cost, alignments)
+                else:
+                    expected = (float('inf'), [])
+                self.assertEqual(aligner.perform_levenshtein(source, target, max_distance=bound),
+                                 expected)
+                self.assertEqual(aligner.distance(source, target, max_distance=bound),
+                                 expected[0])
+
+    def test_unit_costs(self):
+        self.check_bounded(LevenshteinAligner(), PAIRS + random_pairs(100),
+                           (0, 1, 2, 3.5, 10))
+
+    def test_weighted_costs(self):
+        weights = make_weights()
+        self.assertEqual(weights.min_indel_cost(), 0.25)
+        self.check_bounded(LevenshteinAligner(weights=weights),
+                           PAIRS + random_pairs(100, alphabet='abceuh'),
+                           (0.0, 0.5, 1.0, 2.35, 4.0))
+
+    def test_early_termination(self):
+        aligner = LevenshteinAligner()
+        (cost, bp) = aligner._banded_levenshtein('a' * 50, 'b' * 50, 3, True)
+        self.assertEqual((cost, bp), (float('inf'), None))
+        # lengths alone rule out the bound
+        self.assertEqual(aligner._band(10, 2, 5), None)
+        self.assertEqual(aligner._band(10, 8, 3), (-2, 0))
+        self.assertEqual(aligner._band(10, 8, 4), (-3, 1))
+
+
+    def test_bounds_follow_weights(self):
+        weights = make_weights()
+        aligner = LevenshteinAligner(weights=weights)
+        scans = []
+        min_indel_cost = weights.min_indel_cost
+        weights.min_indel_cost = lambda *args: scans.append(args) or min_indel_cost(*args)
+        for bound in (0.5, 1.0, 2.0):
+            aligner.distance('kitten', 'sitting', max_distance=bound)
+        self.assertEqual(len(scans), 1)
+        self.assertFalse(aligner._has_unit_costs())
+        # changed weights are scanned again
+        weights.set_weight(EPS, 'a', 0.1)
+        self.assertEqual(aligner._min_indel_cost(), 0.1)
+        self.assertEqual(len(scans), 2)
+        self.assertFalse(aligner._has_unit_costs())
+        self.assertTrue(LevenshteinAligner()._has_unit_costs())
+
+def affix_pairs(count, alphabet='abc', seed=5):
+    """Random pairs, most of them with a common prefix and suffix."""
+    rand = random.Random(seed)
+    def word(max_len):
+        return ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, max_len)))
+    pairs = []
+    for (source, target) in random_pairs(count, alphabet, max_len=5, seed=seed):
+        (prefix, suffix) = (word(3), word(3))
+        pairs.append((prefix + source + suffix, prefix + target + suffix))
+        pairs.append((prefix + source + suffix, prefix + source + suffix))
+    return pairs
+
+class TestAffixTrimming(unittest.TestCase):
+    def test_common_affixes(self):
+        self.assertEqual(common_affixes('kitten', 'kitchen'), (2, 2))
+        self.assertEqual(common_affixes('abc', 'abc'), (3, 0))
+        self.assertEqual(common_affixes('', ''), (0, 0))
+        # shifting the shared 'a' gives further co-optimal alignments
+        self.assertEqual(common_affixes('aa', 'a'), (0, 0))
+        self.assertEqual(common_affixes('abab', 'ab'), (0, 0))
+        self.assertEqual(common_affixes('xab', 'xb'), (1, 1))
+
+    def test_dp_cells(self):
+        self.assertEqual(LevenshteinAligner().dp_cells('kitten', 'kitchen'), 12)
+        self.assertEqual(LevenshteinAligner().dp_cells('abc', 'abc'), 1)
+        self.assertEqual(LevenshteinAligner(weights=make_weights()).dp_cells('kitten', 'kitchen'), 56)
+
+    def test_affix_mode(self):
+        self.assertEqual(LevenshteinAligner()._affix_mode(), 'trim')
+        weights = make_weights()
+        aligner = LevenshteinAligner(weights=weights)
+        self.assertEqual(aligner._affix_mode(), 'identity')
+        weights.set_weight('a', 'a', 0.5)
+        self.assertEqual(aligner._affix_mode(), None)
+
+    def test_same_results_as_reference(self):
+        balanced = LevenshteinWeights()
+        balanced.set_weight('a', 'b', 0.7)
+        balanced.set_weight(EPS, 'c', 0.8)
+        balanced.set_weight('b', EPS, 1.3)
+        for weights in (LevenshteinWeights(), balanced, make_weights()):
+            aligner = LevenshteinAligner(weights=weights)
+            for (source, target) in PAIRS + affix_pairs(300):
+                expected = reference_levenshtein(weights, source, target)
+                self.assertEqual(aligner.perform_levenshtein(source, target), expected)
+                self.assertEqual(aligner.count_alignments(source, target), len(expected[1]))
+                self.assertEqual(aligner.distance(source, target), expected[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
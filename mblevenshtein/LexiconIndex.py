@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from bisect import insort
+from .WeightedLevenshtein import LevenshteinWeights
+
+class LexiconIndex(object):
+    """A lexicon stored as a trie, for finding the entries closest to a
+    word under (possibly weighted) Levenshtein distance.
+
+    The word to look up is the source of the alignment and the lexicon
+    entries are its targets.  Every trie node holds one column of the
+    cost matrix, computed from the column of its parent, so entries with a
+    common prefix share that part of the work.  Since all weights are
+    non-negative, the costs in a column never decrease further down the
+    trie, and a subtree can be skipped as soon as the cheapest cell of its
+    column costs more than the k-th best entry found so far.
+    """
+    weights = None
+    epsilon = '<eps>'
+
+    def __init__(self, words=(), weights=None, epsilon='<eps>'):
+        if weights is None:
+            self.weights = LevenshteinWeights()
+        else:
+            self.weights = weights
+        self.epsilon = epsilon
+        # node 0 is the root; nodes are stored as parallel lists
+        self.chars    = [None]
+        self.children = [[]]
+        self.words    = [None]
+        self._lookup  = [{}]
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        node = 0
+        for char in word:
+            child = self._lookup[node].get(char)
+            if child is None:
+                child = len(self.chars)
+                self.chars.append(char)
+                self.children.append([])
+                self.words.append(None)
+                self._lookup.append({})
+                self._lookup[node][char] = child
+                self.children[node].append(child)
+            node = child
+        self.words[node] = word
+
+    def __len__(self):
+        return sum(1 for word in self.words if word is not None)
+
+    def __contains__(self, word):
+        node = 0
+        for char in word:
+            node = self._lookup[node].get(char)
+            if node is None:
+                return False
+        return self.words[node] is not None
+
+    def search(self, word, k=1, max_distance=None):
+        """Return the (at most) `k` lexicon entries closest to `word` as a
+        list of (cost, entry) tuples, sorted by cost and then by entry.
+        Entries costing more than `max_distance` are left out."""
+        if k <= 0:
+            return []
+        w = self.weights.get_weight
+        eps = self.epsilon
+        n = len(word)
+        del_costs = [w(char, eps) for char in word]
+        # insertion and substitution costs of every trie symbol, looked up
+        # only once per query
+        char_costs = {}
+        bound = float('inf') if max_distance is None else max_distance
+        results = []
+
+        root = [0.0]
+        for i in range(n):
+            root.append(root[i] + del_costs[i])
+        if self.words[0] is not None and root[n] <= bound:
+            results.append((root[n], self.words[0]))
+            if len(results) == k:
+                bound = root[n]
+
+        stack = [(0, root)]
+        while stack:
+            (node, prev) = stack.pop()
+            for child in self.children[node]:
+                char = self.chars[child]
+                costs = char_costs.get(char)
+                if costs is None:
+                    costs = (w(eps, char), [w(other, char) for other in word])
+                    char_costs[char] = costs
+                (ins_cost, sub_costs) = costs
+
+                curr = [prev[0] + ins_cost]
+                for i in range(n):
+                    curr.append(min(curr[i] + del_costs[i],
+                                    prev[i+1] + ins_cost,
+                                    prev[i] + sub_costs[i]))
+
+                entry = self.words[child]
+                if entry is not None and curr[n] <= bound:
+                    insort(results, (curr[n], entry))
+                    if len(results) > k:
+                        results.pop()
+                    if len(results) == k:
+                        bound = results[-1][0]
+                # costs only grow towards the leaves
+                if self.children[child] and min(curr) <= bound:
+                    stack.append((child, curr))
+        return results
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
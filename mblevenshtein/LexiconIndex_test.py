@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.LexiconIndex import LexiconIndex
+from mblevenshtein.Levenshtein_test import make_weights
+
+def random_words(count, alphabet='abceuh', max_len=7, seed=3):
+    rand = random.Random(seed)
+    return [''.join(rand.choice(alphabet) for _ in range(rand.randint(0, max_len)))
+            for _ in range(count)]
+
+def brute_force(aligner, lexicon, word, k, max_distance=None):
+    results = sorted((aligner.distance(word, entry), entry) for entry in set(lexicon))
+    if max_distance is not None:
+        results = [result for result in results if result[0] <= max_distance]
+    return results[:k]
+
+
+class TestLexiconIndex(unittest.TestCase):
+    def test_trie(self):
+        index = LexiconIndex(['jungfrau', 'jung', 'junker', 'jung'])
+        self.assertEqual(len(index), 3)
+        self.assertTrue('jung' in index)
+        self.assertFalse('jun' in index)
+        self.assertFalse('jungfrauen' in index)
+
+    def test_known_values(self):
+        index = LexiconIndex(['sitting', 'kitten', 'mitten', 'bitte'])
+        self.assertEqual(index.search('kitten'), [(0.0, 'kitten')])
+        self.assertEqual(index.search('sitten', k=3),
+                         [(1.0, 'kitten'), (1.0, 'mitten'), (2.0, 'bitte')])
+        self.assertEqual(index.search('xyz', k=2, max_distance=2), [])
+        self.assertEqual(index.search('kitten', k=0), [])
+
+    def test_same_results_as_brute_force(self):
+        lexicon = random_words(300)
+        for weights in (None, make_weights()):
+            aligner = LevenshteinAligner(weights=weights)
+            index = LexiconIndex(lexicon, weights=aligner.weights)
+            for word in random_words(40, seed=7):
+                for k in (1, 5):
+                    self.assertEqual(index.search(word, k=k),
+                                     brute_force(aligner, lexicon, word, k))
+                self.assertEqual(index.search(word, k=10, max_distance=1.5),
+                                 brute_force(aligner, lexicon, word, 10, 1.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys, json
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss():
+    """Peak resident set size of this process in kilobytes, or None where
+    it cannot be determined."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+class MetricsSink(object):
+    """Receives the events emitted during training, e.g. by
+    PMILevenshtein.train.  Every event is a dict with at least the key
+    'event', naming its kind; all values are plain numbers, strings,
+    lists or dicts, so they can be serialized as JSON."""
+
+    def emit(self, event):
+        raise NotImplementedError
+
+class ListSink(MetricsSink):
+    """Keeps all events in the list `events`."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+class CallbackSink(MetricsSink):
+    """Calls a function with every event."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, event):
+        self.callback(event)
+
+class JSONLinesSink(MetricsSink):
+    """Writes every event as one line of JSON to a file-like object."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, event):
+        self.stream.write(json.dumps(event, sort_keys=True))
+        self.stream.write('\n')
+        self.stream.flush()
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
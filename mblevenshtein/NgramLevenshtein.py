@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .Levenshtein import LevenshteinAligner
+from .Alignment import Alignment
+
+class RuleTrie(object):
+    """Index of multi-character rules such as ('th', 't') or ('<eps>', 'ie'),
+    keyed by their source side in a trie of reversed strings.
+
+    Walking back from a position of the source string through the trie
+    finds all rules whose source side ends there.  Every node holds the
+    target sides of its rules (the empty string standing for epsilon) with
+    their costs, and the distinct lengths of these target sides.
+    """
+
+    def __init__(self, rules, epsilon='<eps>'):
+        # every node is a list [children, targets, target lengths]
+        self.root = [{}, {}, []]
+        self.max_length = 0
+        self.size = 0
+        for ((source, target), cost) in rules:
+            self.add(source, target, cost, epsilon)
+
+    def add(self, source, target, cost, epsilon='<eps>'):
+        source = '' if source == epsilon else source
+        target = '' if target == epsilon else target
+        node = self.root
+        for char in reversed(source):
+            node = node[0].setdefault(char, [{}, {}, []])
+        if target not in node[1]:
+            node[2] = sorted(set(node[2]) | set([len(target)]))
+            self.size += 1
+        node[1][target] = cost
+        self.max_length = max(self.max_length, len(source))
+
+    def __len__(self):
+        return self.size
+
+    def matches(self, source, i):
+        """Return a list of (length, targets, target lengths) for all source
+        sides that end at position `i` of `source`, shortest first."""
+        node = self.root
+        found = []
+        if node[1]:
+            found.append((0, node[1], node[2]))
+        for k in range(1, min(i, self.max_length) + 1):
+            node = node[0].get(source[i-k])
+            if node is None:
+                break
+            if node[1]:
+                found.append((k, node[1], node[2]))
+        return found
+
+def is_ngram_rule(source, target, epsilon='<eps>'):
+    """True if the rule (`source`, `target`) is not a plain insertion,
+    deletion or substitution of a single symbol."""
+    ls = 0 if source == epsilon else len(source)
+    lt = 0 if target == epsilon else len(target)
+    return ls + lt > 0 and max(ls, lt) > 1
+
+class NgramLevenshteinAligner(LevenshteinAligner):
+    """LevenshteinAligner that also applies the multi-character rules of
+    its weights, as produced by PMILevenshtein.find_ngram_weights.
+
+    A rule (s, t) takes the cost matrix from cell (i - len(s), j - len(t))
+    to cell (i, j) if s ends at position i of the source and t at position
+    j of the target; in alignments, it shows up as the edit operation
+    (s, t).  The rules are indexed in a RuleTrie, so every cell only looks
+    at the rules that actually match there.  Single-symbol operations work
+    exactly as in LevenshteinAligner.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(NgramLevenshteinAligner, self).__init__(*args, **kwargs)
+        self._rule_trie = None
+        self._rule_generation = None
+
+    def rule_trie(self):
+        """Return the RuleTrie for the current weights, rebuilding it
+        whenever they have changed."""
+        weights = getattr(self.weights, '_snapshot', self.weights)
+        generation = (id(weights), getattr(weights, 'version', 0))
+        if self._rule_trie is None or self._rule_generation != generation:
+            eps = self.epsilon
+            rules = dict(((source, target), cost)
+                         for ((source, target), cost) in weights.weights.items()
+                         if is_ngram_rule(source, target, eps))
+            if weights.type == 'undirected':
+                for ((source, target), cost) in list(rules.items()):
+                    rules.setdefault((target, source), cost)
+            self._rule_trie = RuleTrie(rules.items(), eps)
+            self._rule_generation = generation
+        return self._rule_trie
+
+    def _has_unit_costs(self):
+        return len(self.rule_trie()) == 0 and self._weight_bounds()[1]
+
+    def _affix_mode(self):
+        # a rule can span the border of an affix
+        if len(self.rule_trie()):
+            return None
+        return super(NgramLevenshteinAligner, self)._affix_mode()
+
+    def _compute_backpointers(self, source, target, max_distance=None):
+        """Return the minimal cost and, for every cell (row-major, with
+        `len(target)+1` cells per row), the list of its predecessors on
+        co-optimal paths as (i, j, edit operation) tuples."""
+        return self._ngram_levenshtein(source, target, max_distance, True)
+
+    def _weighted_distance(self, source, target, max_distance=None):
+        return self._ngram_levenshtein(source, target, max_distance, False)[0]
+
+    def _ngram_levenshtein(self, source, target, max_distance, backpointers):
+        inf = float('inf')
+        n, m = len(source), len(target)
+        (ins_costs, del_costs, sub_row) = self._edit_costs(source, target)
+        trie = self.rule_trie()
+        eps = self.epsilon
+        stride = m + 1
+        d = [[inf] * stride for _ in range(n + 1)]
+        preds = [None] * ((n + 1) * stride) if backpointers else None
+
+        for i in range(n + 1):
+            rules = trie.matches(source, i)
+            sub_costs = sub_row(i - 1) if i > 0 else None
+            row = d[i]
+            for j in range(m + 1):
+                # candidates in the order insertion, deletion, substitution,
+                # then multi-character rules
+                candidates = []
+                if i == 0 and j == 0:
+                    candidates.append((0.0, None))
+                if j > 0:
+                    candidates.append((row[j-1] + ins_costs[j-1],
+                                       (i, j-1, (eps, target[j-1]))))
+                if i > 0:
+                    candidates.append((d[i-1][j] + del_costs[i-1],
+                                       (i-1, j, (source[i-1], eps))))
+                if i > 0 and j > 0:
+                    candidates.append((d[i-1][j-1] + sub_costs[j-1],
+                                       (i-1, j-1, (source[i-1], target[j-1]))))
+                for (ls, targets, lengths) in rules:
+                    for lt in lengths:
+                        if lt > j:
+                            break
+                        cost = targets.get(target[j-lt:j])
+                        if cost is None:
+                            continue
+                        op = (source[i-ls:i] if ls else eps,
+                              target[j-lt:j] if lt else eps)
+                        candidates.append((d[i-ls][j-lt] + cost, (i-ls, j-lt, op)))
+
+                best_cost = min(candidate[0] for candidate in candidates)
+                row[j] = best_cost
+                if preds is not None:
+                    preds[i*stride + j] = [edge for (cost, edge) in candidates
+                                           if edge is not None and cost <= best_cost]
+
+        cost = d[n][m]
+        if max_distance is not None and cost > max_distance:
+            return (inf, None)
+        return (cost, preds)
+
+    def _trace_alignments(self, source, target, bp, max_alignments=None, rest=None):
+        """Yield the alignments encoded in the predecessor lists `bp`,
+        trying the predecessors of every cell in their stored order; see
+        LevenshteinAligner._trace_alignments."""
+        if max_alignments is not None and max_alignments < 1:
+            return
+        stride = len(target) + 1
+        path = [Alignment() if rest is None else rest]
+        count = 0
+        # every frame holds a cell and the index of its next predecessor
+        frames = [[len(source), len(target), 0]]
+        while frames:
+            frame = frames[-1]
+            (i, j, k) = frame
+            edges = bp[i*stride + j]
+            if k < len(edges):
+                frame[2] = k + 1
+                (pi, pj, op) = edges[k]
+                path.append(path[-1].prepend(op))
+                frames.append([pi, pj, 0])
+            else:
+                if i == 0 and j == 0:
+                    yield path[-1]
+                    count += 1
+                    if count == max_alignments:
+                        return
+                frames.pop()
+                if len(path) > 1:
+                    path.pop()
+
+    def _predecessors(self, source, target, bp):
+        stride = len(target) + 1
+        return [[(pi*stride + pj, op) for (pi, pj, op) in edges] for edges in bp]
+
+    def _lattice(self, source, target):
+        preds = super(NgramLevenshteinAligner, self)._lattice(source, target)
+        trie = self.rule_trie()
+        eps = self.epsilon
+        stride = len(target) + 1
+        for i in range(len(source) + 1):
+            for (ls, targets, lengths) in trie.matches(source, i):
+                for j in range(stride):
+                    for lt in lengths:
+                        if lt > j:
+                            break
+                        cost = targets.get(target[j-lt:j])
+                        if cost is None:
+                            continue
+                        op = (source[i-ls:i] if ls else eps,
+                              target[j-lt:j] if lt else eps)
+                        preds[i*stride + j].append(((i-ls)*stride + j-lt, op, cost))
+        return preds
+
+    def count_alignments(self, source, target):
+        (k, l) = self._affixes(source, target)
+        (source, target) = (source[k:len(source)-l], target[k:len(target)-l])
+        (_, bp) = self._compute_backpointers(source, target)
+        stride = len(target) + 1
+        # predecessors always come earlier in row-major order
+        paths = [1]
+        for cell in range(1, len(bp)):
+            paths.append(sum(paths[pi*stride + pj] for (pi, pj, _) in bp[cell]))
+        return paths[-1]
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+from itertools import product
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.NgramLevenshtein import NgramLevenshteinAligner, RuleTrie
+from mblevenshtein.WeightedLevenshtein import LevenshteinWeights
+from mblevenshtein.Levenshtein_test import EPS, PAIRS, random_pairs, make_weights, \
+     count_ngrams_of
+
+def make_ngram_weights():
+    weights = make_weights()
+    weights.set_weight('th', 't', 0.2)
+    weights.set_weight(EPS, 'ie', 0.3)
+    weights.set_weight('uu', EPS, 0.4)
+    weights.set_weight('cz', 'tz', 0.5)
+    weights.set_weight('a', 'bc', 0.1)
+    return weights
+
+def brute_force_distance(weights, source, target, rules):
+    """Shortest path over all single-symbol operations and `rules`,
+    without any index."""
+    w = weights.get_weight
+    n, m = len(source), len(target)
+    d = [[float('inf')] * (m + 1) for _ in range(n + 1)]
+    d[0][0] = 0.0
+    for (i, j) in product(range(n + 1), range(m + 1)):
+        steps = [(0, 1, EPS, target[j-1:j]), (1, 0, source[i-1:i], EPS),
+                 (1, 1, source[i-1:i], target[j-1:j])]
+        for (s, t) in rules:
+            ls = 0 if s == EPS else len(s)
+            lt = 0 if t == EPS else len(t)
+            if source[i-ls:i] == (s if ls else '') and target[j-lt:j] == (t if lt else ''):
+                steps.append((ls, lt, s, t))
+        for (ls, lt, s, t) in steps:
+            if ls <= i and lt <= j and (ls or lt):
+                d[i][j] = min(d[i][j], d[i-ls][j-lt] + w(s, t))
+    return d[n][m]
+
+
+class TestRuleTrie(unittest.TestCase):
+    def test_matches(self):
+        trie = RuleTrie([(('th', 't'), 0.2), (('h', 'hh'), 0.1),
+                         ((EPS, 'ie'), 0.3), (('th', EPS), 0.4)])
+        self.assertEqual(len(trie), 4)
+        matches = trie.matches('ath', 3)
+        self.assertEqual([(ls, sorted(targets)) for (ls, targets, _) in matches],
+                         [(0, ['ie']), (1, ['hh']), (2, ['', 't'])])
+        self.assertEqual(matches[2][2], [0, 1])
+        self.assertEqual([ls for (ls, _, _) in trie.matches('ath', 2)], [0])
+
+
+class TestNgramLevenshteinAligner(unittest.TestCase):
+    def test_same_results_without_ngram_rules(self):
+        weights = make_weights()
+        plain = LevenshteinAligner(weights=weights)
+        ngram = NgramLevenshteinAligner(weights=weights)
+        for (source, target) in PAIRS + random_pairs(100, alphabet='abceuh'):
+            self.assertEqual(ngram.perform_levenshtein(source, target),
+                             plain.perform_levenshtein(source, target))
+            self.assertEqual(ngram.distance(source, target),
+                             plain.distance(source, target))
+
+    def test_rules_are_applied(self):
+        aligner = NgramLevenshteinAligner(weights=make_ngram_weights())
+        (cost, alignments) = aligner.perform_levenshtein('thir', 'tier')
+        self.assertAlmostEqual(cost, 0.2 + 1.0)
+        self.assertTrue(len(alignments) > 0)
+        for alignment in alignments:
+            self.assertTrue(('th', 't') in alignment)
+        self.assertEqual(aligner.perform_levenshtein('zuuz', 'zz'),
+                         (0.4, [[('z', 'z'), ('uu', EPS), ('z', 'z')]]))
+
+    def test_matches_brute_force(self):
+        weights = make_ngram_weights()
+        rules = [rule for rule in weights.weights if max(map(len, rule)) > 1 and EPS not in rule
+                 or rule in ((EPS, 'ie'), ('uu', EPS))]
+        aligner = NgramLevenshteinAligner(weights=weights)
+        for (source, target) in PAIRS + random_pairs(200, alphabet='abcehituz'):
+            (cost, alignments) = aligner.perform_levenshtein(source, target)
+            self.assertAlmostEqual(cost, brute_force_distance(weights, source, target, rules))
+            self.assertAlmostEqual(aligner.distance(source, target), cost)
+            self.assertEqual(aligner.count_alignments(source, target), len(alignments))
+            for alignment in alignments:
+                self.assertEqual(''.join(s for (s, _) in alignment if s != EPS), source)
+                self.assertEqual(''.join(t for (_, t) in alignment if t != EPS), target)
+                self.assertAlmostEqual(sum(weights.get_weight(s, t) for (s, t) in alignment), cost)
+
+    def test_count_ngrams(self):
+        aligner = NgramLevenshteinAligner(weights=make_ngram_weights())
+        for (source, target) in PAIRS + [('thuuabc', 'tabcie'), ('czaa', 'tzbcbc')]:
+            alignments = aligner.align(source, target)
+            (paths, counts) = aligner.count_ngrams(source, target, 2)
+            self.assertEqual(paths, len(alignments))
+            self.assertEqual(counts, count_ngrams_of(alignments, 2))
+            # n-gram rules are edges of the lattice as well
+            soft = aligner.expected_ngrams(source, target, 0.001, 2, min_count=1e-9)
+            self.assertEqual(set(soft), set(counts))
+            for (ngram, count) in counts.items():
+                self.assertAlmostEqual(soft[ngram], float(count) / paths)
+
+    def test_weight_changes_rebuild_the_trie(self):
+        weights = LevenshteinWeights()
+        aligner = NgramLevenshteinAligner(weights=weights)
+        self.assertEqual(aligner.distance('th', 't'), 1.0)
+        weights.set_weight('th', 't', 0.5)
+        self.assertEqual(aligner.distance('th', 't'), 0.5)
+        self.assertEqual(aligner.distance('th', 't', max_distance=0.4), float('inf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
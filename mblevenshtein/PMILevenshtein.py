@@ -1,14 +1,22 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import os, sys, math
+import os, sys, math, time
 import argparse
+import gzip, json
 from collections import defaultdict
 from operator import itemgetter
 from itertools import tee
+from functools import partial
+from multiprocessing import Pool
+from six import iteritems
 from six.moves import zip as izip
 from .WeightedLevenshtein import LevenshteinWeights
 from .Levenshtein import LevenshteinAligner
+from .Metrics import peak_rss
+from .RuleStatistics import RuleTable, PathCounts, count_rules, count_rule_paths, \
+    write_rule_counts, read_rule_counts, merge_rule_counts
+import numpy as np
 
 def groupwise(iterable, n=2):
     tees = tee(iterable, n)
@@ -30,6 +38,57 @@ def make_ruleset_ngrams(rs, n):
             ngrams.append(x)
     return ngrams
 
+class PairIndex(object):
+    """Index from symbols to the pairs that contain them, used to find the
+    pairs whose alignment may depend on the weight of a given rule."""
+
+    def __init__(self, pairs, epsilon):
+        self.epsilon = epsilon
+        self.by_source = defaultdict(set)
+        self.by_target = defaultdict(set)
+        for pair in pairs:
+            (source, target) = pair
+            for char in source:
+                self.by_source[char].add(pair)
+            for char in target:
+                self.by_target[char].add(pair)
+
+    def affected_pairs(self, rule):
+        """Return all pairs with every symbol of the rule's left-hand side
+        in their source and every symbol of its right-hand side in their
+        target (a superset of the pairs that can use the rule)."""
+        candidates = None
+        for (side, index) in zip(rule, (self.by_source, self.by_target)):
+            if side == self.epsilon:
+                continue
+            for char in set(side):
+                pairs = index.get(char, set())
+                candidates = pairs if candidates is None else (candidates & pairs)
+        # a rule from epsilon to epsilon is never used
+        return candidates if candidates is not None else set()
+
+# aligner of a worker process, see PMILevenshtein.perform_alignments
+_worker_aligner = None
+_worker_max_alignments = None
+_worker_counter = None
+
+def _init_worker(aligner_class, weights, epsilon, max_alignments, counter=None):
+    global _worker_aligner, _worker_max_alignments, _worker_counter
+    _worker_aligner = aligner_class(weights=weights, epsilon=epsilon)
+    _worker_max_alignments = max_alignments
+    _worker_counter = counter
+
+def _align_chunk(pairs):
+    if _worker_counter is not None:
+        return [_worker_counter(_worker_aligner, source, target)
+                for (source, target) in pairs]
+    return _worker_aligner.align_batch(pairs, _worker_max_alignments)
+
+# format of the files written by PMILevenshtein.save_checkpoint
+CHECKPOINT_VERSION = 2
+# training options saved in checkpoints, which every run on them must share
+CHECKPOINT_SETTINGS = ('rule_counting', 'ngrams', 'learning_rate', 'temperature')
+
 class PMILevenshtein(object):
     """Class to train weights using PMI algorithm."""
     weights = None
@@ -37,8 +96,40 @@ class PMILevenshtein(object):
     alignments = {}
     ngrams  = 1
     epsilon = "<eps>"
+    # only use the first N co-optimal alignments of every pair (None = all)
+    max_alignments = None
+    # class used to align the pairs, e.g. NumpyLevenshteinAligner
+    aligner_class = LevenshteinAligner
+    # number of processes used to align the pairs
+    workers = 1
+    # only re-align pairs that can use a rule whose weight changed by more
+    # than this since the pair was last aligned; None turns the tracking
+    # off and re-aligns all pairs in every cycle.  0.0 is exact, but as
+    # the identity rules change in every cycle and match almost every
+    # pair, it saves next to nothing; it serves as a reference for the
+    # results of larger tolerances
+    dirty_tolerance = None
+    # MetricsSink that receives an event for every stage of the training
+    metrics = None
+    # how the rules are counted during training: 'alignments' goes through
+    # the co-optimal alignments of every pair, 'paths' counts the rules on
+    # all of them at once (see LevenshteinAligner.count_ngrams), in time
+    # proportional to the size of the matrix rather than to the number of
+    # alignments; the frequencies are the same, but 'paths' always covers
+    # all alignments regardless of max_alignments.  'expected' uses soft
+    # counts instead: the expected frequencies over all alignments, where
+    # every alignment has a probability proportional to exp(-cost/T) (see
+    # LevenshteinAligner.expected_ngrams)
+    rule_counting = 'alignments'
+    # the temperature T of rule_counting 'expected'; the lower, the closer
+    # the counts are to those of the co-optimal alignments
+    temperature = 0.1
+    # expected counts per pair up to this are dropped
+    min_expected_count = 1e-6
 
     convergence_quota = 0.001
+    # maximum number of training cycles
+    max_cycles = 19
     min_freq_divisor = 6.293
 
     # how fast weights are adjusted
@@ -47,10 +138,18 @@ class PMILevenshtein(object):
     # Current distance formula used:
     # (max_pmi - pmi) / max(max_pmi - pmi)
 
-    def __init__(self):
+    def __init__(self, workers=1, metrics=None):
         self.weights = LevenshteinWeights()
         self.weights.setDirected(True)
         self.pairs = defaultdict(int)
+        self.workers = workers
+        self.metrics = metrics
+        # number of pairs aligned in every cycle of the last training
+        self.realigned = []
+        # number of DP cells computed since the last reset; only counted
+        # while a metrics sink is attached
+        self.cells_computed = 0
+        self._rule_table = None
 
     def add_pair(self, source, target):
         self.pairs[(source, target)] += 1
@@ -58,38 +157,149 @@ class PMILevenshtein(object):
     def get_pair_count(self):
         return sum(map(itemgetter(1), self.pairs.items()))
 
-    def perform_alignments(self):
+    def rule_counter(self):
+        """Return a function from an aligner, a source and a target to the
+        PathCounts of the pair, as counted with the current rule_counting,
+        or None if the rules are counted on the alignments."""
+        if self.rule_counting == 'paths':
+            return partial(PathCounts.count, n=self.ngrams)
+        if self.rule_counting == 'expected':
+            return partial(PathCounts.expected, n=self.ngrams,
+                           temperature=self.temperature,
+                           min_count=self.min_expected_count)
+        if self.rule_counting != 'alignments':
+            raise ValueError("unknown rule counting: %r" % self.rule_counting)
+        return None
+
+    def perform_alignments(self, pairs=None, counting=None):
+        """Return a dict from all (or the given) pairs to their co-optimal
+        alignments, or, if `counting` (which defaults to rule_counting not
+        being 'alignments'), to the PathCounts of their rules."""
+        if counting is None:
+            counting = self.rule_counting != 'alignments'
+        counter = self.rule_counter() if counting else None
         alignments = {}
-        leven = LevenshteinAligner(weights=self.weights, epsilon=self.epsilon)
-        for pair in self.pairs:
-            alignments[pair] = leven.align(*pair)
+        pairs = list(self.pairs if pairs is None else pairs)
+        leven = self.aligner_class(weights=self.weights, epsilon=self.epsilon)
+        if self.metrics is not None:
+            if counter is not None:
+                # rules are counted on the whole matrix
+                self.cells_computed += sum((len(source) + 1) * (len(target) + 1)
+                                           for (source, target) in pairs)
+            else:
+                self.cells_computed += sum(leven.dp_cells(source, target)
+                                           for (source, target) in pairs)
+        if self.workers > 1 and len(pairs) > 1:
+            results = self.align_in_parallel(pairs, counter)
+        else:
+            if counter is not None:
+                results = [counter(leven, source, target) for (source, target) in pairs]
+            else:
+                results = leven.align_batch(pairs, self.max_alignments)
+        for (pair, rulesets) in izip(pairs, results):
+            alignments[pair] = rulesets
         return alignments
 
-    def find_ngram_weights(self, n=2):
-        def make_ruleset_ngrams(rs, n):
-            ngrams = [[x] for x in rs]
-            for i in range(1,n):
-                for x in groupwise(rs, n=i+1):
-                    ngrams.append(x)
-            return ngrams
+    def update_alignments(self, alignments, aligned_with, index):
+        """Re-align the pairs in `alignments` that can use a rule whose
+        weight differs from its value in `aligned_with` by more than
+        `self.dirty_tolerance`.  `aligned_with` is a copy of the weights
+        the alignments were computed with; it is updated for the rules
+        that triggered a re-alignment.  Returns the number of re-aligned
+        pairs."""
+        tolerance = self.dirty_tolerance
+        current, old = self.weights, aligned_with
+        dirty = []
+        for rule in set(current.weights) | set(old.weights):
+            if abs(current.get_weight(*rule) - old.get_weight(*rule)) > tolerance:
+                dirty.append(rule)
+
+        pairs = set()
+        undirected = current.type == 'undirected'
+        for rule in dirty:
+            pairs |= index.affected_pairs(rule)
+            # undirected weights also apply to the reverse rule
+            if undirected:
+                pairs |= index.affected_pairs((rule[1], rule[0]))
+            if rule in current.weights:
+                old.set_weight(rule[0], rule[1], current.weights[rule])
+            else:
+                del old.weights[rule]
+        if pairs:
+            alignments.update(self.perform_alignments(pairs))
+        return len(pairs)
+
+    def realign(self, alignments, aligned_with, index):
+        """Return alignments for the current weights, either re-aligning
+        all pairs or, if tracking changed weights, only the affected ones
+        (see update_alignments)."""
+        if alignments is None or aligned_with is None:
+            self.realigned.append(len(self.pairs))
+            return self.perform_alignments()
+        self.realigned.append(self.update_alignments(alignments, aligned_with, index))
+        return alignments
 
-        a = 0.5 ### additive smoothing
-        alignments = self.alignments
-        lhs = defaultdict(int)
-        ngrams = defaultdict((lambda: defaultdict(int)))
-        for (pair, rulesets) in alignments.iteritems():
+    def align_in_parallel(self, pairs, counter=None):
+        """Align `pairs` (or count their rules with `counter`, see
+        rule_counter) with a pool of `self.workers` processes.  Every process receives a
+        snapshot of the current weights once, when it is started; the pairs
+        are then handed out in contiguous chunks, and the results are
+        returned in the order of `pairs`."""
+        chunk_size = max(1, len(pairs) // (self.workers * 8))
+        chunks = [pairs[i:i+chunk_size] for i in range(0, len(pairs), chunk_size)]
+        initargs = (self.aligner_class, self.weights, self.epsilon,
+                    self.max_alignments, counter)
+        pool = Pool(self.workers, initializer=_init_worker, initargs=initargs)
+        try:
+            results = []
+            for chunk_results in pool.imap(_align_chunk, chunks):
+                results.extend(chunk_results)
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
+    def ngram_occurrences(self, n=2):
+        """Yield every n-gram of up to `n` edit operations in the final
+        alignments of all pairs, together with the number of times it
+        occurs there.  With rule_counting 'paths', every distinct n-gram of
+        a pair is yielded only once, counted over all of its co-optimal
+        alignments under the current weights (see
+        LevenshteinAligner.count_ngrams), so the final alignments need not
+        have been generated; with 'expected', it is counted with its
+        expected number of occurrences instead."""
+        if self.rule_counting != 'alignments':
+            leven = self.aligner_class(weights=self.weights, epsilon=self.epsilon)
+            for (source, target) in self.pairs:
+                value = self.pairs[(source, target)]
+                if self.rule_counting == 'expected':
+                    counts = leven.expected_ngrams(source, target, self.temperature, n,
+                                                   self.min_expected_count)
+                else:
+                    (_, counts) = leven.count_ngrams(source, target, n)
+                for (ngram_rule, count) in iteritems(counts):
+                    yield (ngram_rule, count * value)
+            return
+        for (pair, rulesets) in iteritems(self.alignments):
             value = self.pairs[pair]
             for ruleset in rulesets:
                 for ngram_rule in make_ruleset_ngrams(ruleset, n=n):
-                    source = ''.join(map(itemgetter(0), ngram_rule))
-                    target = ''.join(map(itemgetter(1), ngram_rule))
-                    # hacky as can be
-                    if source != self.epsilon:
-                        source = source.replace(self.epsilon,'')
-                    if target != self.epsilon:
-                        target = target.replace(self.epsilon,'')
-                    lhs[source] += value
-                    ngrams[source][target] += value
+                    yield (ngram_rule, value)
+
+    def find_ngram_weights(self, n=2):
+        a = 0.5 ### additive smoothing
+        lhs = defaultdict(int)
+        ngrams = defaultdict((lambda: defaultdict(int)))
+        for (ngram_rule, value) in self.ngram_occurrences(n):
+            source = ''.join(map(itemgetter(0), ngram_rule))
+            target = ''.join(map(itemgetter(1), ngram_rule))
+            # hacky as can be
+            if source != self.epsilon:
+                source = source.replace(self.epsilon,'')
+            if target != self.epsilon:
+                target = target.replace(self.epsilon,'')
+            lhs[source] += value
+            ngrams[source][target] += value
         weights = {}
 
         ### Idea: too unfrequent rule sources get penalized by
@@ -97,48 +307,98 @@ class PMILevenshtein(object):
         ### calculation
         minlevel = self.get_pair_count() / self.min_freq_divisor
 
-        for (source, tdict) in ngrams.iteritems():
+        for (source, tdict) in iteritems(ngrams):
             probbase = max(lhs[source], minlevel)
-            for (target, freq) in tdict.iteritems():
+            for (target, freq) in iteritems(tdict):
                 ### conditional probability p(RHS|LHS) with additive smoothing
                 prob = ((freq * 1.0) + a) / (probbase + (a * len(tdict)))
                 dist = -math.log(prob)
                 weights[(source,target)] = dist
         return weights
 
+    def rule_table(self):
+        """Return the RuleTable that interns the rules of all cycles."""
+        if self._rule_table is None or self._rule_table.epsilon != self.epsilon:
+            self._rule_table = RuleTable(self.epsilon)
+        return self._rule_table
+
+    def count_rules(self, alignments):
+        """Return the frequencies of the rules in `alignments` as
+        RuleCounts (see collect_rules_by_freq); `alignments` can also hold
+        the PathCounts of every pair (see perform_alignments)."""
+        if any(isinstance(value, PathCounts) for value in alignments.values()):
+            return count_rule_paths(self.rule_table(), alignments, self.pairs)
+        return count_rules(self.rule_table(), alignments, self.pairs, self.ngrams)
+
     def collect_rules_by_freq(self, alignments):
         rules_by_freq = defaultdict(int)
-        for (pair, rulesets) in alignments.iteritems():
-            value = self.pairs[pair]
-            for ruleset in rulesets:
-                for rule in make_ruleset_ngrams(ruleset, n=self.ngrams):
-                    source = ''.join(map(itemgetter(0), rule))
-                    target = ''.join(map(itemgetter(1), rule))
-                    # hacky as can be
-                    if source != self.epsilon:
-                        source = source.replace(self.epsilon,'')
-                    if target != self.epsilon:
-                        target = target.replace(self.epsilon,'')
-                    rules_by_freq[(source, target)] += value
+        rules_by_freq.update(self.count_rules(alignments).as_dict())
         return rules_by_freq
 
+    # The following methods do the same as calculate_probabilities,
+    # calculate_distances and adjust_weights, with arrays in the order of
+    # the RuleCounts instead of dicts, and produce the very same numbers.
+
+    def rule_probabilities(self, counts):
+        """Return arrays with the probabilities of every rule and of its
+        source and its target."""
+        table = self.rule_table()
+        freqs = counts.freqs
+        total = float(freqs.sum())
+        sources = table.source_ids(counts.ids)
+        targets = table.target_ids(counts.ids)
+        # the marginals sum up to the same total as the rules
+        freq_source = np.zeros(len(table.sources), dtype=freqs.dtype)
+        np.add.at(freq_source, sources, freqs)
+        freq_target = np.zeros(len(table.targets), dtype=freqs.dtype)
+        np.add.at(freq_target, targets, freqs)
+        return ((freqs / total).astype(float),
+                (freq_source / total).astype(float)[sources],
+                (freq_target / total).astype(float)[targets])
+
+    def rule_distances(self, pr, ps, pt):
+        """Return an array with the normalized PMI distance of every rule."""
+        # math.log, as NumPy's log can differ from it in the last bit
+        log = math.log
+        pmi = np.array([log(ratio, 2) for ratio in (pr / (ps * pt)).tolist()])
+        max_pmi  = pmi.max()
+        max_dist = max_pmi - pmi.min()
+        if max_dist == 0:  # edge case -- shouldn't happen on real data
+            return np.full(len(pmi), float(sys.maxsize))
+        return (max_pmi - pmi) / max_dist
+
+    def adjust_rule_weights(self, counts, distances):
+        """Move the weight of every rule towards its distance, and return
+        the list of absolute changes."""
+        factor = self.learning_rate
+        rules = counts.rules()
+        if self.weights.type == 'undirected':
+            # the new weight of a rule can be the old one of its reverse
+            return self.adjust_weights(dict(zip(rules, distances.tolist())))
+        getw = self.weights.get_weight
+        old_weights = np.array([getw(source, target) for (source, target) in rules])
+        new_weights  = old_weights * (1.0 - factor)
+        new_weights += distances * factor
+        self.weights.set_weights(zip(rules, new_weights.tolist()))
+        return np.abs(old_weights - new_weights).tolist()
+
     def calculate_probabilities(self, rules):
         p_rule, p_source, p_target = {}, {}, {}
         freq_source, freq_target = defaultdict(int), defaultdict(int)
         total_alignments = sum(rules.values())
 
-        for (rule, freq) in rules.iteritems():
+        for (rule, freq) in iteritems(rules):
             p_rule[rule] = float(freq) / total_alignments
             (source, target) = rule
             freq_source[source] += freq
             freq_target[target] += freq
 
         total_source = sum(freq_source.values())
-        for (source, freq) in freq_source.iteritems():
+        for (source, freq) in iteritems(freq_source):
             p_source[source] = float(freq) / total_source
 
         total_target = sum(freq_target.values())
-        for (target, freq) in freq_target.iteritems():
+        for (target, freq) in iteritems(freq_target):
             p_target[target] = float(freq) / total_target
 
         return (p_rule, p_source, p_target)
@@ -156,7 +416,7 @@ class PMILevenshtein(object):
             dist = {}
             for rule in rules:
                 if max_dist == 0:  # edge case -- shouldn't happen on real data
-                    dist[rule] = sys.maxint
+                    dist[rule] = sys.maxsize
                 else:
                     dist[rule] = (max_pmi - pmi[rule]) / max_dist
         elif method=='mine':
@@ -176,7 +436,7 @@ class PMILevenshtein(object):
         getw = self.weights.get_weight
         setw = self.weights.set_weight
         diffs = []
-        for (rule, dist) in distances.iteritems():
+        for (rule, dist) in iteritems(distances):
             (source, target) = rule
             old_weight   = getw(source, target)
             new_weight   = old_weight * (1.0 - factor)
@@ -197,38 +457,261 @@ class PMILevenshtein(object):
 #            return False
 #        return True
 
-    def train(self, log_to=sys.stderr):
+    def save_checkpoint(self, filename, cycle, avg_delta, converged=False, stopped=False):
+        """Save the state of the training after `cycle` to `filename`: the
+        weights, the pair counts, and what the next cycle needs to know
+        about the previous ones; `stopped` means that the training reached
+        its maximum number of cycles.  The training options in
+        CHECKPOINT_SETTINGS are saved as well.  The file is gzipped JSON; it is
+        replaced atomically, so an interrupted write leaves the old one
+        intact."""
+        state = {'version': CHECKPOINT_VERSION,
+                 'cycle': cycle, 'avg_delta': avg_delta, 'converged': converged,
+                 'stopped': stopped,
+                 'settings': dict((name, getattr(self, name)) for name in CHECKPOINT_SETTINGS),
+                 'realigned': self.realigned,
+                 'epsilon': self.epsilon,
+                 'type': self.weights.type,
+                 'weights': [[source, target, weight] for ((source, target), weight)
+                             in iteritems(self.weights.weights)],
+                 'pairs': [[source, target, count] for ((source, target), count)
+                           in iteritems(self.pairs)]}
+        data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        temp = '%s.%i.tmp' % (filename, os.getpid())
+        with gzip.open(temp, 'wb') as f:
+            f.write(data)
+        getattr(os, 'replace', os.rename)(temp, filename)
+
+    def load_checkpoint(self, filename):
+        """Restore the weights and pair counts saved by save_checkpoint and
+        return the saved state as a dict.  The training options in
+        CHECKPOINT_SETTINGS must be the same as in the checkpoint, and so
+        must the pairs, if any have been added already."""
+        with gzip.open(filename, 'rb') as f:
+            state = json.loads(f.read().decode('utf-8'))
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError("Not a PMI checkpoint: %s" % filename)
+        for name in CHECKPOINT_SETTINGS:
+            if state['settings'][name] != getattr(self, name):
+                raise ValueError("Checkpoint %s was made with %s = %r, not %r"
+                                 % (filename, name, state['settings'][name], getattr(self, name)))
+        pairs = dict(((source, target), count) for (source, target, count) in state['pairs'])
+        if self.pairs and dict(self.pairs) != pairs:
+            raise ValueError("Checkpoint %s was made from different pairs" % filename)
+        self.pairs = defaultdict(int, pairs)
+        self.epsilon = state['epsilon']
+        self.weights.reset_weights()
+        self.weights.type = state['type']
+        self.weights.set_weights(((source, target), weight)
+                                 for (source, target, weight) in state['weights'])
+        self.realigned = state['realigned']
+        return state
+
+    # Sharded training: a checkpoint (see save_checkpoint) holds the state
+    # of the training, including the current weights, and is shared by all
+    # machines.  In every cycle, count_shard aligns one shard of the pairs
+    # and writes the counts of their rules to a file; merge_shards adds up
+    # the counts of all shards, adjusts the weights, and saves the next
+    # checkpoint.  Finally, train(resume_from=...) generates the final
+    # alignments.  The weights are the same as those of train without
+    # dirty_tolerance, except for rounding with rule_counting 'expected'.
+
+    def shard_pairs(self, shard, shards):
+        """Return the pairs of shard number `shard` (counting from 0) out of
+        `shards`, which are consecutive runs of the pairs."""
+        pairs = list(self.pairs)
+        return pairs[len(pairs) * shard // shards:len(pairs) * (shard + 1) // shards]
+
+    def count_shard(self, state, shard, shards, filename):
+        """Align the pairs of a shard (see shard_pairs) with the weights of
+        the checkpoint `state`, and write the counts of their rules to
+        `filename`."""
+        cycle = self.load_checkpoint(state)['cycle']
+        rules = self.count_rules(self.perform_alignments(self.shard_pairs(shard, shards)))
+        write_rule_counts(filename, rules, cycle=cycle, shard=shard, shards=shards)
+
+    def merge_shards(self, state, filenames, max_cycles=None):
+        """Merge the rule counts written by count_shard for all shards of
+        the checkpoint `state`, adjust the weights, and replace the
+        checkpoint with the one for the next cycle.  Returns True if
+        another cycle is needed."""
+        if max_cycles is None:
+            max_cycles = self.max_cycles
+        saved = self.load_checkpoint(state)
+        cycle = saved['cycle'] + 1
+        if saved['converged'] or cycle > max_cycles:
+            return False
+        parts = sorted((read_rule_counts(filename) for filename in filenames),
+                       key=itemgetter('shard'))
+        if [(part['cycle'], part['shard'], part['shards']) for part in parts] != \
+                [(saved['cycle'], shard, len(parts)) for shard in range(len(parts))]:
+            raise ValueError("Rule counts are not those of all shards of cycle %i"
+                             % saved['cycle'])
+        rules = merge_rule_counts(self.rule_table(), [part['rules'] for part in parts])
+        delta = self.adjust_rule_weights(rules, self.rule_distances(
+            *self.rule_probabilities(rules)))
+        self.realigned.append(len(self.pairs))
+        avg_delta = sum(delta) * 1.0 / len(delta)
+        converged = abs(avg_delta - saved['avg_delta']) <= self.convergence_quota
+        stopped = not converged and cycle >= max_cycles
+        self.save_checkpoint(state, cycle, avg_delta, converged, stopped)
+        return not (converged or stopped)
+
+    def _emit(self, event, **values):
+        values['event'] = event
+        self.metrics.emit(values)
+
+    def alignment_stats(self, alignments):
+        """Return statistics on `alignments` for metrics events."""
+        counts = [rulesets.paths if isinstance(rulesets, PathCounts) else len(rulesets)
+                  for rulesets in alignments.values()]
+        # expected counts do not go through a number of alignments
+        counts = [count for count in counts if count is not None]
+        if not counts:
+            return {'alignments_max': 0, 'alignments_mean': 0.0}
+        return {'alignments_max': max(counts),
+                'alignments_mean': float(sum(counts)) / len(counts)}
+
+    def train(self, log_to=sys.stderr, workers=None, final_alignments=True, metrics=None,
+              resume_from=None, checkpoint=None, checkpoint_every=1,
+              max_cycles=None, time_budget=None):
+        """Train the weights on the added pairs.  Unless `final_alignments`
+        is false, `alignments` is set to the alignments of all pairs under
+        the final weights; otherwise, it is left unchanged.
+
+        With `checkpoint`, the state of the training is saved to that file
+        every `checkpoint_every` cycles and when the training stops (see
+        save_checkpoint); `resume_from` continues the training saved in
+        such a file with the cycle after the saved one.  Training stops
+        after `max_cycles` cycles in total (default: the attribute of the
+        same name; a checkpoint saved on reaching this limit is only
+        trained further if `max_cycles` is given explicitly), or, with a `time_budget` in seconds, after the cycle
+        at whose end the next one would be expected to exceed it.  The
+        final alignments are generated either way.  With dirty_tolerance,
+        all pairs are re-aligned in the first cycle after resuming.
+
+        If a MetricsSink is attached (via `metrics` or the attribute of the
+        same name), it receives a 'train_start' event, a 'cycle' event with
+        the timings of every stage of every cycle, a 'final_alignments'
+        event and a 'train_end' event."""
+        if workers is not None:
+            self.workers = workers
+        if metrics is not None:
+            self.metrics = metrics
+        sink = self.metrics
+        clock = time.time
+
         def log(msg):
             if log_to:
                 log_to.write(msg)
 
-        avg_delta = sys.maxint
-        for i in range(1, 20):
+        extend = max_cycles is not None
+        if max_cycles is None:
+            max_cycles = self.max_cycles
+        start = clock()
+        self.realigned = []
+        self.cells_computed = 0
+        avg_delta = sys.maxsize
+        converged = False
+        first = 1
+        if resume_from is not None:
+            state = self.load_checkpoint(resume_from)
+            (first, avg_delta, converged) = (state['cycle'] + 1, state['avg_delta'],
+                                             state['converged'])
+            if state['stopped'] and not extend:
+                max_cycles = state['cycle']
+            log("[PMI] Resuming after cycle %i.\n" % state['cycle'])
+
+        tracking = self.dirty_tolerance is not None
+        (alignments, aligned_with, index) = (None, None, None)
+        if tracking:
+            aligned_with = self.weights.copy()
+            index = PairIndex(self.pairs, self.epsilon)
+        if sink is not None:
+            self._emit('train_start', pairs=len(self.pairs),
+                      tokens=self.get_pair_count(), workers=self.workers,
+                      tracking=tracking, first_cycle=first)
+
+        # a checkpoint may have been saved on convergence or at the limit
+        last = first - 1 if converged else max_cycles
+        i = first - 1
+        out_of_time = False
+        for i in range(first, last + 1):
             # calculate new alignments
             log("[PMI] Performing cycle %2i..." % i)
-            alignments = self.perform_alignments()
+            t_start = clock()
+            alignments = self.realign(alignments, aligned_with, index)
+            t_align = clock()
             # derive rule frequency statistics
-            rules = self.collect_rules_by_freq(alignments)
+            rules = self.count_rules(alignments)
+            t_collect = clock()
             # calculate rule and character probabilities
-            (pr, ps, pt) = self.calculate_probabilities(rules)
+            (pr, ps, pt) = self.rule_probabilities(rules)
+            t_prob = clock()
             # calculate distance values based on PMI
-            distances = self.calculate_distances(rules, pr, ps, pt)
+            distances = self.rule_distances(pr, ps, pt)
+            t_dist = clock()
             # adjust edit distance weights
-            delta = self.adjust_weights(distances)
+            delta = self.adjust_rule_weights(rules, distances)
+            t_adjust = clock()
             prv_delta = avg_delta
             avg_delta = sum(delta) * 1.0 / len(delta)
-            log(" avg delta: %.4f\n" % avg_delta)
+            if tracking:
+                log(" avg delta: %.4f, re-aligned %i/%i pairs\n"
+                    % (avg_delta, self.realigned[-1], len(self.pairs)))
+            else:
+                log(" avg delta: %.4f\n" % avg_delta)
+            if sink is not None:
+                event = self.alignment_stats(alignments)
+                event.update(
+                    cycle=i, avg_delta=avg_delta, rules=len(rules),
+                    realigned=self.realigned[-1], dp_cells=self.cells_computed,
+                    peak_rss_kb=peak_rss(),
+                    seconds={'align': t_align - t_start,
+                             'collect_rules_by_freq': t_collect - t_align,
+                             'calculate_probabilities': t_prob - t_collect,
+                             'calculate_distances': t_dist - t_prob,
+                             'adjust_weights': t_adjust - t_dist})
+                self._emit('cycle', **event)
+                self.cells_computed = 0
             # if edit distance weights have not changed significantly,
             # convergence is reached
             if abs(avg_delta - prv_delta) <= self.convergence_quota:
                 log("[PMI] Convergence reached.  Stopping.\n")
+                converged = True
+            elif (time_budget is not None
+                  and (clock() - start) + (clock() - t_start) > time_budget):
+                # another cycle like this one would exceed the budget
+                log("[PMI] Time budget exhausted.  Stopping.\n")
+                out_of_time = True
+            if checkpoint is not None and (converged or out_of_time or i == max_cycles
+                                           or i % checkpoint_every == 0):
+                self.save_checkpoint(checkpoint, i, avg_delta, converged,
+                                     stopped=not converged and i == max_cycles)
+            if converged or out_of_time:
                 break
         else:
-            log("[PMI] Maximum number of iterations reached.  Stopping.\n")
-
-        log("[PMI] Generating final alignments...")
-        self.alignments = self.perform_alignments()
-        log(" done.\n")
+            if not converged:
+                log("[PMI] Maximum number of iterations reached.  Stopping.\n")
+
+        if final_alignments:
+            log("[PMI] Generating final alignments...")
+            t_start = clock()
+            if self.rule_counting != 'alignments':
+                # the rules were counted without any alignments
+                self.realigned.append(len(self.pairs))
+                self.alignments = self.perform_alignments(counting=False)
+            else:
+                self.alignments = self.realign(alignments, aligned_with, index)
+            log(" done.\n")
+            if sink is not None:
+                event = self.alignment_stats(self.alignments)
+                event.update(realigned=self.realigned[-1], dp_cells=self.cells_computed,
+                             peak_rss_kb=peak_rss(), seconds=clock() - t_start)
+                self._emit('final_alignments', **event)
+        if sink is not None:
+            self._emit('train_end', cycles=i, converged=converged, out_of_time=out_of_time,
+                      seconds=clock() - start, peak_rss_kb=peak_rss())
 
 if __name__ == '__main__':
     print("This file contains class definitions and cannot be run as a stand-alone script.")
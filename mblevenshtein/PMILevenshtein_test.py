@@ -0,0 +1,386 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import defaultdict
+from multiprocessing import Pool
+
+from mblevenshtein.PMILevenshtein import PMILevenshtein, PairIndex, make_ruleset_ngrams
+from mblevenshtein.Metrics import ListSink, JSONLinesSink
+from mblevenshtein.Levenshtein import LevenshteinAligner
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'test_data.txt')
+
+def read_test_pairs():
+    with io.open(TEST_DATA, encoding='utf-8') as f:
+        return [tuple(line.rstrip('\n').split('\t')) for line in f if line.strip()]
+
+def make_pmi(pairs=None, **kwargs):
+    pmi = PMILevenshtein(**kwargs)
+    for (source, target) in (pairs or read_test_pairs()):
+        pmi.add_pair(source, target)
+    return pmi
+
+def reference_rules_by_freq(pmi, alignments):
+    """The original, dict-based version of collect_rules_by_freq."""
+    eps = pmi.epsilon
+    rules_by_freq = defaultdict(int)
+    for (pair, rulesets) in alignments.items():
+        for ruleset in rulesets:
+            for rule in make_ruleset_ngrams(ruleset, n=pmi.ngrams):
+                source = ''.join(op[0] for op in rule)
+                target = ''.join(op[1] for op in rule)
+                if source != eps:
+                    source = source.replace(eps, '')
+                if target != eps:
+                    target = target.replace(eps, '')
+                rules_by_freq[(source, target)] += pmi.pairs[pair]
+    return rules_by_freq
+
+def count_shard(args):
+    """Run count_shard in a process of its own, as on another machine."""
+    (state, shard, shards, filename, rule_counting) = args
+    pmi = PMILevenshtein()
+    pmi.rule_counting = rule_counting
+    pmi.count_shard(state, shard, shards, filename)
+
+
+class TestParallelTraining(unittest.TestCase):
+    def test_same_results_as_serial(self):
+        serial = make_pmi()
+        serial.train(log_to=None)
+        parallel = make_pmi(workers=2)
+        parallel.train(log_to=None)
+        self.assertEqual(parallel.weights.weights, serial.weights.weights)
+        self.assertEqual(parallel.alignments, serial.alignments)
+        self.assertEqual(list(parallel.alignments), list(serial.alignments))
+
+    def test_workers_argument_of_train(self):
+        pmi = make_pmi()
+        pmi.train(log_to=None, workers=3)
+        self.assertEqual(pmi.workers, 3)
+        self.assertEqual(len(pmi.alignments), len(pmi.pairs))
+
+
+class TestDirtyPairTracking(unittest.TestCase):
+    def test_pair_index(self):
+        pairs = [('jre', 'ihre'), ('chind', 'kind'), ('ab', 'herab')]
+        index = PairIndex(pairs, '<eps>')
+        self.assertEqual(index.affected_pairs(('c', 'k')), set([('chind', 'kind')]))
+        self.assertEqual(index.affected_pairs(('<eps>', 'h')),
+                         set([('jre', 'ihre'), ('ab', 'herab')]))
+        self.assertEqual(index.affected_pairs(('ch', 'k')), set([('chind', 'kind')]))
+        self.assertEqual(index.affected_pairs(('x', '<eps>')), set())
+        self.assertEqual(index.affected_pairs(('<eps>', '<eps>')), set())
+
+    def test_undirected_weights(self):
+        pmi = PMILevenshtein()
+        pmi.add_pair('b', 'a')
+        pmi.weights.setDirected(False)
+        pmi.dirty_tolerance = 0.0
+        alignments = pmi.perform_alignments()
+        aligned_with = pmi.weights.copy()
+        # the reverse of the rule the pair uses
+        pmi.weights.set_weight('a', 'b', 5.0)
+        index = PairIndex(pmi.pairs, pmi.epsilon)
+        self.assertEqual(pmi.update_alignments(alignments, aligned_with, index), 1)
+        self.assertEqual(alignments, pmi.perform_alignments())
+
+    def test_exact_mode_matches_full_realignment(self):
+        full = make_pmi()
+        full.train(log_to=None)
+        exact = make_pmi()
+        exact.dirty_tolerance = 0.0
+        exact.train(log_to=None)
+        self.assertEqual(exact.weights.weights, full.weights.weights)
+        self.assertEqual(exact.alignments, full.alignments)
+        self.assertEqual(len(exact.realigned), len(full.realigned))
+        self.assertEqual(exact.realigned[0], len(exact.pairs))
+
+    def test_approximate_mode_realigns_fewer_pairs(self):
+        exact = make_pmi()
+        exact.dirty_tolerance = 0.0
+        exact.train(log_to=None)
+        approximate = make_pmi()
+        approximate.dirty_tolerance = 0.05
+        log = io.StringIO() if str is not bytes else io.BytesIO()
+        approximate.train(log_to=log)
+        self.assertTrue(sum(approximate.realigned) < sum(exact.realigned))
+        self.assertEqual(set(approximate.alignments), set(approximate.pairs))
+        self.assertTrue("re-aligned" in log.getvalue())
+
+
+class TestRuleStatistics(unittest.TestCase):
+    def test_counts_as_reference(self):
+        pmi = make_pmi()
+        pmi.add_pair('jre', 'ihre')
+        alignments = pmi.perform_alignments()
+        for n in (1, 2, 3):
+            pmi.ngrams = n
+            expected = reference_rules_by_freq(pmi, alignments)
+            counts = pmi.count_rules(alignments)
+            # same rules, same frequencies, same order
+            self.assertEqual(list(zip(counts.rules(), counts.freqs.tolist())),
+                             list(expected.items()))
+            self.assertEqual(list(pmi.collect_rules_by_freq(alignments).items()),
+                             list(expected.items()))
+        # plain lists of edit operations work as well
+        lists = dict((pair, [list(a) for a in rulesets])
+                     for (pair, rulesets) in alignments.items())
+        self.assertEqual(pmi.count_rules(lists).as_dict(), dict(expected))
+        self.assertEqual(len(pmi.count_rules({})), 0)
+
+    def test_same_weights_as_dict_pipeline(self):
+        for directed in (True, False):
+            (vectorized, dicts) = (make_pmi(), make_pmi())
+            for pmi in (vectorized, dicts):
+                pmi.weights.setDirected(directed)
+            alignments = dicts.perform_alignments()
+            for _ in range(3):
+                counts = vectorized.count_rules(alignments)
+                (pr, ps, pt) = vectorized.rule_probabilities(counts)
+                distances = vectorized.rule_distances(pr, ps, pt)
+                delta = vectorized.adjust_rule_weights(counts, distances)
+
+                rules = dicts.collect_rules_by_freq(alignments)
+                (pr, ps, pt) = dicts.calculate_probabilities(rules)
+                expected = dicts.adjust_weights(dicts.calculate_distances(rules, pr, ps, pt))
+                self.assertEqual(delta, expected)
+                self.assertEqual(list(vectorized.weights.weights.items()),
+                                 list(dicts.weights.weights.items()))
+
+
+class TestPathCounting(unittest.TestCase):
+    def test_same_weights_as_enumeration(self):
+        for n in (1, 2):
+            enumerated = make_pmi()
+            enumerated.ngrams = n
+            enumerated.train(log_to=None)
+            counted = make_pmi()
+            (counted.ngrams, counted.rule_counting) = (n, 'paths')
+            counted.train(log_to=None)
+            self.assertEqual(dict(counted.weights.weights), dict(enumerated.weights.weights))
+            self.assertEqual(counted.alignments, enumerated.alignments)
+            self.assertEqual(counted.find_ngram_weights(3), enumerated.find_ngram_weights(3))
+
+    def test_counts_in_parallel(self):
+        serial = make_pmi()
+        serial.rule_counting = 'paths'
+        parallel = make_pmi(workers=2)
+        parallel.rule_counting = 'paths'
+        self.assertEqual(parallel.count_rules(parallel.perform_alignments()).as_dict(),
+                         serial.count_rules(serial.perform_alignments()).as_dict())
+
+
+class TestSoftCounting(unittest.TestCase):
+    def test_training(self):
+        for n in (1, 2):
+            pmi = make_pmi()
+            (pmi.ngrams, pmi.rule_counting) = (n, 'expected')
+            pmi.train(log_to=None)
+            self.assertTrue(pmi.weights.weights)
+            for weight in pmi.weights.weights.values():
+                self.assertTrue(0.0 <= weight <= 1.0)
+            self.assertEqual(sorted(pmi.alignments), sorted(pmi.pairs))
+            self.assertTrue(pmi.find_ngram_weights(2))
+
+    def test_counts(self):
+        pmi = make_pmi()
+        pmi.rule_counting = 'expected'
+        counts = pmi.count_rules(pmi.perform_alignments()).as_dict()
+        # every pair contributes a total of at least its length in expected rules
+        self.assertTrue(sum(counts.values()) >= sum(max(len(s), len(t)) * value
+                                                    for ((s, t), value) in pmi.pairs.items()))
+        parallel = make_pmi(workers=2)
+        parallel.rule_counting = 'expected'
+        for (rule, count) in parallel.count_rules(parallel.perform_alignments()).as_dict().items():
+            self.assertAlmostEqual(count, counts[rule])
+        pmi.rule_counting = 'unknown'
+        self.assertRaises(ValueError, pmi.perform_alignments)
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'pmi.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_resume_continues_exactly(self):
+        whole = make_pmi()
+        whole.train(log_to=None)
+        stopped = make_pmi()
+        stopped.train(log_to=None, checkpoint=self.filename, max_cycles=3,
+                      final_alignments=False)
+        self.assertEqual(len(stopped.realigned), 3)
+        # the pairs come from the checkpoint; training past the limit the
+        # checkpoint was saved at has to be asked for
+        resumed = PMILevenshtein()
+        resumed.train(log_to=None, resume_from=self.filename, checkpoint=self.filename,
+                      max_cycles=whole.max_cycles)
+        self.assertEqual(resumed.weights.weights, whole.weights.weights)
+        self.assertEqual(resumed.alignments, whole.alignments)
+        self.assertEqual(resumed.realigned, whole.realigned)
+        self.assertEqual(resumed.pairs, whole.pairs)
+        # the last checkpoint was saved on convergence
+        sink = ListSink()
+        again = make_pmi()
+        again.train(log_to=None, resume_from=self.filename, metrics=sink)
+        self.assertEqual(again.weights.weights, whole.weights.weights)
+        self.assertEqual(again.alignments, whole.alignments)
+        self.assertFalse([event for event in sink.events if event['event'] == 'cycle'])
+
+    def test_different_pairs(self):
+        make_pmi().train(log_to=None, checkpoint=self.filename, max_cycles=1)
+        other = make_pmi(pairs=[('a', 'b')])
+        self.assertRaises(ValueError, other.train, log_to=None, resume_from=self.filename)
+
+    def test_different_settings(self):
+        make_pmi().train(log_to=None, checkpoint=self.filename, max_cycles=1)
+        for (name, value) in (('rule_counting', 'paths'), ('ngrams', 2),
+                              ('learning_rate', 0.5), ('temperature', 1.0)):
+            other = PMILevenshtein()
+            setattr(other, name, value)
+            self.assertRaises(ValueError, other.load_checkpoint, self.filename)
+        PMILevenshtein().load_checkpoint(self.filename)
+
+    def test_time_budget(self):
+        sink = ListSink()
+        pmi = make_pmi(metrics=sink)
+        pmi.train(log_to=None, time_budget=0.0)
+        self.assertEqual(len(pmi.realigned), 2)
+        self.assertEqual(sorted(pmi.alignments), sorted(pmi.pairs))
+        self.assertTrue(sink.events[-1]['out_of_time'])
+        self.assertEqual(sink.events[-1]['cycles'], 1)
+
+
+class TestShardedTraining(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def train_sharded(self, shards, rule_counting='alignments'):
+        state = os.path.join(self.tempdir, 'state.ckpt')
+        initial = make_pmi()
+        initial.rule_counting = rule_counting
+        initial.save_checkpoint(state, 0, sys.maxsize)
+        files = [os.path.join(self.tempdir, 'counts-%i' % shard) for shard in range(shards)]
+        pool = Pool(shards)
+        try:
+            while True:
+                pool.map(count_shard, [(state, shard, shards, files[shard], rule_counting)
+                                       for shard in range(shards)])
+                reducer = PMILevenshtein()
+                reducer.rule_counting = rule_counting
+                if not reducer.merge_shards(state, reversed(files)):
+                    break
+        finally:
+            pool.close()
+            pool.join()
+        pmi = PMILevenshtein()
+        pmi.rule_counting = rule_counting
+        pmi.train(log_to=None, resume_from=state)
+        return pmi
+
+    def test_same_as_single_process(self):
+        for rule_counting in ('alignments', 'paths'):
+            single = make_pmi()
+            single.rule_counting = rule_counting
+            single.train(log_to=None)
+            for shards in (1, 3):
+                sharded = self.train_sharded(shards, rule_counting)
+                self.assertEqual(sharded.weights.weights, single.weights.weights)
+                self.assertEqual(list(sharded.weights.weights), list(single.weights.weights))
+                self.assertEqual(sharded.realigned, single.realigned)
+                self.assertEqual(sharded.alignments, single.alignments)
+
+    def test_stopped_at_max_cycles(self):
+        state = os.path.join(self.tempdir, 'state.ckpt')
+        make_pmi().save_checkpoint(state, 0, sys.maxsize)
+        filename = os.path.join(self.tempdir, 'counts-0')
+        for cycle in (1, 2):
+            count_shard((state, 0, 1, filename, 'alignments'))
+            self.assertEqual(PMILevenshtein().merge_shards(state, [filename], max_cycles=2),
+                             cycle < 2)
+        # resuming only generates the final alignments
+        pmi = PMILevenshtein()
+        pmi.train(log_to=None, resume_from=state)
+        self.assertEqual(len(pmi.realigned), 3)
+        limited = make_pmi()
+        limited.train(log_to=None, max_cycles=2)
+        self.assertEqual(pmi.weights.weights, limited.weights.weights)
+        # unless the limit is raised
+        pmi = PMILevenshtein()
+        pmi.train(log_to=None, resume_from=state, max_cycles=4)
+        self.assertEqual(len(pmi.realigned), 5)
+
+    def test_shards(self):
+        pmi = make_pmi()
+        shards = [pmi.shard_pairs(shard, 4) for shard in range(4)]
+        self.assertEqual(sum(shards, []), list(pmi.pairs))
+
+    def test_missing_shard(self):
+        state = os.path.join(self.tempdir, 'state.ckpt')
+        make_pmi().save_checkpoint(state, 0, sys.maxsize)
+        filename = os.path.join(self.tempdir, 'counts-1')
+        count_shard((state, 1, 2, filename, 'alignments'))
+        self.assertRaises(ValueError, PMILevenshtein().merge_shards, state, [filename])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_events(self):
+        sink = ListSink()
+        pmi = make_pmi(metrics=sink)
+        pmi.train(log_to=None)
+        kinds = [event['event'] for event in sink.events]
+        self.assertEqual(kinds[0], 'train_start')
+        self.assertEqual(kinds[-2:], ['final_alignments', 'train_end'])
+        cycles = [event for event in sink.events if event['event'] == 'cycle']
+        self.assertEqual(len(cycles), sink.events[-1]['cycles'])
+        self.assertEqual([event['cycle'] for event in cycles], list(range(1, len(cycles) + 1)))
+        cells = sum((len(s) + 1) * (len(t) + 1) for (s, t) in pmi.pairs)
+        for event in cycles:
+            self.assertTrue(0 < event['dp_cells'] <= cells)
+            self.assertEqual(sorted(event['seconds']),
+                             ['adjust_weights', 'align', 'calculate_distances',
+                              'calculate_probabilities', 'collect_rules_by_freq'])
+            self.assertTrue(event['rules'] > 0)
+            self.assertTrue(event['alignments_max'] >= event['alignments_mean'] >= 1)
+
+    def test_dp_cells(self):
+        pmi = make_pmi(metrics=ListSink())
+        pmi.perform_alignments()
+        trimmed = sum(LevenshteinAligner().dp_cells(s, t) for (s, t) in pmi.pairs)
+        self.assertEqual(pmi.cells_computed, trimmed)
+        # counting on all paths fills the whole matrix
+        pmi.cells_computed = 0
+        pmi.rule_counting = 'paths'
+        pmi.perform_alignments()
+        cells = sum((len(s) + 1) * (len(t) + 1) for (s, t) in pmi.pairs)
+        self.assertEqual(pmi.cells_computed, cells)
+        self.assertTrue(trimmed < cells)
+
+    def test_same_results_with_and_without_sink(self):
+        plain = make_pmi()
+        plain.train(log_to=None)
+        stream = io.StringIO()
+        measured = make_pmi()
+        measured.train(log_to=None, metrics=JSONLinesSink(stream))
+        self.assertEqual(measured.weights.weights, plain.weights.weights)
+        self.assertEqual(measured.alignments, plain.alignments)
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(events[-1]['event'], 'train_end')
+        self.assertEqual(plain.cells_computed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os, gzip, json
+from array import array
+import numpy as np
+from six import iteritems
+from .Alignment import Alignment, OPS
+
+def join_side(symbols, epsilon):
+    """Join one side of the edit operations of an n-gram rule into a
+    string, dropping epsilons unless the side consists of one epsilon only
+    (as PMILevenshtein.collect_rules_by_freq always did)."""
+    side = ''.join(symbols)
+    if side != epsilon:
+        side = side.replace(epsilon, '')
+    return side
+
+def alignment_codes(alignment):
+    """Return the interned codes of the edit operations of `alignment`,
+    which may also be a plain list of (source, target) tuples."""
+    if isinstance(alignment, Alignment):
+        return alignment.codes()
+    return (OPS.intern(op) for op in alignment)
+
+class RuleTable(object):
+    """Interns the rules counted by PMILevenshtein, i.e. (source, target)
+    pairs of strings, as integer IDs, and the sources and targets of all
+    rules as integer IDs of their own.  Rules for n-grams of edit
+    operations are looked up by the interned codes of the operations."""
+
+    def __init__(self, epsilon='<eps>'):
+        self.epsilon = epsilon
+        self.rules = []
+        self.ids = {}
+        self.sources = {}
+        self.targets = {}
+        # source and target ID for every rule ID
+        self.rule_source = array('l')
+        self.rule_target = array('l')
+        # rule ID for every tuple of operation codes, and for every single
+        # operation code as an array
+        self.ngram_ids = {}
+        self._op_rules = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def intern(self, source, target):
+        """Return the ID of the rule (`source`, `target`)."""
+        rule = (source, target)
+        try:
+            return self.ids[rule]
+        except KeyError:
+            code = self.ids[rule] = len(self.rules)
+            self.rules.append(rule)
+            self.rule_source.append(self.sources.setdefault(source, len(self.sources)))
+            self.rule_target.append(self.targets.setdefault(target, len(self.targets)))
+            return code
+
+    def ngram_rule(self, codes):
+        """Return the ID of the rule for the n-gram of edit operations with
+        the (tuple of) interned codes `codes`."""
+        try:
+            return self.ngram_ids[codes]
+        except KeyError:
+            ops = [OPS[code] for code in codes]
+            rule = self.ngram_ids[codes] = self.intern(
+                join_side([op[0] for op in ops], self.epsilon),
+                join_side([op[1] for op in ops], self.epsilon))
+            return rule
+
+    def op_rules(self):
+        """Return an array with the rule ID of every operation code."""
+        known = len(self._op_rules)
+        if known < len(OPS):
+            new = [self.ngram_rule((code,)) for code in range(known, len(OPS))]
+            self._op_rules = np.concatenate([self._op_rules,
+                                             np.array(new, dtype=np.int64)])
+        return self._op_rules
+
+    def ngram_rules(self, windows):
+        """Return the rule IDs for the rows of the 2-d array `windows`,
+        every one of which holds the codes of an n-gram of operations."""
+        if not len(windows):
+            return np.zeros(0, dtype=np.int64)
+        (size, k) = (len(OPS), windows.shape[1])
+        if size ** k < 2 ** 62:
+            # one integer per n-gram is much faster to make unique than rows
+            keys = windows[:, 0].copy()
+            for i in range(1, k):
+                keys *= size
+                keys += windows[:, i]
+            (distinct, inverse) = np.unique(keys, return_inverse=True)
+            rows = [tuple(int(key) // size ** (k - 1 - i) % size for i in range(k))
+                    for key in distinct.tolist()]
+        else:
+            (distinct, inverse) = np.unique(windows, axis=0, return_inverse=True)
+            rows = [tuple(row) for row in distinct.tolist()]
+        ids = np.array([self.ngram_rule(row) for row in rows], dtype=np.int64)
+        return ids[inverse.reshape(-1)]
+
+    def source_ids(self, rules):
+        return np.asarray(self.rule_source, dtype=np.int64)[rules]
+
+    def target_ids(self, rules):
+        return np.asarray(self.rule_target, dtype=np.int64)[rules]
+
+class PathCounts(object):
+    """The n-grams of edit operations in all co-optimal alignments of a
+    pair, as counted by LevenshteinAligner.count_ngrams: `paths` is the
+    number of alignments, and `ngrams` a dict from tuples of interned
+    operation codes to their number of occurrences.  For the expected
+    counts of LevenshteinAligner.expected_ngrams, `paths` is None and the
+    counts are floats."""
+
+    __slots__ = ('paths', 'ngrams')
+
+    def __init__(self, paths, ngrams):
+        self.paths = paths
+        self.ngrams = ngrams
+
+    @classmethod
+    def count(cls, aligner, source, target, n=1):
+        (paths, counts) = aligner.count_ngrams(source, target, n)
+        intern = OPS.intern
+        return cls(paths, dict((tuple(intern(op) for op in ngram), count)
+                               for (ngram, count) in iteritems(counts)))
+
+    @classmethod
+    def expected(cls, aligner, source, target, n=1, temperature=1.0, min_count=0.0):
+        counts = aligner.expected_ngrams(source, target, temperature, n, min_count)
+        intern = OPS.intern
+        return cls(None, dict((tuple(intern(op) for op in ngram), count)
+                              for (ngram, count) in iteritems(counts)))
+
+    def __reduce__(self):
+        # the codes are only valid within one process
+        ops = OPS.ops
+        return (_path_counts, (self.paths, [(tuple(ops[code] for code in codes), count)
+                                            for (codes, count) in iteritems(self.ngrams)]))
+
+def _path_counts(paths, ngrams):
+    intern = OPS.intern
+    return PathCounts(paths, dict((tuple(intern(op) for op in ngram), count)
+                                  for (ngram, count) in ngrams))
+
+class RuleCounts(object):
+    """Frequencies of the distinct rules in a set of alignments: `ids` are
+    their IDs in a RuleTable, in the order of their first occurrence, and
+    `freqs` their frequencies."""
+
+    def __init__(self, table, ids, freqs):
+        self.table = table
+        self.ids = ids
+        self.freqs = freqs
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rules(self):
+        """Return the list of (source, target) rules."""
+        rules = self.table.rules
+        return [rules[i] for i in self.ids.tolist()]
+
+    def as_dict(self):
+        return dict(zip(self.rules(), self.freqs.tolist()))
+
+def count_rules(table, alignments, pair_counts, n=1):
+    """Count the occurrences of all rules for n-grams of up to `n` edit
+    operations in `alignments`, a dict from pairs to lists of alignments,
+    where every pair counts as often as given by `pair_counts`.  Returns
+    RuleCounts in the order in which PMILevenshtein.collect_rules_by_freq
+    first encounters the rules."""
+    codes = array('l')
+    lengths = array('l')
+    values = array('l')
+    for (pair, alignment_list) in alignments.items():
+        value = pair_counts[pair]
+        for alignment in alignment_list:
+            before = len(codes)
+            codes.extend(alignment_codes(alignment))
+            lengths.append(len(codes) - before)
+            values.append(value)
+    codes = np.asarray(codes, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+
+    # rules for single operations, in the order of the operations; every
+    # occurrence gets a key that sorts it in the order of
+    # collect_rules_by_freq, where every alignment yields all its unigrams,
+    # then all its bigrams, etc.
+    rules = [table.op_rules()[codes]]
+    weights = [np.repeat(values, lengths)]
+    keys = [np.arange(len(codes), dtype=np.int64)]
+    if n > 1:
+        owner = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        offset = keys[0] - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        stride = int(lengths.max()) if len(lengths) else 1
+        keys = [owner * n * stride + offset]
+        for k in range(2, n + 1):
+            start = np.flatnonzero(offset + k <= lengths[owner])
+            windows = np.stack([codes[start + i] for i in range(k)], axis=1)
+            rules.append(table.ngram_rules(windows))
+            weights.append(values[owner[start]])
+            keys.append((owner[start] * n + k - 1) * stride + offset[start])
+    (rules, weights, keys) = (np.concatenate(rules), np.concatenate(weights),
+                              np.concatenate(keys))
+
+    # sums of integers stay exact in float64 up to 2**53
+    freqs = np.bincount(rules, weights=weights, minlength=len(table))
+    ids = np.flatnonzero(np.bincount(rules, minlength=len(table)))
+    first = np.full(len(table), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, rules, keys)
+    ids = ids[np.argsort(first[ids])]
+    return RuleCounts(table, ids, np.rint(freqs[ids]).astype(np.int64))
+
+def count_rule_paths(table, path_counts, pair_counts):
+    """Like count_rules, but for a dict from pairs to PathCounts; the
+    rules come in the order in which they are first found there.  Counts
+    beyond the range of int64 are kept as Python integers, and expected
+    counts are floats."""
+    totals = {}
+    for (pair, counts) in iteritems(path_counts):
+        value = pair_counts[pair]
+        for (codes, count) in iteritems(counts.ngrams):
+            rule = table.ngram_rule(codes)
+            totals[rule] = totals.get(rule, 0) + count * value
+    return _rule_counts(table, totals)
+
+def _rule_counts(table, totals):
+    # totals is a dict from rule IDs to frequencies, in the order of the rules
+    freqs = list(totals.values())
+    if any(isinstance(freq, float) for freq in freqs):
+        dtype = np.float64
+    elif not freqs or max(freqs) < 2 ** 63:
+        dtype = np.int64
+    else:
+        dtype = object
+    return RuleCounts(table, np.array(list(totals), dtype=np.int64),
+                      np.array(freqs, dtype=dtype))
+
+# format of the files written by write_rule_counts
+COUNTS_VERSION = 1
+
+def write_rule_counts(filename, counts, **header):
+    """Write the RuleCounts `counts` to a file that can be merged with
+    others by merge_rule_counts, together with the items of `header`.  The
+    file is gzipped JSON, with the rules as strings in their order, so it
+    does not depend on the RuleTable; it is replaced atomically."""
+    state = dict(header)
+    state['version'] = COUNTS_VERSION
+    state['rules'] = [[source, target, freq] for ((source, target), freq)
+                      in zip(counts.rules(), counts.freqs.tolist())]
+    data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    temp = '%s.%i.tmp' % (filename, os.getpid())
+    with gzip.open(temp, 'wb') as f:
+        f.write(data)
+    getattr(os, 'replace', os.rename)(temp, filename)
+
+def read_rule_counts(filename):
+    """Return the contents of a file written by write_rule_counts as a
+    dict, with the rules as a list of [source, target, frequency]."""
+    with gzip.open(filename, 'rb') as f:
+        state = json.loads(f.read().decode('utf-8'))
+    if state.get('version') != COUNTS_VERSION:
+        raise ValueError("Not a rule count file: %s" % filename)
+    return state
+
+def merge_rule_counts(table, parts):
+    """Add up the frequencies of the rules in `parts`, lists of [source,
+    target, frequency] as returned by read_rule_counts, and return them as
+    RuleCounts, in the order in which the rules are first found there.
+    Integer counts of consecutive runs of pairs, merged in the order of
+    the runs, are the same as the counts of all pairs at once."""
+    totals = {}
+    for rules in parts:
+        for (source, target, freq) in rules:
+            rule = table.intern(source, target)
+            totals[rule] = totals.get(rule, 0) + freq
+    return _rule_counts(table, totals)
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
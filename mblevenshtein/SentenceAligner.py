@@ -0,0 +1,163 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .Levenshtein import LevenshteinAligner
+
+# edit operations on tokens, as (source tokens, target tokens) consumed,
+# in the order in which they are tried; on equal costs, one-to-one wins,
+# then the earlier one
+TOKEN_OPS = ((1, 0), (0, 1), (1, 1), (2, 1), (1, 2))
+
+class SentenceAligner(object):
+    """Word-aligns sentences, i.e. sequences of tokens, with the weights of
+    a character-level LevenshteinAligner.
+
+    Tokens are aligned one-to-one, one-to-two, two-to-one, or to nothing.
+    Every such edit operation costs as much as the character-level
+    alignment of the tokens involved, where several tokens are joined by
+    the `separator` symbol, so the costs of the whole alignment are close
+    to those of aligning the sentences character by character.  Only
+    cells within `band` tokens of the (scaled) diagonal are filled, and
+    the costs of token pairs are cached for every sentence pair.
+    """
+
+    def __init__(self, weights=None, epsilon='<eps>', separator=u'÷',
+                 band=4, aligner=None):
+        if aligner is None:
+            aligner = LevenshteinAligner(weights=weights, epsilon=epsilon)
+        self.aligner = aligner
+        self.separator = separator
+        self.band = band
+        self._costs = {}
+
+    def _cost(self, source, target, bound=None):
+        """Return the cost of aligning the strings `source` and `target`,
+        or infinity if it exceeds `bound`."""
+        key = (source, target)
+        cached = self._costs.get(key)
+        if cached is not None:
+            (cost, checked) = cached
+            # an infinite cost only holds up to the bound it was checked with
+            if cost != float('inf') or (bound is not None and checked >= bound):
+                return cost
+        cost = self.aligner.distance(source, target, bound)
+        self._costs[key] = (cost, bound)
+        return cost
+
+    def _row_range(self, i, n, m):
+        """Return the range of target positions filled in row `i`; the
+        ranges of consecutive rows overlap, so the band stays connected."""
+        if n == 0:
+            return (0, m)
+        lo = (i * m) // n - self.band
+        hi = -((-(i + 1) * m) // n) + self.band
+        return (max(0, lo), min(m, hi))
+
+    def align_tokens(self, source, target):
+        """Return the minimal cost of aligning the token sequences `source`
+        and `target` and the optimal alignment, as a list of pairs of token
+        tuples."""
+        inf = float('inf')
+        sep = self.separator
+        n, m = len(source), len(target)
+        self._costs = {}
+        dels = [self._cost(token, '') for token in source]
+        ins = [self._cost('', token) for token in target]
+
+        # no alignment of strings whose lengths differ by k costs less than
+        # k insertions or deletions
+        indel = self.aligner._min_indel_cost()
+        stride = m + 1
+        d = [inf] * ((n + 1) * stride)
+        ops = bytearray((n + 1) * stride)
+        d[0] = 0.0
+        for i in range(n + 1):
+            (lo, hi) = self._row_range(i, n, m)
+            for j in range(lo, hi + 1):
+                best = d[i*stride + j]
+                op = 0
+                for (k, (di, dj)) in enumerate(TOKEN_OPS):
+                    if di > i or dj > j:
+                        continue
+                    prev = d[(i-di)*stride + j-dj]
+                    if prev == inf:
+                        continue
+                    if di == 0:
+                        cost = prev + ins[j-1]
+                    elif dj == 0:
+                        cost = prev + dels[i-1]
+                    else:
+                        a = sep.join(source[i-di:i])
+                        b = sep.join(target[j-dj:j])
+                        bound = best - prev
+                        if bound < 0.0 or abs(len(a) - len(b)) * indel > bound:
+                            continue
+                        if bound == inf:
+                            bound = None
+                        cost = self._cost(a, b, bound)
+                        if cost == inf:
+                            continue
+                        cost += prev
+                        if di == dj and cost <= best:
+                            (best, op) = (cost, k + 1)
+                            continue
+                    if cost < best:
+                        (best, op) = (cost, k + 1)
+                d[i*stride + j] = best
+                ops[i*stride + j] = op
+
+        alignment = []
+        (i, j) = (n, m)
+        while i or j:
+            (di, dj) = TOKEN_OPS[ops[i*stride + j] - 1]
+            alignment.append((tuple(source[i-di:i]), tuple(target[j-dj:j])))
+            (i, j) = (i - di, j - dj)
+        alignment.reverse()
+        return (d[-1], alignment)
+
+    def _split(self, first, second, target):
+        """Split the string `target` between the tokens `first` and
+        `second`, where the source separator is aligned."""
+        sep = self.separator
+        eps = self.aligner.epsilon
+        ops = self.aligner.align(first + sep + second, target, 1)[0]
+        (left, right, seen) = ([], [], False)
+        for (a, b) in ops:
+            if a == sep and not seen:
+                seen = True
+                if b != sep and b != eps:
+                    right.append(b)
+            elif b != eps:
+                (right if seen else left).append(b)
+        return (''.join(left), ''.join(right))
+
+    def align(self, source, target):
+        """Return a list of (source token, target text) for every token of
+        `source`, where the target text holds the tokens of `target` aligned
+        to it, joined by the separator.  Inserted target tokens go with the
+        preceding source token, or the first one if there is none.  This
+        is the output of sentence_align.py."""
+        sep = self.separator
+        words = []
+        pending = []
+        for (a, b) in self.align_tokens(source, target)[1]:
+            if not a:
+                if words:
+                    words[-1][1].extend(b)
+                else:
+                    pending.extend(b)
+            elif len(a) == 1:
+                words.append((a[0], pending + list(b)))
+                pending = []
+            else:
+                (left, right) = self._split(a[0], a[1], b[0])
+                words.append((a[0], pending + ([left] if left else [])))
+                words.append((a[1], [right] if right else []))
+                pending = []
+        if pending:
+            words.append(('', pending))
+        return [(word, sep.join(aligned)) for (word, aligned) in words]
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
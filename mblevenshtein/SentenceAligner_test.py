@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.SentenceAligner import SentenceAligner, TOKEN_OPS
+from mblevenshtein.Levenshtein_test import make_weights
+
+SEP = u'÷'
+
+def random_sentences(count, seed=11):
+    rand = random.Random(seed)
+    words = ['ich', 'ihc', 'kirche', 'chirche', 'zu', 'sammen', 'zusammen',
+             'un', 'und', 'a', 'ab', 'bab']
+    def sentence():
+        return [rand.choice(words) for _ in range(rand.randint(0, 6))]
+    return [(sentence(), sentence()) for _ in range(count)]
+
+def reference_cost(aligner, source, target):
+    """Token alignment cost without banding or cost bounds."""
+    n, m = len(source), len(target)
+    d = [[float('inf')] * (m + 1) for _ in range(n + 1)]
+    d[0][0] = 0.0
+    for i in range(n + 1):
+        for j in range(m + 1):
+            for (di, dj) in TOKEN_OPS:
+                if di <= i and dj <= j:
+                    cost = aligner.distance(SEP.join(source[i-di:i]),
+                                            SEP.join(target[j-dj:j]))
+                    d[i][j] = min(d[i][j], d[i-di][j-dj] + cost)
+    return d[n][m]
+
+
+class TestSentenceAligner(unittest.TestCase):
+    def test_known_values(self):
+        aligner = SentenceAligner()
+        self.assertEqual(aligner.align(['das', 'ist', 'gut'], ['dies', 'isst', 'gutt']),
+                         [('das', 'dies'), ('ist', 'isst'), ('gut', 'gutt')])
+        self.assertEqual(aligner.align(['zusammen', 'gehen'], ['zu', 'sammen', 'gehen']),
+                         [('zusammen', u'zu÷sammen'), ('gehen', 'gehen')])
+        self.assertEqual(aligner.align(['zu', 'sammen'], ['zusammen']),
+                         [('zu', 'zu'), ('sammen', 'sammen')])
+        self.assertEqual(aligner.align([], ['ach', 'ja']), [('', u'ach÷ja')])
+        self.assertEqual(aligner.align(['a', 'b'], []), [('a', ''), ('b', '')])
+        self.assertEqual(aligner.align_tokens([], []), (0.0, []))
+
+    def test_same_cost_as_reference(self):
+        for weights in (None, make_weights()):
+            aligner = SentenceAligner(weights=weights, band=10)
+            for (source, target) in random_sentences(60):
+                (cost, alignment) = aligner.align_tokens(source, target)
+                self.assertAlmostEqual(cost, reference_cost(aligner.aligner, source, target))
+                self.assertEqual([t for (a, b) in alignment for t in a], source)
+                self.assertEqual([t for (a, b) in alignment for t in b], target)
+
+    def test_output_covers_sentences(self):
+        aligner = SentenceAligner(weights=make_weights(), band=1)
+        for (source, target) in random_sentences(60, seed=5):
+            words = aligner.align(source, target)
+            if source:
+                self.assertEqual([word for (word, _) in words], source)
+            text = SEP.join(aligned for (_, aligned) in words if aligned)
+            self.assertEqual(text.replace(SEP, ''), ''.join(target))
+
+    def test_weights(self):
+        weights = make_weights()
+        aligner = SentenceAligner(aligner=LevenshteinAligner(weights=weights))
+        self.assertAlmostEqual(aligner.align_tokens(['ca', 'ab'], ['kb', 'ab'])[0], 0.4)
+
+    def test_indel_bound_is_cached(self):
+        weights = make_weights()
+        aligner = SentenceAligner(weights=weights)
+        scans = []
+        min_indel_cost = weights.min_indel_cost
+        weights.min_indel_cost = lambda *args: scans.append(args) or min_indel_cost(*args)
+        for (source, target) in random_sentences(5):
+            aligner.align_tokens(source, target)
+        self.assertEqual(len(scans), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .Levenshtein import LevenshteinAligner, BP_INS, BP_DEL, BP_SUB
+from .WeightedLevenshtein import CompiledWeights
+
+def antidiagonal_levenshtein(ins_costs, del_costs, sub_costs, backpointers=False):
+    """Weighted Levenshtein distance computed one anti-diagonal at a time.
+
+    `ins_costs` (length m) and `del_costs` (length n) are the costs of
+    inserting every target symbol and deleting every source symbol,
+    `sub_costs` is the n x m matrix of substitution costs.  All cells on an
+    anti-diagonal only depend on the two previous anti-diagonals, so every
+    one of them is computed with a handful of vectorised operations.
+
+    Returns the minimal cost and, if `backpointers` is true, an
+    (n+1) x (m+1) uint8 array of BP_* flags as used by LevenshteinAligner
+    (otherwise None).
+    """
+    n, m = len(del_costs), len(ins_costs)
+    (costs, bp) = batched_antidiagonal_levenshtein(
+        np.asarray(ins_costs, dtype=np.float64).reshape(1, m),
+        np.asarray(del_costs, dtype=np.float64).reshape(1, n),
+        np.asarray(sub_costs, dtype=np.float64).reshape(1, n, m),
+        backpointers=backpointers)
+    return (float(costs[0]), None if bp is None else bp[0])
+
+def batched_antidiagonal_levenshtein(ins_costs, del_costs, sub_costs,
+                                     lengths=None, backpointers=False):
+    """Like antidiagonal_levenshtein, but for B pairs at once: the cost
+    arrays have shapes (B, m), (B, n) and (B, n, m).
+
+    Pairs may be padded to the common shape, in which case `lengths` gives
+    the true (source, target) length of every pair.  Padding never
+    influences the cells within the true lengths, so the cost of every
+    pair is read off at its own last cell, and its backpointers are the
+    top-left part of its slice of the returned (B, n+1, m+1) array.
+    """
+    (batch, m) = ins_costs.shape
+    n = del_costs.shape[1]
+    if lengths is None:
+        ends = np.full(batch, n, dtype=np.intp)
+        finish = np.full(batch, n + m, dtype=np.intp)
+    else:
+        lengths = np.asarray(lengths, dtype=np.intp).reshape(batch, 2)
+        ends = lengths[:, 0]
+        finish = lengths[:, 0] + lengths[:, 1]
+    costs = np.zeros(batch, dtype=np.float64)
+
+    # with the columns flipped, anti-diagonals of sub_costs become diagonals
+    ins_flipped = ins_costs[:, ::-1]
+    sub_flipped = sub_costs[:, :, ::-1]
+    bp = np.zeros((batch, n + 1, m + 1), dtype=np.uint8) if backpointers else None
+
+    # diagonals are indexed by the row of the cell
+    spare = np.full((batch, n + 1), np.inf)
+    prev2 = np.full((batch, n + 1), np.inf)
+    prev1 = np.full((batch, n + 1), np.inf)
+    prev1[:, 0] = 0.0
+    for k in range(1, n + m + 1):
+        curr = spare
+        curr.fill(np.inf)
+        if k <= m:
+            curr[:, 0] = prev1[:, 0] + ins_costs[:, k-1]
+        if k <= n:
+            curr[:, k] = prev1[:, k-1] + del_costs[:, k-1]
+
+        lo, hi = max(1, k - m), min(n, k - 1)
+        if lo <= hi:
+            diag = np.diagonal(sub_flipped, offset=m - k + 1, axis1=1, axis2=2)
+            start = max(0, k - m - 1)
+            ins_cost = prev1[:, lo:hi+1] + ins_flipped[:, m-k+lo:m-k+hi+1]
+            del_cost = prev1[:, lo-1:hi] + del_costs[:, lo-1:hi]
+            sub_cost = prev2[:, lo-1:hi] + diag[:, lo-1-start:hi-start]
+            best_cost = np.minimum(np.minimum(ins_cost, del_cost), sub_cost)
+            curr[:, lo:hi+1] = best_cost
+            if bp is not None:
+                rows = np.arange(lo, hi + 1)
+                bp[:, rows, k - rows] = ((ins_cost <= best_cost) * BP_INS |
+                                         (del_cost <= best_cost) * BP_DEL |
+                                         (sub_cost <= best_cost) * BP_SUB)
+
+        finished = np.nonzero(finish == k)[0]
+        if len(finished):
+            costs[finished] = curr[finished, ends[finished]]
+        spare, prev2, prev1 = prev2, prev1, curr
+
+    if bp is not None:
+        bp[:, 0, 1:] = BP_INS
+        bp[:, 1:, 0] = BP_DEL
+    return (costs, bp)
+
+class NumpyLevenshteinAligner(LevenshteinAligner):
+    """LevenshteinAligner that runs the dynamic programming with NumPy,
+    one anti-diagonal at a time.  Results are identical to those of
+    LevenshteinAligner; this only pays off for longer inputs such as whole
+    sentences, so smaller matrices are left to the pure-Python code."""
+
+    # matrices with fewer cells than this are computed in pure Python
+    min_cells = 400
+    # batches group pairs whose lengths agree after rounding them up to a
+    # multiple of this, and are split into chunks of at most batch_size
+    bucket_width = 4
+    batch_size = 4096
+
+    def _cost_table(self, symbols):
+        """Return a mapping of `symbols` to integer IDs, the matrix of
+        substitution costs between them, and the vectors of insertion and
+        deletion costs.  ID 0 stands for epsilon."""
+        if isinstance(self.weights, CompiledWeights):
+            compiled = self._compiled_weights(symbols)
+            return (compiled.ids, compiled.sub, compiled.ins, compiled.dels)
+
+        # look up every pair of distinct symbols only once
+        w = self.weights.get_weight
+        eps = self.epsilon
+        symbols = (eps,) + tuple(sorted(set(symbols) - set([eps])))
+        ids = dict((symbol, i) for (i, symbol) in enumerate(symbols))
+        table = np.array([[w(a, b) for b in symbols] for a in symbols],
+                         dtype=np.float64)
+        return (ids, table, table[0], table[:, 0])
+
+    def _cost_arrays(self, source, target):
+        """Return insertion, deletion and substitution costs for aligning
+        `source` to `target` as arrays for antidiagonal_levenshtein."""
+        (ids, table, ins, dels) = self._cost_table(set(source) | set(target))
+        sids = np.array([ids[char] for char in source], dtype=np.intp)
+        tids = np.array([ids[char] for char in target], dtype=np.intp)
+        return (ins[tids], dels[sids], table[np.ix_(sids, tids)])
+
+    def _use_python(self, source, target):
+        return (len(source) + 1) * (len(target) + 1) < self.min_cells
+
+    def _compute_backpointers(self, source, target, max_distance=None):
+        # the banded Python code does less work than a full vectorised run
+        if max_distance is not None or self._use_python(source, target):
+            return super(NumpyLevenshteinAligner, self)._compute_backpointers(
+                source, target, max_distance)
+        (cost, bp) = antidiagonal_levenshtein(*self._cost_arrays(source, target),
+                                              backpointers=True)
+        return (cost, bytearray(bp.tobytes()))
+
+    def _weighted_distance(self, source, target, max_distance=None):
+        if max_distance is not None or self._use_python(source, target):
+            return super(NumpyLevenshteinAligner, self)._weighted_distance(
+                source, target, max_distance)
+        (cost, _) = antidiagonal_levenshtein(*self._cost_arrays(source, target))
+        return cost
+
+    def _run_batches(self, pairs, backpointers):
+        """Run the DP for all `pairs`, bucketed by their rounded-up lengths
+        and padded to the size of their bucket.  Yields the index of every
+        pair, its cost and (optionally) its backpointers."""
+        symbols = set()
+        for (source, target) in pairs:
+            symbols.update(source)
+            symbols.update(target)
+        (ids, table, ins, dels) = self._cost_table(symbols)
+
+        width = self.bucket_width
+        buckets = {}
+        for (index, (source, target)) in enumerate(pairs):
+            key = (-(-len(source) // width) * width, -(-len(target) // width) * width)
+            buckets.setdefault(key, []).append(index)
+
+        for ((n, m), indices) in sorted(buckets.items()):
+            for start in range(0, len(indices), self.batch_size):
+                chunk = indices[start:start+self.batch_size]
+                # pad with epsilon; the padded cells are never read
+                sids = np.zeros((len(chunk), n), dtype=np.intp)
+                tids = np.zeros((len(chunk), m), dtype=np.intp)
+                lengths = np.zeros((len(chunk), 2), dtype=np.intp)
+                for (row, index) in enumerate(chunk):
+                    (source, target) = pairs[index]
+                    sids[row, :len(source)] = [ids[char] for char in source]
+                    tids[row, :len(target)] = [ids[char] for char in target]
+                    lengths[row] = (len(source), len(target))
+                (costs, bp) = batched_antidiagonal_levenshtein(
+                    ins[tids], dels[sids],
+                    table[sids[:, :, None], tids[:, None, :]],
+                    lengths=lengths, backpointers=backpointers)
+                for (row, index) in enumerate(chunk):
+                    cost = float(costs[row])
+                    if bp is None:
+                        yield (index, cost, None)
+                    else:
+                        (source, target) = pairs[index]
+                        cells = bp[row, :len(source)+1, :len(target)+1]
+                        yield (index, cost, bytearray(cells.tobytes()))
+
+    def _cached_batch(self, pairs, kind, max_alignments=None):
+        """Look up `pairs` in the cache.  Returns the list of results, with
+        None for the pairs not found, and the keys to store them under."""
+        results = [None] * len(pairs)
+        keys = [None] * len(pairs)
+        if self.cache is not None:
+            for (index, (source, target)) in enumerate(pairs):
+                if kind == 'align':
+                    keys[index] = self._cache_key(kind, source, target, max_alignments, None)
+                else:
+                    keys[index] = self._cache_key(kind, source, target, None)
+                results[index] = self.cache.get(keys[index])
+        return (results, keys)
+
+    def _middles(self, pairs):
+        """Return the lengths of the affixes of every pair that need no DP
+        (see LevenshteinAligner._affixes), and the remaining middle parts."""
+        affixes = [self._affixes(source, target) for (source, target) in pairs]
+        middles = [(source[k:len(source)-l], target[k:len(target)-l])
+                   for ((source, target), (k, l)) in zip(pairs, affixes)]
+        return (affixes, middles)
+
+    def perform_batch(self, pairs, max_alignments=None):
+        pairs = list(pairs)
+        (results, keys) = self._cached_batch(pairs, 'align', max_alignments)
+        missing = [index for (index, result) in enumerate(results) if result is None]
+        (affixes, middles) = self._middles([pairs[index] for index in missing])
+        for (i, cost, bp) in self._run_batches(middles, True):
+            index = missing[i]
+            (source, target) = middles[i]
+            (k, l) = affixes[i]
+            alignments = self._trace_alignments(source, target, bp, max_alignments,
+                                                self._suffix(pairs[index][0], l))
+            alignments = self._splice(pairs[index][0], k, alignments)
+            results[index] = (cost, list(alignments))
+            if self.cache is not None:
+                self.cache.put(keys[index], results[index])
+        return [(cost, list(alignments)) for (cost, alignments) in results]
+
+    def distance_batch(self, pairs):
+        pairs = list(pairs)
+        (results, keys) = self._cached_batch(pairs, 'distance')
+        missing = [index for (index, result) in enumerate(results) if result is None]
+        (_, middles) = self._middles([pairs[index] for index in missing])
+        for (i, cost, _) in self._run_batches(middles, False):
+            index = missing[i]
+            results[index] = cost
+            if self.cache is not None:
+                self.cache.put(keys[index], cost)
+        return results
+
+if __name__ == '__main__':
+    print("This file contains class definitions and cannot be run as a stand-alone script.")
+    exit()
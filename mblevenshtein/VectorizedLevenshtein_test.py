@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.VectorizedLevenshtein import NumpyLevenshteinAligner, antidiagonal_levenshtein
+from mblevenshtein.WeightedLevenshtein import LevenshteinWeights
+from mblevenshtein.Levenshtein_test import PAIRS, random_pairs, make_weights, affix_pairs, \
+     reference_levenshtein
+
+
+class TestNumpyLevenshteinAligner(unittest.TestCase):
+    def make_aligners(self, weights):
+        vectorized = NumpyLevenshteinAligner(weights=weights)
+        vectorized.min_cells = 0
+        return (LevenshteinAligner(weights=weights), vectorized)
+
+    def test_same_results_as_python(self):
+        for weights in (make_weights(), make_weights().compile('abc')):
+            (plain, vectorized) = self.make_aligners(weights)
+            for (source, target) in PAIRS + random_pairs(200, alphabet='abceuh'):
+                self.assertEqual(vectorized.perform_levenshtein(source, target),
+                                 plain.perform_levenshtein(source, target))
+                self.assertEqual(vectorized.distance(source, target),
+                                 plain.distance(source, target))
+            self.assertTrue(vectorized.weights is weights)
+
+    def test_long_strings(self):
+        rand = random.Random(7)
+        source = ''.join(rand.choice('abceuh ') for _ in range(300))
+        target = ''.join(rand.choice('abceuhk ') for _ in range(250))
+        (plain, vectorized) = self.make_aligners(make_weights())
+        self.assertEqual(vectorized.distance(source, target),
+                         plain.distance(source, target))
+        self.assertEqual(vectorized.align(source, target, max_alignments=3),
+                         plain.align(source, target, max_alignments=3))
+        self.assertEqual(vectorized.count_alignments(source, target),
+                         plain.count_alignments(source, target))
+
+    def test_without_backpointers(self):
+        (cost, bp) = antidiagonal_levenshtein([1.0, 1.0], [1.0], [[0.0, 1.0]])
+        self.assertEqual(cost, 1.0)
+        self.assertTrue(bp is None)
+
+
+class TestBatches(unittest.TestCase):
+    def test_batches_match_single_pairs(self):
+        pairs = PAIRS + random_pairs(300, alphabet='abceuh', max_len=11)
+        for weights in (make_weights(), make_weights().compile('ab')):
+            plain = LevenshteinAligner(weights=weights)
+            vectorized = NumpyLevenshteinAligner(weights=weights)
+            vectorized.batch_size = 16
+            self.assertEqual(vectorized.perform_batch(pairs),
+                             plain.perform_batch(pairs))
+            self.assertEqual(vectorized.align_batch(pairs, max_alignments=1),
+                             [plain.align(s, t, 1) for (s, t) in pairs])
+            self.assertEqual(vectorized.distance_batch(pairs),
+                             [plain.distance(s, t) for (s, t) in pairs])
+
+    def test_trimmed_affixes(self):
+        pairs = affix_pairs(100)
+        for weights in (LevenshteinWeights(), make_weights()):
+            vectorized = NumpyLevenshteinAligner(weights=weights)
+            self.assertEqual(vectorized.perform_batch(pairs),
+                             [reference_levenshtein(weights, s, t) for (s, t) in pairs])
+
+    def test_empty_batch(self):
+        vectorized = NumpyLevenshteinAligner()
+        self.assertEqual(vectorized.distance_batch([]), [])
+        self.assertEqual(vectorized.align_batch([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import re, math, sys
-from lxml import etree
+import re, math, sys, os, mmap, struct, hashlib
+import numpy as np
+from six import iteritems
 from itertools import combinations
 
 class XMLParamError(Exception):
@@ -23,11 +24,130 @@ class XMLMissingTagError(XMLParamError):
     def __str__(self):
         return ''.join(['Missing tag "', self.param_tag, '"'])
 
+class BinaryFormatError(ValueError):
+    pass
+
+##################################################################
+# Binary weight files, all numbers little-endian:
+#
+#   header (see BINARY_HEADER)
+#   symbol offsets   uint32 * (symbols + 1)
+#   symbol table     UTF-8, symbols[i] = table[offsets[i]:offsets[i+1]]
+#   rules            int32 * (rules * 2), IDs of source and target symbol
+#   costs            float64 * rules
+#
+# Every section starts at a multiple of 8 bytes.  Symbol 0 is epsilon.
+# Sidecar caches of XML files also record the modification time and the
+# SHA-1 digest of the XML file they were made from.
+
+BINARY_MAGIC = b'MBLW'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sIBxxxIId20s')
+BINARY_TYPES = ['', 'directed', 'undirected']
+SIDECAR_SUFFIX = '.mblw'
+
+def _padded(size):
+    return size + (-size % 8)
+
+def source_key(filename):
+    """Return the modification time and SHA-1 digest of a file, which
+    identify the version a sidecar cache was made from."""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return (os.path.getmtime(filename), digest.digest())
+
+def write_binary_weights(filename, weights, key=None):
+    """Write the explicit weights and the type of the LevenshteinWeights
+    `weights` to a binary file; `key` is the source_key of the file they
+    were read from, if any."""
+    eps = weights.epsilon
+    symbols = [eps]
+    ids = {eps: 0}
+    rules = []
+    costs = []
+    for ((source, target), cost) in weights.weights.items():
+        for symbol in (source, target):
+            if symbol not in ids:
+                ids[symbol] = len(symbols)
+                symbols.append(symbol)
+        rules.append((ids[source], ids[target]))
+        costs.append(cost)
+
+    encoded = [symbol.encode('utf-8') for symbol in symbols]
+    offsets = np.zeros(len(symbols) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum([len(symbol) for symbol in encoded])
+    table = b''.join(encoded)
+    (mtime, digest) = key if key is not None else (0.0, b'')
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+                                BINARY_TYPES.index(weights.type or ''),
+                                len(symbols), len(rules), mtime, digest)
+
+    # write to a temporary file first, so readers never see half a file
+    temp = '%s.%i.tmp' % (filename, os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            for data in (header, offsets.tobytes(), table,
+                         np.array(rules, dtype='<i4').reshape(-1).tobytes(),
+                         np.array(costs, dtype='<f8').tobytes()):
+                f.write(data)
+                f.write(b'\0' * (-len(data) % 8))
+        getattr(os, 'replace', os.rename)(temp, filename)
+    except (IOError, OSError):
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def read_binary_weights(filename, epsilon, key=None):
+    """Read a binary weight file via mmap and return its type and a dict
+    of its weights, with symbol 0 mapped to `epsilon`.  If `key` is given
+    and the file was not made from a source with this source_key, return
+    None instead."""
+    with open(filename, 'rb') as f:
+        # an empty file cannot be mapped at all
+        if os.fstat(f.fileno()).st_size < BINARY_HEADER.size:
+            raise BinaryFormatError("Not a binary weight file: %s" % filename)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        (magic, version, type_code, n_symbols, n_rules, mtime, digest) = \
+            BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise BinaryFormatError("Not a binary weight file: %s" % filename)
+        if key is not None and (mtime, digest) != (key[0], key[1]):
+            return None
+
+        pos = _padded(BINARY_HEADER.size)
+        sizes = [4 * (n_symbols + 1), None, 8 * n_rules, 8 * n_rules]
+        if n_symbols < 1 or len(data) < pos + _padded(sizes[0]):
+            raise BinaryFormatError("Truncated binary weight file: %s" % filename)
+        # arrays are turned into lists right away, as the mmap cannot be
+        # closed while arrays still point into it
+        bounds = np.frombuffer(data, dtype='<u4', count=n_symbols + 1, offset=pos).tolist()
+        sizes[1] = bounds[-1]
+        if len(data) < pos + sum(_padded(size) for size in sizes):
+            raise BinaryFormatError("Truncated binary weight file: %s" % filename)
+        pos += _padded(sizes[0])
+        table = data[pos:pos+sizes[1]]
+        pos += _padded(sizes[1])
+        rules = np.frombuffer(data, dtype='<i4', count=n_rules * 2, offset=pos).tolist()
+        pos += _padded(sizes[2])
+        costs = np.frombuffer(data, dtype='<f8', count=n_rules, offset=pos).tolist()
+    finally:
+        data.close()
+
+    symbols = [table[bounds[i]:bounds[i+1]].decode('utf-8') for i in range(n_symbols)]
+    symbols[0] = epsilon
+    sources = [symbols[i] for i in rules[0::2]]
+    targets = [symbols[i] for i in rules[1::2]]
+    weights = dict(zip(zip(sources, targets), costs))
+    return (BINARY_TYPES[type_code], weights)
+
 ##################################################################
 class LevenshteinWeights(object):
     accepted_types = ['directed','undirected']
 
-    def __init__(self, filename="", fileformat="xml"):
+    def __init__(self, filename="", fileformat="xml", cache=False):
         self.type         = ""
         self.weights      = {}
         self.epsilon      = '<eps>'
@@ -35,24 +155,37 @@ class LevenshteinWeights(object):
         self.default_replacement_cost = 1.0
         self.default_insertion_cost   = 1.0
         self.default_deletion_cost    = 1.0
+        # incremented whenever the weights are changed through one of the
+        # methods below; changing `weights` or the default costs directly
+        # bypasses this, and so do caches that rely on it
+        self.version = 0
         if filename != "":
-            self.loadParamFromFile(filename, fileformat)
+            self.loadParamFromFile(filename, fileformat, cache)
 
     def setDirected(self, directed):
         self.type = 'directed' if directed else 'undirected'
+        self.version += 1
 
     def isDirected(self):
         return (self.type == 'directed')
 
-    def loadParamFromFile(self, filename, fileformat="xml"):
-        if fileformat == "xml":
+    def loadParamFromFile(self, filename, fileformat="xml", cache=False):
+        """Load weights from a file in one of the formats "xml", "tabbed"
+        or "binary".  With `cache`, XML files are read through a binary
+        sidecar file (see loadParamFromCachedXMLFile)."""
+        if fileformat == "xml" and cache:
+            self.loadParamFromCachedXMLFile(filename)
+        elif fileformat == "xml":
             self.loadParamFromXMLFile(filename)
         elif fileformat == "tabbed":
             self.loadParamFromNormaFile(filename)
+        elif fileformat == "binary":
+            self.loadParamFromBinaryFile(filename)
         else:
             raise Exception("Unrecognized file format: %s" % fileformat)
 
     def loadParamFromXMLFile(self, filename):
+        from lxml import etree
         root = etree.parse(filename).getroot()
         if root.tag != "WeightSet":
             raise XMLTagError(root.tag, "WeightSet")
@@ -77,6 +210,7 @@ class LevenshteinWeights(object):
 
             cost = float(child.get('cost'))
             self.weights[elem] = cost
+        self.version += 1
 
     def loadParamFromNormaFile(self, filename):
         with open(filename, 'r') as f:
@@ -86,11 +220,45 @@ class LevenshteinWeights(object):
                     continue
                 (left, right, cost) = line.split("\t")
                 self.weights[(left, right)] = float(cost)
+        self.version += 1
+
+    def loadParamFromBinaryFile(self, filename):
+        (self.type, weights) = read_binary_weights(filename, self.epsilon)
+        self.weights.update(weights)
+        self.version += 1
+
+    def saveParamToBinaryFile(self, filename):
+        write_binary_weights(filename, self)
+
+    def loadParamFromCachedXMLFile(self, filename):
+        """Like loadParamFromXMLFile, but use the binary sidecar file next
+        to `filename` if it was made from the current version of the XML
+        file, and (re-)write it otherwise.  A sidecar that cannot be
+        written, e.g. in a read-only directory, is silently skipped."""
+        sidecar = filename + SIDECAR_SUFFIX
+        key = source_key(filename)
+        try:
+            loaded = read_binary_weights(sidecar, self.epsilon, key)
+        except (IOError, OSError, ValueError):
+            loaded = None
+        if loaded is None:
+            parsed = LevenshteinWeights()
+            parsed.epsilon = self.epsilon
+            parsed.loadParamFromXMLFile(filename)
+            try:
+                write_binary_weights(sidecar, parsed, key)
+            except (IOError, OSError):
+                pass
+            loaded = (parsed.type, parsed.weights)
+        (self.type, weights) = loaded
+        self.weights.update(weights)
+        self.version += 1
 
     def make_xml_param(self):
+        from lxml import etree
         root = etree.Element("WeightSet")
         root.set('type', self.type)
-        for (elem, cost) in self.weights.iteritems():
+        for (elem, cost) in iteritems(self.weights):
             (source, target) = elem
             if source == target:
                 continue
@@ -110,6 +278,7 @@ class LevenshteinWeights(object):
 
     def reset_weights(self):
         self.weights = {}
+        self.version += 1
 
     def return_weights(self):
         e = self.epsilon
@@ -127,6 +296,8 @@ class LevenshteinWeights(object):
         try:
             return self.weights[(source, target)]
         except KeyError:
+            if self.type == 'undirected' and (target, source) in self.weights:
+                return self.weights[(target, source)]
             if source==target:
                 return self.default_identity_cost
             elif source==self.epsilon:
@@ -138,6 +309,146 @@ class LevenshteinWeights(object):
 
     def set_weight(self, source, target, weight):
         self.weights[(source, target)] = weight
+        self.version += 1
+
+    def set_weights(self, items):
+        """Set the weights of many rules at once, given as ((source,
+        target), weight) items."""
+        self.weights.update(items)
+        self.version += 1
+
+    def has_unit_costs(self):
+        """True if every edit operation costs exactly what plain
+        Levenshtein distance would charge for it."""
+        if (self.default_identity_cost != 0.0 or
+            self.default_replacement_cost != 1.0 or
+            self.default_insertion_cost != 1.0 or
+            self.default_deletion_cost != 1.0):
+            return False
+        for ((source, target), cost) in self.weights.items():
+            if cost != (0.0 if source == target else 1.0):
+                return False
+        return True
+
+    def cost_bounds(self):
+        """Return whether every identity operation is free, and the lowest
+        and the highest cost of any other edit operation."""
+        identities = [self.default_identity_cost]
+        others = [self.default_replacement_cost,
+                  self.default_insertion_cost,
+                  self.default_deletion_cost]
+        for ((source, target), cost) in self.weights.items():
+            (identities if source == target else others).append(cost)
+        return (all(cost == 0.0 for cost in identities), min(others), max(others))
+
+    def min_indel_cost(self, epsilon=None):
+        """Return a lower bound for the cost of any insertion or deletion,
+        with `epsilon` defaulting to the epsilon symbol of these weights."""
+        eps = self.epsilon if epsilon is None else epsilon
+        if eps == self.epsilon:
+            costs = [self.default_insertion_cost, self.default_deletion_cost]
+        else:
+            costs = [self.default_replacement_cost]
+        for ((source, target), cost) in self.weights.items():
+            if (source == eps) != (target == eps):
+                costs.append(cost)
+        return min(costs)
+
+    def copy(self):
+        other = LevenshteinWeights()
+        other.type    = self.type
+        other.weights = dict(self.weights)
+        other.epsilon = self.epsilon
+        other.default_identity_cost    = self.default_identity_cost
+        other.default_replacement_cost = self.default_replacement_cost
+        other.default_insertion_cost   = self.default_insertion_cost
+        other.default_deletion_cost    = self.default_deletion_cost
+        other.version = self.version
+        return other
+
+    def compile(self, alphabet, epsilon=None):
+        """Return a CompiledWeights snapshot of these weights for the
+        symbols in `alphabet`; `epsilon` defaults to the epsilon symbol of
+        these weights."""
+        return CompiledWeights(self, alphabet, epsilon)
+
+##################################################################
+class CompiledWeights(object):
+    """Immutable snapshot of LevenshteinWeights as dense cost arrays.
+
+    Symbols are mapped to integer IDs, with ID 0 standing for epsilon.
+    ``sub[a, b]`` is the cost of replacing symbol `a` by symbol `b`, so that
+    row 0 (``ins``) holds insertion costs and column 0 (``dels``) holds
+    deletion costs.  Costs are taken from `get_weight`, i.e., pairs without
+    an explicit weight get the default costs, and undirected weights apply
+    in both directions.
+    """
+
+    def __init__(self, weights, alphabet, epsilon=None):
+        snapshot = weights.copy()
+        eps = snapshot.epsilon if epsilon is None else epsilon
+        symbols = (eps,) + tuple(sorted(set(alphabet) - set([eps])))
+        w = snapshot.get_weight
+        sub = np.array([[w(a, b) for b in symbols] for a in symbols],
+                       dtype=np.float64)
+        sub.setflags(write=False)
+
+        self._frozen = False
+        self.version = snapshot.version
+        self.type    = snapshot.type
+        self.epsilon = eps
+        self.symbols = symbols
+        self.ids     = dict((symbol, i) for (i, symbol) in enumerate(symbols))
+        self.sub     = sub
+        self.ins     = sub[0]
+        self.dels    = sub[:, 0]
+        # plain lists are faster than arrays when indexed one by one
+        self.sub_rows = sub.tolist()
+        self._snapshot = snapshot
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("CompiledWeights cannot be modified")
+        object.__setattr__(self, name, value)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def covers(self, symbols):
+        ids = self.ids
+        return all(symbol in ids for symbol in symbols)
+
+    def extend(self, symbols):
+        """Return compiled weights that also cover `symbols`; this is the
+        object itself if it covers them already."""
+        if self.covers(symbols):
+            return self
+        return CompiledWeights(self._snapshot,
+                               set(self.symbols[1:]) | set(symbols),
+                               self.epsilon)
+
+    def encode(self, seq):
+        ids = self.ids
+        return [ids[symbol] for symbol in seq]
+
+    def isDirected(self):
+        return (self.type == 'directed')
+
+    def get_weight(self, source, target):
+        ids = self.ids
+        if source in ids and target in ids:
+            return self.sub_rows[ids[source]][ids[target]]
+        return self._snapshot.get_weight(source, target)
+
+    def has_unit_costs(self):
+        return self._snapshot.has_unit_costs()
+
+    def cost_bounds(self):
+        return self._snapshot.cost_bounds()
+
+    def min_indel_cost(self, epsilon=None):
+        return self._snapshot.min_indel_cost(self.epsilon if epsilon is None else epsilon)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mblevenshtein.Levenshtein import LevenshteinAligner
+from mblevenshtein.WeightedLevenshtein import LevenshteinWeights, \
+     BinaryFormatError, SIDECAR_SUFFIX, source_key, write_binary_weights
+from mblevenshtein.Levenshtein_test import EPS, PAIRS, random_pairs, make_weights
+
+
+class TestCompiledWeights(unittest.TestCase):
+    def test_cost_arrays(self):
+        compiled = make_weights().compile('abcku')
+        self.assertEqual(compiled.symbols, (EPS, 'a', 'b', 'c', 'k', 'u'))
+        (a, b, c, k) = compiled.encode('abck')
+        self.assertEqual(compiled.sub.shape, (6, 6))
+        self.assertEqual(compiled.sub[c, k], 0.3)
+        self.assertEqual(compiled.sub[k, c], 1.0)
+        self.assertEqual(compiled.sub[a, a], 0.0)
+        self.assertEqual(compiled.ins[k], 1.0)
+        self.assertEqual(compiled.dels[a], 1.0)
+
+    def test_undirected_weights(self):
+        weights = make_weights()
+        weights.setDirected(False)
+        compiled = weights.compile('ck')
+        (c, k) = compiled.encode('ck')
+        self.assertEqual(compiled.sub[c, k], 0.3)
+        self.assertEqual(compiled.sub[k, c], 0.3)
+        self.assertEqual(weights.get_weight('k', 'c'), 0.3)
+        weights.setDirected(True)
+        self.assertEqual(weights.get_weight('k', 'c'), 1.0)
+
+    def test_immutable(self):
+        compiled = make_weights().compile('abc')
+        with self.assertRaises(AttributeError):
+            compiled.sub = None
+        with self.assertRaises(ValueError):
+            compiled.sub[0, 0] = 5.0
+
+    def test_extend_with_unseen_symbols(self):
+        compiled = make_weights().compile('ab')
+        self.assertTrue(compiled.extend('ba') is compiled)
+        extended = compiled.extend('abeh')
+        self.assertEqual(len(extended), 5)
+        (e, h) = extended.encode('eh')
+        self.assertEqual(extended.dels[e], 0.6)
+        self.assertEqual(extended.ins[h], 0.25)
+        self.assertEqual(extended.sub[e, h], 1.0)
+
+    def test_snapshot_is_independent(self):
+        weights = make_weights()
+        compiled = weights.compile('ck')
+        weights.set_weight('c', 'k', 0.9)
+        self.assertEqual(compiled.get_weight('c', 'k'), 0.3)
+
+    def test_aligner_accepts_compiled_weights(self):
+        weights = make_weights()
+        plain = LevenshteinAligner(weights=weights)
+        table = weights.compile('abc')
+        compiled = LevenshteinAligner(weights=table)
+        for (source, target) in PAIRS + random_pairs(100, alphabet='abceuh'):
+            self.assertEqual(compiled.perform_levenshtein(source, target),
+                             plain.perform_levenshtein(source, target))
+            self.assertEqual(compiled.distance(source, target),
+                             plain.distance(source, target))
+        # unseen symbols do not replace the weights given
+        self.assertTrue(compiled.weights is table)
+        self.assertEqual(len(table), 4)
+        # but new weights are picked up
+        weights.set_weight('e', 'h', 0.1)
+        compiled.weights = weights.compile('a')
+        self.assertEqual(compiled.distance('e', 'h'), 0.1)
+
+    def test_unit_costs(self):
+        self.assertTrue(LevenshteinWeights().compile('ab').has_unit_costs())
+        self.assertFalse(make_weights().compile('ab').has_unit_costs())
+
+
+XML_WEIGHTS = u"""<WeightSet type="directed">
+  <Replacement from="c" to="k" cost="0.3"/>
+  <Replacement from="th" to="t" cost="0.2"/>
+  <Insertion of="h" cost="0.25"/>
+  <Deletion of="\u00e4" cost="0.6"/>
+</WeightSet>
+"""
+
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.xmlfile = os.path.join(self.tmpdir, 'weights.xml')
+        with open(self.xmlfile, 'wb') as f:
+            f.write(XML_WEIGHTS.encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        weights = make_weights()
+        weights.setDirected(False)
+        weights.set_weight('th', u'\u00e4', 1.5)
+        filename = os.path.join(self.tmpdir, 'weights.bin')
+        weights.saveParamToBinaryFile(filename)
+        loaded = LevenshteinWeights(filename, 'binary')
+        self.assertEqual(loaded.weights, weights.weights)
+        self.assertEqual(loaded.type, 'undirected')
+
+    def test_epsilon_follows_the_loading_weights(self):
+        filename = os.path.join(self.tmpdir, 'weights.bin')
+        make_weights().saveParamToBinaryFile(filename)
+        loaded = LevenshteinWeights()
+        loaded.epsilon = '_'
+        loaded.loadParamFromBinaryFile(filename)
+        self.assertEqual(loaded.get_weight('_', 'h'), 0.25)
+
+    def test_empty_weights(self):
+        filename = os.path.join(self.tmpdir, 'weights.bin')
+        LevenshteinWeights().saveParamToBinaryFile(filename)
+        self.assertEqual(LevenshteinWeights(filename, 'binary').weights, {})
+
+    def test_invalid_file(self):
+        filename = os.path.join(self.tmpdir, 'weights.bin')
+        with open(filename, 'wb') as f:
+            f.write(b'not a weight file, just some text')
+        with self.assertRaises(BinaryFormatError):
+            LevenshteinWeights(filename, 'binary')
+        open(filename, 'wb').close()
+        with self.assertRaises(BinaryFormatError):
+            LevenshteinWeights(filename, 'binary')
+
+    def test_sidecar_cache(self):
+        sidecar = self.xmlfile + SIDECAR_SUFFIX
+        plain = LevenshteinWeights(self.xmlfile)
+        cached = LevenshteinWeights(self.xmlfile, cache=True)
+        self.assertTrue(os.path.exists(sidecar))
+        self.assertEqual(cached.weights, plain.weights)
+        self.assertEqual(cached.type, plain.type)
+        # the sidecar is used as long as the XML file stays the same ...
+        write_binary_weights(sidecar, make_weights(), source_key(self.xmlfile))
+        self.assertEqual(LevenshteinWeights(self.xmlfile, cache=True).weights,
+                         make_weights().weights)
+        # ... and rewritten once it changes
+        with open(self.xmlfile, 'wb') as f:
+            f.write(XML_WEIGHTS.replace(u'0.3', u'0.4').encode('utf-8'))
+        self.assertEqual(LevenshteinWeights(self.xmlfile, cache=True).get_weight('c', 'k'), 0.4)
+        self.assertEqual(LevenshteinWeights(self.xmlfile, cache=True).get_weight('c', 'k'), 0.4)
+
+    def test_sidecar_cannot_be_written(self):
+        sidecar = self.xmlfile + SIDECAR_SUFFIX
+        os.mkdir(sidecar)
+        self.assertEqual(LevenshteinWeights(self.xmlfile, cache=True).weights,
+                         LevenshteinWeights(self.xmlfile).weights)
+        # no temporary file is left behind
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         sorted([os.path.basename(self.xmlfile), os.path.basename(sidecar)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
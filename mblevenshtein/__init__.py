@@ -4,5 +4,15 @@
 from __future__ import absolute_import, print_function
 
 from .Levenshtein import Levenshtein, RuleSet, LevenshteinAligner
-from .WeightedLevenshtein import LevenshteinWeights, XMLTagError, XMLParamError, XMLMissingTagError
+from .Alignment import Alignment
+from .WeightedLevenshtein import LevenshteinWeights, CompiledWeights, XMLTagError, XMLParamError, XMLMissingTagError, BinaryFormatError
 from .PMILevenshtein import PMILevenshtein
+from .AlignmentCache import AlignmentCache
+from .VectorizedLevenshtein import NumpyLevenshteinAligner
+from .LexiconIndex import LexiconIndex
+from .NgramLevenshtein import NgramLevenshteinAligner
+from .HirschbergLevenshtein import HirschbergAligner
+from .SentenceAligner import SentenceAligner
+from .Metrics import MetricsSink, ListSink, CallbackSink, JSONLinesSink
+# the server itself needs Python 3, see AlignmentServer.py
+from .AlignmentClient import AlignmentClient, AlignmentServerError
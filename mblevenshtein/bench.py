@@ -0,0 +1,328 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks and conformance checks for the alignment engines and PMI
+training.  Run as ``python -m mblevenshtein.bench --help``."""
+
+from __future__ import print_function
+
+import io, os, sys, json, time, random, argparse
+from .Levenshtein import LevenshteinAligner
+from .WeightedLevenshtein import LevenshteinWeights
+from .VectorizedLevenshtein import NumpyLevenshteinAligner
+from .NgramLevenshtein import NgramLevenshteinAligner
+from .PMILevenshtein import PMILevenshtein
+from .Metrics import peak_rss
+
+EPSILON = '<eps>'
+ALPHABET = u'abcdefghijklmnopqrstuvwxyzäöüßþæøåçéèêñ'
+
+def synthetic_pairs(count, length=8, alphabet=20, edit_rate=0.2,
+                    repetitiveness=0.0, seed=0):
+    """Generate `count` (source, target) pairs.  Sources have an average
+    length of `length` and use the first `alphabet` symbols of ALPHABET;
+    with probability `repetitiveness`, a symbol repeats the previous one.
+    Targets apply an edit (substitution, insertion or deletion) at every
+    position with probability `edit_rate`."""
+    rand = random.Random(seed)
+    symbols = ALPHABET[:alphabet]
+    pairs = []
+    for _ in range(count):
+        size = max(1, int(rand.gauss(length, length / 4.0)))
+        source = []
+        for _ in range(size):
+            if source and rand.random() < repetitiveness:
+                source.append(source[-1])
+            else:
+                source.append(rand.choice(symbols))
+        target = []
+        for char in source:
+            if rand.random() >= edit_rate:
+                target.append(char)
+                continue
+            edit = rand.randint(0, 2)
+            if edit == 0:
+                target.append(rand.choice(symbols))
+            elif edit == 1:
+                target.extend((char, rand.choice(symbols)))
+        pairs.append((u''.join(source), u''.join(target)))
+    return pairs
+
+def synthetic_weights(pairs, seed=0):
+    """Weights with random costs for about a third of all substitutions,
+    insertions and deletions of the symbols in `pairs`."""
+    rand = random.Random(seed)
+    symbols = sorted(set(char for pair in pairs for word in pair for char in word))
+    weights = LevenshteinWeights()
+    weights.setDirected(True)
+    for a in [EPSILON] + symbols:
+        for b in [EPSILON] + symbols:
+            if a != b and rand.random() < 0.3:
+                weights.set_weight(a, b, round(rand.uniform(0.1, 1.0), 2))
+    return weights
+
+##################################################################
+# Benchmarks; every one of them takes the pairs, the weights and the
+# command-line options, and returns a dict of measurements.
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    result = function(*args, **kwargs)
+    return (result, time.time() - start)
+
+def throughput(count, seconds):
+    return count / seconds if seconds > 0 else None
+
+def bench_perform_levenshtein(pairs, weights, options):
+    aligner = LevenshteinAligner(weights=weights)
+    (results, seconds) = timed(lambda: [aligner.perform_levenshtein(source, target)
+                                        for (source, target) in pairs])
+    counts = [len(alignments) for (_, alignments) in results]
+    return {'seconds': seconds,
+            'pairs_per_second': throughput(len(pairs), seconds),
+            'alignments_total': sum(counts),
+            'alignments_max': max(counts),
+            'alignments_mean': float(sum(counts)) / len(counts)}
+
+def bench_align(pairs, weights, options):
+    aligner = LevenshteinAligner(weights=weights)
+    (_, seconds) = timed(lambda: [aligner.align(source, target, max_alignments=1)
+                                  for (source, target) in pairs])
+    return {'seconds': seconds,
+            'pairs_per_second': throughput(len(pairs), seconds)}
+
+def bench_distance(pairs, weights, options):
+    aligner = LevenshteinAligner(weights=weights)
+    (_, seconds) = timed(lambda: [aligner.distance(source, target)
+                                  for (source, target) in pairs])
+    return {'seconds': seconds,
+            'pairs_per_second': throughput(len(pairs), seconds)}
+
+def bench_numpy_batch(pairs, weights, options):
+    aligner = NumpyLevenshteinAligner(weights=weights)
+    (_, seconds) = timed(aligner.perform_batch, pairs, 1)
+    return {'seconds': seconds,
+            'pairs_per_second': throughput(len(pairs), seconds)}
+
+def bench_pmi_train(pairs, weights, options):
+    pmi = PMILevenshtein(workers=options.workers)
+    for (source, target) in pairs:
+        pmi.add_pair(source, target)
+    (_, seconds) = timed(pmi.train, log_to=None, final_alignments=False)
+    cycles = len(pmi.realigned)
+    return {'seconds': seconds,
+            'cycles': cycles,
+            'seconds_per_cycle': seconds / cycles,
+            'distinct_pairs': len(pmi.pairs),
+            'pairs_per_second': throughput(len(pmi.pairs) * cycles, seconds)}
+
+def bench_find_ngram_weights(pairs, weights, options):
+    pmi = PMILevenshtein(workers=options.workers)
+    for (source, target) in pairs:
+        pmi.add_pair(source, target)
+    pmi.alignments = pmi.perform_alignments()
+    (rules, seconds) = timed(pmi.find_ngram_weights, n=3)
+    return {'seconds': seconds,
+            'rules': len(rules),
+            'pairs_per_second': throughput(len(pmi.pairs), seconds)}
+
+class _Output(object):
+    """File-like object that collects the output of conv_norm.main, which
+    writes both bytes and native strings."""
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+def find_conv_norm():
+    """Import scripts/conv_norm.py from a source checkout, or return None
+    if there is none."""
+    scripts = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+    if not os.path.exists(os.path.join(scripts, 'conv_norm.py')):
+        return None
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    import conv_norm
+    return conv_norm
+
+def bench_conv_norm(pairs, weights, options):
+    conv_norm = find_conv_norm()
+    if conv_norm is None:
+        return {'skipped': 'scripts/conv_norm.py not found'}
+
+    class Args(object):
+        revert = False
+        epsilon = conv_norm.EPSILON_LABEL
+        encoding = 'utf-8'
+        use_keep = False
+        interspersed = False
+        param = None
+        weight_cache = True
+        workers = options.workers
+        stream = False
+        sample = None
+        cache_size = 100000
+        checkpoint = None
+        resume = None
+        max_cycles = None
+        time_budget = None
+    args = Args()
+    data = u''.join(u'%s\t%s\n' % pair for pair in pairs).encode('utf-8')
+    args.infile = io.BytesIO(data)
+    output = _Output()
+    (_, seconds) = timed(conv_norm.main, args, output_to=output, log_to=None)
+    return {'seconds': seconds,
+            'pairs_per_second': throughput(len(pairs), seconds),
+            'output_size': output.size}
+
+BENCHMARKS = [
+    ('perform_levenshtein', bench_perform_levenshtein),
+    ('align', bench_align),
+    ('distance', bench_distance),
+    ('numpy_batch', bench_numpy_batch),
+    ('pmi_train', bench_pmi_train),
+    ('find_ngram_weights', bench_find_ngram_weights),
+    ('conv_norm', bench_conv_norm),
+]
+
+##################################################################
+# Conformance: every fast path has to agree with perform_levenshtein of
+# the plain LevenshteinAligner.
+
+def conformance(pairs, weights):
+    """Return a list of (check, source, target) for every pair on which a
+    fast path disagrees with the reference results."""
+    reference = LevenshteinAligner(weights=weights)
+    expected = [reference.perform_levenshtein(source, target) for (source, target) in pairs]
+    alphabet = set(char for pair in pairs for word in pair for char in word)
+    failures = []
+
+    def check(name, results, wanted=expected):
+        for ((source, target), result, correct) in zip(pairs, results, wanted):
+            if result != correct:
+                failures.append((name, source, target))
+
+    check('distance', [(reference.distance(s, t), correct[1])
+                       for ((s, t), correct) in zip(pairs, expected)])
+    check('align', [reference.perform_levenshtein(s, t, max_alignments=1) for (s, t) in pairs],
+          [(cost, alignments[:1]) for (cost, alignments) in expected])
+    compiled = LevenshteinAligner(weights=weights.compile(alphabet))
+    check('compiled', [compiled.perform_levenshtein(s, t) for (s, t) in pairs])
+    numpy_aligner = NumpyLevenshteinAligner(weights=weights)
+    numpy_aligner.min_cells = 0
+    check('numpy', [numpy_aligner.perform_levenshtein(s, t) for (s, t) in pairs])
+    check('numpy_batch', numpy_aligner.perform_batch(pairs))
+    check('numpy_distance_batch', [(cost, correct[1]) for (cost, correct)
+                                   in zip(numpy_aligner.distance_batch(pairs), expected)])
+    check('banded', [reference.perform_levenshtein(s, t, max_distance=correct[0])
+                     for ((s, t), correct) in zip(pairs, expected)])
+    check('ngram', [NgramLevenshteinAligner(weights=weights).perform_levenshtein(s, t)
+                    for (s, t) in pairs])
+    cached = LevenshteinAligner(weights=weights, cache_size=len(pairs))
+    for _ in range(2):
+        check('cached', [cached.perform_levenshtein(s, t) for (s, t) in pairs])
+    return failures
+
+##################################################################
+
+def compare(results, baseline, tolerance):
+    """Yield (benchmark, current, baseline, ratio, regression) for all
+    benchmarks with a throughput in both `results` and `baseline`, where
+    `regression` is true if the throughput dropped by more than
+    `tolerance`."""
+    for (name, current) in sorted(results['benchmarks'].items()):
+        old = baseline.get('benchmarks', {}).get(name, {})
+        (now, then) = (current.get('pairs_per_second'), old.get('pairs_per_second'))
+        if now and then:
+            ratio = now / then
+            yield (name, now, then, ratio, ratio < 1.0 - tolerance)
+
+def run(options, log_to=sys.stderr):
+    pairs = synthetic_pairs(options.pairs, options.length, options.alphabet,
+                            options.edit_rate, options.repetitiveness, options.seed)
+    weights = synthetic_weights(pairs, options.seed)
+    results = {'settings': dict((key, getattr(options, key)) for key in
+                                ('pairs', 'length', 'alphabet', 'edit_rate',
+                                 'repetitiveness', 'seed', 'workers')),
+               'python': sys.version.split()[0],
+               'benchmarks': {}}
+
+    for (name, function) in BENCHMARKS:
+        if options.only and name not in options.only:
+            continue
+        log_to.write("[bench] %s..." % name)
+        log_to.flush()
+        measurements = function(pairs, weights, options)
+        results['benchmarks'][name] = measurements
+        log_to.write(" %s\n" % ', '.join('%s=%s' % (key, measurements[key])
+                                         for key in sorted(measurements)))
+
+    if options.check:
+        log_to.write("[bench] conformance...")
+        failures = conformance(pairs[:options.check], weights)
+        results['conformance'] = {'pairs': min(options.check, len(pairs)),
+                                  'failures': [list(failure) for failure in failures]}
+        log_to.write(" %i failures\n" % len(failures))
+    # a high-water mark of the whole process, so it is only meaningful
+    # for the run as a whole, not for every benchmark
+    results['peak_rss_kb'] = peak_rss()
+    return results
+
+def main(argv=None):
+    description = ("Benchmarks the alignment engines and PMI training on synthetic "
+                   "word pairs, and checks that all fast paths agree with "
+                   "LevenshteinAligner.perform_levenshtein.")
+    parser = argparse.ArgumentParser(prog='python -m mblevenshtein.bench',
+                                     description=description)
+    parser.add_argument('-n', '--pairs', type=int, default=2000,
+                        help='Number of word pairs (default: %(default)i)')
+    parser.add_argument('-l', '--length', type=int, default=8,
+                        help='Average word length (default: %(default)i)')
+    parser.add_argument('-a', '--alphabet', type=int, default=20,
+                        help='Alphabet size, at most %i (default: %%(default)i)' % len(ALPHABET))
+    parser.add_argument('-r', '--edit-rate', type=float, default=0.2,
+                        help='Probability of an edit per symbol (default: %(default).2f)')
+    parser.add_argument('-p', '--repetitiveness', type=float, default=0.0,
+                        help='Probability of repeating the previous symbol (default: %(default).2f)')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Random seed (default: %(default)i)')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Number of processes for PMI training (default: %(default)i)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        choices=[name for (name, _) in BENCHMARKS],
+                        help='Only run these benchmarks')
+    parser.add_argument('--check', type=int, metavar='N', default=200,
+                        help='Cross-check the fast paths on the first N pairs; 0 turns '
+                             'this off (default: %(default)i)')
+    parser.add_argument('-o', '--output', metavar='JSONFILE',
+                        help='Write the results to this file')
+    parser.add_argument('-b', '--baseline', metavar='JSONFILE',
+                        help='Compare the throughput to the results in this file')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='Relative drop of throughput compared to the baseline that '
+                             'counts as a regression (default: %(default).2f)')
+    options = parser.parse_args(argv)
+
+    results = run(options)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    status = 0
+    if results.get('conformance', {}).get('failures'):
+        for (name, source, target) in results['conformance']['failures']:
+            print("MISMATCH %s: %s -- %s" % (name, source, target))
+        status = 1
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        for (name, now, then, ratio, regression) in compare(results, baseline, options.tolerance):
+            print("%-20s %12.1f pairs/s  (baseline %12.1f, %+6.1f%%)%s"
+                  % (name, now, then, (ratio - 1.0) * 100, '  REGRESSION' if regression else ''))
+            if regression:
+                status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mblevenshtein import bench
+
+
+class TestBench(unittest.TestCase):
+    def test_synthetic_pairs(self):
+        pairs = bench.synthetic_pairs(50, length=6, alphabet=5, edit_rate=0.0, seed=1)
+        self.assertEqual(pairs, bench.synthetic_pairs(50, length=6, alphabet=5, edit_rate=0.0, seed=1))
+        self.assertTrue(all(source == target for (source, target) in pairs))
+        self.assertTrue(set(''.join(source for (source, _) in pairs)) <= set(bench.ALPHABET[:5]))
+        repetitive = bench.synthetic_pairs(50, repetitiveness=1.0)
+        self.assertTrue(all(len(set(source)) == 1 for (source, _) in repetitive))
+
+    def test_conformance(self):
+        for repetitiveness in (0.0, 0.7):
+            pairs = bench.synthetic_pairs(60, alphabet=6, repetitiveness=repetitiveness)
+            weights = bench.synthetic_weights(pairs)
+            self.assertEqual(bench.conformance(pairs, weights), [])
+
+    def test_baseline_comparison(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            output = os.path.join(tmpdir, 'results.json')
+            argv = ['-n', '30', '--check', '10', '--only', 'align', 'distance']
+            self.assertEqual(bench.main(argv + ['-o', output]), 0)
+            with open(output) as f:
+                results = json.load(f)
+            self.assertEqual(sorted(results['benchmarks']), ['align', 'distance'])
+            self.assertTrue('peak_rss_kb' in results)
+            self.assertFalse(any('peak_rss_kb' in measurements
+                                 for measurements in results['benchmarks'].values()))
+            self.assertEqual(results['conformance']['failures'], [])
+            comparison = dict((name, regression) for (name, _, _, _, regression)
+                              in bench.compare(results, results, 0.1))
+            self.assertEqual(comparison, {'align': False, 'distance': False})
+            faster = json.loads(json.dumps(results))
+            faster['benchmarks']['distance']['pairs_per_second'] *= 2
+            comparison = dict((name, regression) for (name, _, _, _, regression)
+                              in bench.compare(results, faster, 0.1))
+            self.assertEqual(comparison, {'align': False, 'distance': True})
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_conv_norm(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            output = os.path.join(tmpdir, 'results.json')
+            argv = ['-n', '30', '--check', '0', '--only', 'conv_norm', '-o', output]
+            self.assertEqual(bench.main(argv), 0)
+            with open(output) as f:
+                results = json.load(f)['benchmarks']['conv_norm']
+            self.assertTrue('skipped' not in results)
+            self.assertTrue(results['output_size'] > 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import io, sys
+import asyncio
+import argparse
+from mblevenshtein import LevenshteinAligner, NumpyLevenshteinAligner, NgramLevenshteinAligner
+from mblevenshtein.AlignmentServer import AlignmentServer
+from mblevenshtein.WeightedLevenshtein import SIDECAR_SUFFIX
+
+def parse_models(specs):
+    """Turn NAME=FILE specifications (or just FILE, for the default
+    model) into a dict."""
+    models = {}
+    for spec in specs:
+        (name, sep, filename) = spec.partition('=')
+        if not sep:
+            (name, filename) = (AlignmentServer.default_model, spec)
+        models[name] = filename
+    return models
+
+async def serve(args):
+    if args.ngram:
+        aligner_class = NgramLevenshteinAligner
+    elif args.plain:
+        aligner_class = LevenshteinAligner
+    else:
+        aligner_class = NumpyLevenshteinAligner
+    lexicon = []
+    if args.lexicon:
+        with io.open(args.lexicon, encoding=args.encoding) as f:
+            lexicon = [line.strip() for line in f if line.strip()]
+    server = AlignmentServer(parse_models(args.model), fileformat=args.type,
+                             lexicon=lexicon, epsilon=args.epsilon,
+                             aligner_class=aligner_class, cache_size=args.cache_size,
+                             batch_size=args.batch_size, batch_delay=args.batch_delay / 1000.0,
+                             reload_interval=args.reload_interval, workers=args.workers,
+                             weight_cache=args.weight_cache)
+    await server.start(host=args.host, port=args.port, path=args.socket)
+    sys.stderr.write("Listening on %s\n" % (server.address,))
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+if __name__ == '__main__':
+    description = ("Keeps Levenshtein weights loaded and serves alignments, distances and "
+                   "nearest lexicon entries over a socket, as line-delimited JSON "
+                   "(see mblevenshtein.AlignmentServer and AlignmentClient).")
+    epilog = ""
+    parser = argparse.ArgumentParser(description=description, epilog=epilog)
+    parser.add_argument('-m', '--model',
+                        metavar='[NAME=]FILE',
+                        action='append',
+                        default=[],
+                        help=('Serve the weights in FILE as model NAME (default: "default"); '
+                              'can be given several times (default: unit weights only)'))
+    parser.add_argument('-t', '--type',
+                        choices=['tabbed','xml','binary'],
+                        default='xml',
+                        help='Parameter file format (default: %(default)s)')
+    parser.add_argument('--no-weight-cache',
+                        dest='weight_cache',
+                        action='store_false',
+                        help=('Do not cache XML weight files in a binary file '
+                              'next to them (%s)' % SIDECAR_SUFFIX))
+    parser.add_argument('-l', '--lexicon',
+                        metavar='FILE',
+                        help='Lexicon for nearest-neighbour requests, one entry per line')
+    parser.add_argument('-e', '--encoding',
+                        default='utf-8',
+                        help='Encoding of the lexicon (default: %(default)s)')
+    parser.add_argument('--epsilon',
+                        default='<eps>',
+                        help='Epsilon symbol to use (default: "%(default)s")')
+    parser.add_argument('--socket',
+                        metavar='PATH',
+                        help='Listen on the Unix socket PATH instead of TCP')
+    parser.add_argument('--host',
+                        default='127.0.0.1',
+                        help='Host to listen on (default: %(default)s)')
+    parser.add_argument('-p', '--port',
+                        type=int,
+                        default=8765,
+                        help='Port to listen on (default: %(default)i)')
+    parser.add_argument('-b', '--batch-size',
+                        metavar='N',
+                        type=int,
+                        default=256,
+                        help='Answer up to N waiting requests at once (default: %(default)i)')
+    parser.add_argument('--batch-delay',
+                        metavar='MS',
+                        type=float,
+                        default=2.0,
+                        help='Wait MS milliseconds for more requests to batch (default: %(default)g)')
+    parser.add_argument('-r', '--reload-interval',
+                        metavar='SECONDS',
+                        type=float,
+                        default=1.0,
+                        help='Check the weight files for changes every SECONDS; 0 turns this off (default: %(default)g)')
+    parser.add_argument('-j', '--workers',
+                        metavar='N',
+                        type=int,
+                        help='Number of threads that run batches (default: one per model, plus one)')
+    parser.add_argument('-c', '--cache-size',
+                        metavar='N',
+                        type=int,
+                        default=100000,
+                        help='Cache the results of up to N distinct word pairs per model (default: %(default)i)')
+    parser.add_argument('-g', '--ngram-rules',
+                        dest="ngram",
+                        action='store_true',
+                        default=False,
+                        help='Also apply multi-character rules from the parameter files')
+    parser.add_argument('--plain',
+                        action='store_true',
+                        default=False,
+                        help='Use the pure-Python engine instead of the NumPy one')
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -2,28 +2,46 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import random
 import argparse
 from mblevenshtein import PMILevenshtein
+from mblevenshtein.WeightedLevenshtein import SIDECAR_SUFFIX
 
 BEGIN_TOKEN = "__BEGIN__"
 Begin_TOKEN = "__begin__"
 KEEP_LABEL = "__KEEP__"
 EPSILON_LABEL = "__EPS__"
 
-def process_input(data, enc):
-    processed = []
+def read_input(data, enc, warn=True):
     for line in data:
         line = line.strip().decode(enc)
         if not line:
             continue
         if line.count("\t") != 1:
-            print >> sys.stderr, "*** Ignoring line: {0}".format(line.encode("utf-8"))
+            if warn:
+                print >> sys.stderr, "*** Ignoring line: {0}".format(line.encode("utf-8"))
             continue
         (source, target) = line.split("\t")
         source = source.strip()
         target = target.strip()
-        processed.append((source, target))
-    return processed
+        yield (source, target)
+
+def process_input(data, enc):
+    return list(read_input(data, enc))
+
+def sample_pairs(pairs, size, seed=0):
+    """Draw a uniform sample of `size` items from the iterable `pairs`,
+    keeping no more than that in memory (reservoir sampling)."""
+    rand = random.Random(seed)
+    sample = []
+    for (i, pair) in enumerate(pairs):
+        if i < size:
+            sample.append(pair)
+        else:
+            k = rand.randint(0, i)
+            if k < size:
+                sample[k] = pair
+    return sample
 
 def process_alignment(alignment, epsilon, keep=False, interspersed=False):
     if interspersed:
@@ -86,20 +104,26 @@ def revert_conversion(data, epsilon):
     if input_token:
         yield (input_token, output_token)
 
+def training_options(args):
+    """Return the keyword arguments of PMILevenshtein.train that control
+    checkpoints and when training stops."""
+    return dict(checkpoint=args.checkpoint, resume_from=args.resume,
+                max_cycles=args.max_cycles, time_budget=args.time_budget)
+
 def train_and_align(data, eps, log_to, args):
     use_keep, interspersed = args.use_keep, args.interspersed
 
     # Train PMI
-    pmi = PMILevenshtein()
+    pmi = PMILevenshtein(workers=args.workers)
     pmi.epsilon = eps
     pmi.learning_rate = 1.0
     for (source, target) in data:
         pmi.add_pair(source, target)
     if args.param:
-        pmi.weights.loadParamFromXMLFile(args.param)
+        pmi.weights.loadParamFromFile(args.param, cache=args.weight_cache)
         pmi_align = pmi.perform_alignments()
     else:
-        pmi.train(log_to=log_to)
+        pmi.train(log_to=log_to, **training_options(args))
         pmi_align = pmi.alignments
 
     # Output alignments
@@ -109,9 +133,44 @@ def train_and_align(data, eps, log_to, args):
                                      keep=use_keep,
                                      interspersed=interspersed)))
 
+def stream_and_align(eps, log_to, args):
+    """Like train_and_align, but reads the input twice instead of keeping
+    it in memory: once to collect the counts of all distinct pairs (or of
+    a sample of `args.sample` tokens) for training, and once to align the
+    tokens one by one.  Without sampling, the output is the same."""
+    use_keep, interspersed = args.use_keep, args.interspersed
+
+    pmi = PMILevenshtein(workers=args.workers)
+    pmi.epsilon = eps
+    pmi.learning_rate = 1.0
+    if args.param:
+        pmi.weights.loadParamFromFile(args.param, cache=args.weight_cache)
+    else:
+        pairs = read_input(args.infile, args.encoding, warn=False)
+        if args.sample:
+            pairs = sample_pairs(pairs, args.sample)
+        for (source, target) in pairs:
+            pmi.add_pair(source, target)
+        pmi.train(log_to=log_to, final_alignments=False, **training_options(args))
+        args.infile.seek(0)
+
+    # the first alignment is all we need; the cache holds recent pairs
+    aligner = pmi.aligner_class(weights=pmi.weights, epsilon=eps,
+                                cache_size=args.cache_size)
+    for (source, target) in read_input(args.infile, args.encoding):
+        alignment = aligner.align(source, target, max_alignments=1)[0]
+        yield(list(process_alignment(alignment, eps,
+                                     keep=use_keep,
+                                     interspersed=interspersed)))
+
 def main(args, output_to=sys.stdout, log_to=sys.stderr):
-    data = process_input(args.infile, args.encoding)
     eps = args.epsilon
+    if args.stream:
+        data = read_input(args.infile, args.encoding)
+        word_pairs = stream_and_align(eps, log_to, args)
+    else:
+        data = process_input(args.infile, args.encoding)
+        word_pairs = train_and_align(data, eps, log_to, args)
 
     # Revert the conversion?
     if args.revert:
@@ -119,7 +178,7 @@ def main(args, output_to=sys.stdout, log_to=sys.stderr):
             output_to.write('\t'.join(tokens).encode("utf-8"))
             output_to.write('\n')
     else:
-        for word_pair in train_and_align(data, eps, log_to, args):
+        for word_pair in word_pairs:
             for char_alignment in word_pair:
                 output_to.write('\t'.join(char_alignment).encode("utf-8"))
                 output_to.write('\n')
@@ -145,6 +204,11 @@ if __name__ == '__main__':
                         dest="param",
                         type=str,
                         help='XML file with Levenshtein weights')
+    parser.add_argument('--no-weight-cache',
+                        dest='weight_cache',
+                        action='store_false',
+                        help=('Do not cache XML weight files in a binary file '
+                              'next to them (%s)' % SIDECAR_SUFFIX))
     parser.add_argument('-r', '--revert',
                         action='store_true',
                         default=False,
@@ -166,5 +230,45 @@ if __name__ == '__main__':
     parser.add_argument('-e', '--encoding',
                         default='utf-8',
                         help='Encoding of the input file (default: %(default)s)')
+    parser.add_argument('-j', '--workers',
+                        metavar='N',
+                        type=int,
+                        default=1,
+                        help='Number of processes used for aligning (default: %(default)i)')
+    parser.add_argument('--stream',
+                        action='store_true',
+                        default=False,
+                        help=('Do not keep the input in memory, but read it twice: '
+                              'once for training and once for aligning (needs INFILE '
+                              'unless -f is given)'))
+    parser.add_argument('--sample',
+                        metavar='N',
+                        type=int,
+                        help=('With --stream, train on a random sample of N tokens '
+                              'instead of all of them'))
+    parser.add_argument('--cache-size',
+                        metavar='N',
+                        type=int,
+                        default=100000,
+                        help=('With --stream, cache the alignments of up to N distinct '
+                              'word pairs (default: %(default)i)'))
+    parser.add_argument('--checkpoint',
+                        metavar='FILE',
+                        help='Save the state of the training to FILE after every cycle')
+    parser.add_argument('--resume',
+                        metavar='FILE',
+                        help='Continue the training saved in FILE by --checkpoint')
+    parser.add_argument('--max-cycles',
+                        metavar='N',
+                        type=int,
+                        help='Stop training after N cycles (default: 19)')
+    parser.add_argument('--time-budget',
+                        metavar='SECONDS',
+                        type=float,
+                        help=('Stop training before it would take longer than SECONDS, '
+                              'and align with the weights trained so far'))
 
-    main(parser.parse_args())
+    args = parser.parse_args()
+    if args.stream and not (args.param or args.revert) and args.infile is sys.stdin:
+        parser.error("--stream needs to read INFILE twice, so it cannot be <STDIN> unless -f is given")
+    main(args)
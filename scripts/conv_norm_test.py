@@ -1,6 +1,8 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import io
+import os
 import unittest
 
 import conv_norm
@@ -190,6 +192,66 @@ class TestRevertConversion(unittest.TestCase):
         expected = [('foo', 'fo')]
         self.assertEqual(actual, expected)
 
+class TestSamplePairs(unittest.TestCase):
+    def test_small_input(self):
+        pairs = [('a', 'b'), ('c', 'd')]
+        self.assertEqual(conv_norm.sample_pairs(iter(pairs), 5), pairs)
+
+    def test_sample_size(self):
+        pairs = [(str(i), str(i)) for i in range(1000)]
+        sample = conv_norm.sample_pairs(iter(pairs), 10)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(set(sample) <= set(pairs))
+        self.assertEqual(sample, conv_norm.sample_pairs(iter(pairs), 10))
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data.txt')
+
+class Args(object):
+    revert = False
+    epsilon = EPS_LABEL
+    encoding = 'utf-8'
+    use_keep = False
+    interspersed = False
+    param = None
+    weight_cache = True
+    workers = 1
+    stream = False
+    sample = None
+    cache_size = 100000
+    checkpoint = None
+    resume = None
+    max_cycles = None
+    time_budget = None
+
+class Output(object):
+    """Collects the output of conv_norm.main, which writes both bytes and
+    native strings, as bytes."""
+    def __init__(self):
+        self.data = io.BytesIO()
+
+    def write(self, data):
+        self.data.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+class TestStreaming(unittest.TestCase):
+    def convert(self, **options):
+        args = Args()
+        for (name, value) in options.items():
+            setattr(args, name, value)
+        output = Output()
+        with open(TEST_DATA, 'rb') as f:
+            args.infile = f
+            conv_norm.main(args, output_to=output, log_to=None)
+        return output.data.getvalue()
+
+    def test_same_output_as_in_memory(self):
+        for options in ({}, {'use_keep': True}, {'interspersed': True},
+                        {'use_keep': True, 'interspersed': True}):
+            expected = self.convert(stream=False, **options)
+            self.assertTrue(expected)
+            self.assertEqual(self.convert(stream=True, **options), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
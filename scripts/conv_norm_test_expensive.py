@@ -36,6 +36,15 @@ class MockArgs(object):
     use_keep = False
     interspersed = False
     param = None
+    weight_cache = True
+    workers = 1
+    stream = False
+    sample = None
+    cache_size = 100000
+    checkpoint = None
+    resume = None
+    max_cycles = None
+    time_budget = None
 
     def __init__(self, infile=None):
         self.infile = infile
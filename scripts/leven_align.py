@@ -3,7 +3,9 @@
 
 import sys
 import argparse
-from mblevenshtein import LevenshteinAligner, LevenshteinWeights
+from mblevenshtein import LevenshteinAligner, LevenshteinWeights, NumpyLevenshteinAligner, \
+     NgramLevenshteinAligner
+from mblevenshtein.WeightedLevenshtein import SIDECAR_SUFFIX
 
 class MainApplication(object):
     args = None
@@ -12,32 +14,57 @@ class MainApplication(object):
     def __init__(self, args):
         self.args = args
         if args.param:
-            self.weights = LevenshteinWeights(args.param, args.type)
+            # XML files are cached in a binary file next to them
+            self.weights = LevenshteinWeights(args.param, args.type, cache=args.weight_cache)
         else:
             self.weights = LevenshteinWeights()
 
-    def run(self):
-        aligner = LevenshteinAligner(weights=self.weights)
-        plain_aligner = LevenshteinAligner()
-        style = self.args.style
-
+    def read_pairs(self):
         for line in self.args.infile:
             try:
                 (word1, word2) = line.strip().decode(self.args.encoding).split('\t')
             except ValueError:
                 print >> sys.stderr, "*** Ignoring line: %s" % line
+                continue
 
-            if self.args.nonid and word1 == word2:
+            if (self.args.nonid or self.args.unusual) and word1 == word2:
                 continue
-            if self.args.unusual:
-                if word1 == word2:
-                    continue
-                _, rulesets_w = aligner.perform_levenshtein(word1, word2)
-                _, rulesets_p = plain_aligner.perform_levenshtein(word1, word2)
-                if set(rulesets_w).issubset(set(rulesets_p)):
-                    continue
+            yield (word1, word2)
 
-            aligner.print_alignments(word1, word2, style)
+    def read_batches(self):
+        batch = []
+        for pair in self.read_pairs():
+            batch.append(pair)
+            if len(batch) >= self.args.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self):
+        aligner_class = NumpyLevenshteinAligner if self.args.vectorized else LevenshteinAligner
+        if self.args.ngram:
+            aligner = NgramLevenshteinAligner(weights=self.weights, cache_size=self.args.cache_size)
+        else:
+            aligner = aligner_class(weights=self.weights, cache_size=self.args.cache_size)
+        plain_aligner = aligner_class()
+        style = self.args.style
+        # the linear style only shows the first alignment
+        max_alignments = None
+        if style == 'linear' and not self.args.unusual:
+            max_alignments = 1
+
+        for batch in self.read_batches():
+            results = aligner.perform_batch(batch, max_alignments)
+            if self.args.unusual:
+                plain_results = plain_aligner.perform_batch(batch)
+            for (index, (word1, word2)) in enumerate(batch):
+                (d, rulesets_w) = results[index]
+                if self.args.unusual:
+                    (_, rulesets_p) = plain_results[index]
+                    if set(rulesets_w).issubset(set(rulesets_p)):
+                        continue
+                aligner.print_result(word1, word2, d, rulesets_w, style)
 
 if __name__ == '__main__':
     description = "Takes an XML file containing Levenshtein weights and prints character alignments for given word pairs."
@@ -55,8 +82,13 @@ if __name__ == '__main__':
                         dest="param",
                         type=str,
                         help='Parameter file')
+    parser.add_argument('--no-weight-cache',
+                        dest='weight_cache',
+                        action='store_false',
+                        help=('Do not cache XML weight files in a binary file '
+                              'next to them (%s)' % SIDECAR_SUFFIX))
     parser.add_argument('-t', '--type',
-                        choices=['tabbed','xml'],
+                        choices=['tabbed','xml','binary'],
                         default='xml',
                         help='Parameter file format (default: %(default)s)')
     parser.add_argument('-s', '--style',
@@ -73,6 +105,24 @@ if __name__ == '__main__':
                         action='store_true',
                         default=False,
                         help='Only print alignments that would not be possible with plain Levenshtein alignment')
+    parser.add_argument('-b', '--batch-size',
+                        metavar='N',
+                        type=int,
+                        default=1000,
+                        help='Align word pairs in batches of N pairs (default: %(default)i)')
+    parser.add_argument('-v', '--vectorized',
+                        action='store_true',
+                        default=False,
+                        help='Use the NumPy alignment engine, which aligns batches of pairs at once')
+    parser.add_argument('-g', '--ngram-rules',
+                        dest="ngram",
+                        action='store_true',
+                        default=False,
+                        help='Also apply multi-character rules from the parameter file, e.g. as generated by train_pmi.py -n')
+    parser.add_argument('-c', '--cache-size',
+                        metavar='N',
+                        type=int,
+                        help='Cache the alignments of up to N distinct word pairs')
 
     args = parser.parse_args()
 
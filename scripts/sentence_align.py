@@ -3,8 +3,8 @@
 import argparse
 
 from mblearn.data import TextData
-from mblevenshtein import LevenshteinWeights
-import edlib
+from mblevenshtein import LevenshteinWeights, HirschbergAligner, SentenceAligner
+from mblevenshtein.WeightedLevenshtein import SIDECAR_SUFFIX
 import sys
 
 WORD_SEP = '÷'
@@ -41,6 +41,21 @@ class AsciiMapper:
         return string
 
 
+def alignment_to_cigar(alignment, epsilon):
+    """Convert an alignment as returned by the aligners of mblevenshtein
+    into a CIGAR string as returned by edlib."""
+    cigar, last, count = [], None, 0
+    for (ca, cb) in alignment:
+        op = 'D' if ca == epsilon else ('I' if cb == epsilon else 'X')
+        if op != last and count:
+            cigar.append("{}{}".format(count, last))
+            count = 0
+        last = op
+        count += 1
+    if count:
+        cigar.append("{}{}".format(count, last))
+    return ''.join(cigar)
+
 def unroll_cigar(a, b, cigar):
     i, j = 0, 0
     s, t = [], []
@@ -92,13 +107,38 @@ def main(args):
 
     alphabet = set(file_a.characters) | set(file_b.characters)
     alphabet.add(WORD_SEP)
+
+    if args.engine != 'edlib':
+        weights = LevenshteinWeights(filename=args.weights, cache=args.weight_cache) \
+                  if args.weights else LevenshteinWeights()
+        weights = weights.compile(alphabet)
+
+    if args.engine == 'weighted':
+        aligner = SentenceAligner(weights=weights, separator=WORD_SEP, band=args.band)
+        for (sent_a, sent_b) in zip(file_a.sentences, file_b.sentences):
+            for (word_a, word_b) in aligner.align(sent_a, sent_b):
+                print("{}\t{}".format(word_a, word_b))
+            print()
+        return
+
+    if args.engine == 'hirschberg':
+        # character by character, in linear space
+        aligner = HirschbergAligner(weights=weights)
+        for (sent_a, sent_b) in zip(file_a.sentences, file_b.sentences):
+            a, b = WORD_SEP.join(sent_a), WORD_SEP.join(sent_b)
+            alignment = aligner.align(a, b)[0]
+            unroll_cigar(a, b, alignment_to_cigar(alignment, aligner.epsilon))
+            print()
+        return
+
+    import edlib
     mapper = AsciiMapper(alphabet)
 
     edlib_opts = {
         'task': 'path'
     }
     if args.weights:
-        weights = LevenshteinWeights(filename=args.weights)
+        weights = LevenshteinWeights(filename=args.weights, cache=args.weight_cache)
         additionalEqualities = []
         for ((a, b), cost) in weights.weights.items():
             if cost < args.weight_limit:
@@ -117,10 +157,12 @@ def main(args):
 
 if __name__ == '__main__':
     description = "Word-aligns sentences from two text files (in vertical format)."
-    epilog = ("This scripts uses 'edlib' instead of my own Levenshtein functions "
-              "for performance reasons.  This means it can't use weights for the "
-              "comparison; instead, some characters can be defined as equal "
-              "depending on a given weight distribution (options -w/-l).")
+    epilog = ("By default, sentences are aligned token by token, where every pair "
+              "of tokens costs as much as their character-level alignment with "
+              "the weights given by -w/--weights.  With --engine edlib, 'edlib' is "
+              "used instead, which can't use weights for the comparison; instead, "
+              "some characters can be defined as equal depending on a given weight "
+              "distribution (options -w/-l).")
     parser = argparse.ArgumentParser(description=description, epilog=epilog)
 
     parser.add_argument('file_a',
@@ -137,11 +179,29 @@ if __name__ == '__main__':
                         help=('XML file with Levenshtein weights; can be used '
                               'to treat character pairs with very low weight '
                               'as equal for the comparison'))
+    parser.add_argument('--no-weight-cache',
+                        dest='weight_cache',
+                        action='store_false',
+                        help=('Do not cache XML weight files in a binary file '
+                              'next to them (%s)' % SIDECAR_SUFFIX))
     parser.add_argument('-l', '--weight-limit',
                         default=0.2,
                         type=float,
                         help=('Maximum weight when supplying -w/--weights '
-                              '(default: %(default)f)'))
+                              'with --engine edlib (default: %(default)f)'))
+    parser.add_argument('-b', '--band',
+                        default=4,
+                        type=int,
+                        help=('Number of tokens an alignment may stray from the '
+                              'diagonal with --engine weighted (default: %(default)d)'))
+
+    parser.add_argument('--engine',
+                        choices=('weighted', 'hirschberg', 'edlib'),
+                        default='weighted',
+                        help=('Alignment engine: "weighted" aligns tokens, '
+                              '"hirschberg" aligns characters in linear space, '
+                              'both with the weights from -w/--weights; "edlib" '
+                              'uses -l/--weight-limit instead (default: %(default)s)'))
 
     args = parser.parse_args()
     main(args)
@@ -1,11 +1,38 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+from __future__ import print_function
+
 import os, sys
 import argparse
-from mblevenshtein import PMILevenshtein
+from six import iteritems
+from mblevenshtein import PMILevenshtein, JSONLinesSink
 from operator import itemgetter
 
+SHARDED_COMMANDS = ('init', 'map', 'reduce')
+
+# input is read as bytes and decoded with --encoding
+STDIN = getattr(sys.stdin, 'buffer', sys.stdin)
+
+def configure(pmi, args):
+    """Apply the training options in `args` to `pmi`."""
+    pmi.learning_rate = args.lr
+    if args.count_paths:
+        pmi.rule_counting = 'paths'
+    if args.soft is not None:
+        pmi.rule_counting = 'expected'
+        pmi.temperature = args.soft
+
+def read_pairs(pmi, infile, enc):
+    for line in infile:
+        line = line.strip().decode(enc)
+        if not line.count('\t')==1:
+            continue
+        (source, target) = line.split('\t')
+        source = source.strip()
+        target = target.strip()
+        pmi.add_pair(source, target)
+
 class MainApplication(object):
     args = None
     pmi  = None
@@ -13,29 +40,35 @@ class MainApplication(object):
 
     def __init__(self, args):
         self.args = args
-        self.pmi = PMILevenshtein()
-        self.pmi.learning_rate = args.lr
+        self.pmi = PMILevenshtein(workers=args.workers)
+        if args.metrics:
+            self.pmi.metrics = JSONLinesSink(args.metrics)
+        configure(self.pmi, args)
         self.divisor = args.divisor
 
     def read_input_data(self):
-        enc = self.args.encoding
-        for line in self.args.infile:
-            line = line.strip().decode(enc)
-            if not line.count('\t')==1:
-                continue
-            (source, target) = line.split('\t')
-            source = source.strip()
-            target = target.strip()
-            self.pmi.add_pair(source, target)
+        infile = self.args.infile
+        if infile is None:
+            # with --resume, the pairs are in the checkpoint
+            if self.args.resume:
+                return
+            infile = STDIN
+        read_pairs(self.pmi, infile, self.args.encoding)
 
     def run(self):
         self.read_input_data()
-        self.pmi.train()
+        # counting over paths needs no final alignments to find n-grams
+        self.pmi.train(final_alignments=self.pmi.rule_counting == 'alignments',
+                       checkpoint=self.args.checkpoint,
+                       checkpoint_every=self.args.checkpoint_every,
+                       resume_from=self.args.resume,
+                       max_cycles=self.args.max_cycles,
+                       time_budget=self.args.time_budget)
 
         if args.generate == "weights":
             self.pmi.weights.reset_weights()
             minval = 0.1
-            for (rule, weight) in self.pmi.find_ngram_weights(n=self.args.ngram).iteritems():
+            for (rule, weight) in iteritems(self.pmi.find_ngram_weights(n=self.args.ngram)):
                 (source, target) = rule
                 if source == '<eps>': continue
                 if weight > (len(source) * self.divisor): continue
@@ -46,27 +79,106 @@ class MainApplication(object):
 
 
         def utfprint(string):
-            print string.encode("utf-8").replace('<eps>','')
+            string = string.replace('<eps>','')
+            print(string.encode("utf-8") if str is bytes else string)
         for (rule, dist) in sorted(self.pmi.weights.weights.items(), key=itemgetter(1)):
             if rule[0] != rule[1] :
                 utfprint("%s\t%s\t%f" % (rule[0], rule[1], dist))
 
+def run_sharded(argv):
+    """Run one step of sharded training (see PMILevenshtein.count_shard):
+    'init' saves the pairs in a fresh checkpoint STATE; 'map' writes the
+    rule counts of one shard of them under the weights in STATE; 'reduce'
+    merges the counts of all shards into the next STATE and prints
+    'continue' or 'done'.  Afterwards, calling this script with --resume
+    STATE generates the weights as usual.  The options -l, -c and -s are
+    saved in STATE and must be the same in every step."""
+    training = argparse.ArgumentParser(add_help=False)
+    training.add_argument('-l', '--lr',
+                          metavar="LR",
+                          type=float,
+                          default=0.2,
+                          help='Learning rate for weight adjustments (default: %(default)f)')
+    training.add_argument('-c', '--count-paths',
+                          action='store_true',
+                          help='Count rules over all co-optimal alignments at once')
+    training.add_argument('-s', '--soft',
+                          type=float,
+                          metavar='T',
+                          help='Count rules softly, weighted by exp(-cost/T)')
+    training.add_argument('-j', '--workers',
+                          metavar='N',
+                          type=int,
+                          default=1,
+                          help='Number of processes used for aligning (default: %(default)i)')
+    training.add_argument('--max-cycles',
+                          metavar='N',
+                          type=int,
+                          help='Stop training after N cycles (default: 19)')
+
+    parser = argparse.ArgumentParser(description="Runs one step of PMI training on shards of the pairs.")
+    commands = parser.add_subparsers(dest='command')
+    init = commands.add_parser('init', parents=[training],
+                               help='Save the training pairs in a new STATE file')
+    init.add_argument('state', metavar='STATE')
+    init.add_argument('infile',
+                      nargs='?',
+                      type=argparse.FileType('rb'),
+                      default=STDIN,
+                      help='Training data to process, tab-separated (default: <STDIN>)')
+    init.add_argument('-e', '--encoding',
+                      default='utf-8',
+                      help='Encoding of the input file (default: %(default)s)')
+    count = commands.add_parser('map', parents=[training],
+                                help='Write the rule counts of one shard of the pairs')
+    count.add_argument('state', metavar='STATE')
+    count.add_argument('shard', metavar='SHARD', type=int,
+                       help='Number of the shard, counting from 0')
+    count.add_argument('shards', metavar='SHARDS', type=int,
+                       help='Number of shards')
+    count.add_argument('counts', metavar='COUNTS',
+                       help='File to write the rule counts to')
+    merge = commands.add_parser('reduce', parents=[training],
+                                help='Merge the rule counts of all shards into the next STATE')
+    merge.add_argument('state', metavar='STATE')
+    merge.add_argument('counts', metavar='COUNTS', nargs='+')
+    args = parser.parse_args(argv)
+
+    pmi = PMILevenshtein()
+    configure(pmi, args)
+    if args.command == 'init':
+        read_pairs(pmi, args.infile, args.encoding)
+        pmi.save_checkpoint(args.state, 0, sys.maxsize)
+        return
+    pmi.workers = args.workers
+    if args.command == 'map':
+        pmi.count_shard(args.state, args.shard, args.shards, args.counts)
+    elif pmi.merge_shards(args.state, args.counts, args.max_cycles):
+        print("continue")
+    else:
+        print("done")
+
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in SHARDED_COMMANDS:
+        run_sharded(sys.argv[1:])
+        exit()
+
     description = "Calculates Levenshtein weights based on training pairs of source--target wordforms."
-    epilog = ""
+    epilog = ("For training on several machines, see '%(prog)s init|map|reduce -h'; "
+              "sharded training ends by calling this with --resume.")
     parser = argparse.ArgumentParser(description=description, epilog=epilog)
     parser.add_argument('infile',
                         nargs='?',
-                        type=argparse.FileType('r'),
-                        default=sys.stdin,
-                        help='Training data to process, tab-separated (default: <STDIN>)')
+                        type=argparse.FileType('rb'),
+                        help=('Training data to process, tab-separated (default: <STDIN>, '
+                              'or the pairs in the checkpoint with --resume)'))
     parser.add_argument('-e', '--encoding',
                         default='utf-8',
                         help='Encoding of the input file (default: %(default)s)')
     parser.add_argument('-f', '--file',
                         dest="savefile",
-                        type=argparse.FileType('w'),
+                        type=argparse.FileType('wb'),
                         help='Save parameter file as XML')
     parser.add_argument('-g', '--generate',
                         choices=('pmi', 'weights'),
@@ -92,6 +204,47 @@ if __name__ == '__main__':
                         type=float,
                         default=7,
                         help='Divide final weights by this factor (default: %(default)i)')
+    parser.add_argument('-j', '--workers',
+                        metavar='N',
+                        type=int,
+                        default=1,
+                        help='Number of processes used for aligning (default: %(default)i)')
+    parser.add_argument('-c', '--count-paths',
+                        action='store_true',
+                        help=('Count rules over all co-optimal alignments at once '
+                              'instead of enumerating them; faster for pairs with '
+                              'many co-optimal alignments'))
+    parser.add_argument('-s', '--soft',
+                        type=float,
+                        metavar='T',
+                        help=('Count rules softly, with their expected frequencies '
+                              'over all alignments weighted by exp(-cost/T)'))
+    parser.add_argument('--checkpoint',
+                        metavar='FILE',
+                        help='Save the state of the training to FILE periodically')
+    parser.add_argument('--checkpoint-every',
+                        metavar='N',
+                        type=int,
+                        default=1,
+                        help='Save a checkpoint every N cycles (default: %(default)i)')
+    parser.add_argument('--resume',
+                        metavar='FILE',
+                        help=('Continue the training saved in FILE by --checkpoint, '
+                              'with the same training options'))
+    parser.add_argument('--max-cycles',
+                        metavar='N',
+                        type=int,
+                        help=('Stop training after N cycles (default: 19; a checkpoint '
+                              'saved on reaching its limit is only trained further if given)'))
+    parser.add_argument('--time-budget',
+                        metavar='SECONDS',
+                        type=float,
+                        help=('Stop training before it would take longer than SECONDS, '
+                              'and go on with the weights trained so far'))
+    parser.add_argument('--metrics',
+                        metavar='FILE',
+                        type=argparse.FileType('w'),
+                        help='Write timings and statistics of every training cycle to FILE, as JSON lines')
 
     args = parser.parse_args()
 
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(SCRIPTS, 'train_pmi.py')
+TEST_DATA = os.path.join(SCRIPTS, 'test_data.txt')
+
+class TestShardedTraining(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        # the script imports mblevenshtein from the repository
+        self.env = dict(os.environ)
+        path = [os.path.dirname(SCRIPTS)]
+        if self.env.get('PYTHONPATH'):
+            path.append(self.env['PYTHONPATH'])
+        self.env['PYTHONPATH'] = os.pathsep.join(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def run_script(self, *args):
+        output = subprocess.check_output([sys.executable, SCRIPT] + list(args),
+                                         cwd=self.tempdir, env=self.env)
+        return output.decode('utf-8')
+
+    def test_init_map_reduce(self):
+        state = os.path.join(self.tempdir, 'state.ckpt')
+        counts = [os.path.join(self.tempdir, 'counts-%i' % shard) for shard in range(2)]
+        self.run_script('init', state, TEST_DATA)
+        for cycle in range(1, 20):
+            for (shard, filename) in enumerate(counts):
+                self.run_script('map', state, str(shard), '2', filename)
+            status = self.run_script('reduce', state, *counts).strip()
+            self.assertTrue(status in ('continue', 'done'))
+            if status == 'done':
+                break
+        self.assertEqual(status, 'done')
+
+        weights = os.path.join(self.tempdir, 'weights.xml')
+        sharded = self.run_script('--resume', state, '-f', weights)
+        single = self.run_script(TEST_DATA)
+        self.assertEqual(sharded, single)
+        self.assertTrue(sharded)
+        self.assertTrue(os.path.getsize(weights) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
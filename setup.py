@@ -20,7 +20,9 @@ setup(name='mblevenshtein',
       license='MIT',
       packages=['mblevenshtein'],
       install_requires=[
-          'lxml>=3.3.3'
+          'lxml>=3.3.3',
+          'numpy',
+          'six'
       ],
       tests_require=[
           'unittest',